@@ -0,0 +1,176 @@
+"""
+Admission control for the expensive LLM endpoints.
+
+Each protected endpoint gets an AdmissionLimiter: at most `max_concurrent`
+requests run at once, at most `max_queue` more wait for a slot, and a waiter
+gives up after `queue_timeout` seconds. Anything beyond that is shed straight
+away so a slow Groq cannot soak up every worker.
+
+Limits are per worker process. They matter most under the async worker
+profile (gunicorn.conf.py), where one worker accepts many connections and the
+limiter keeps LLM-bound requests from crowding out everything else.
+"""
+import math
+import os
+import threading
+import time
+from functools import wraps
+from typing import Callable, Dict, Optional
+
+from flask import Response, jsonify
+
+from metrics import registry
+
+# Registry of every limiter, used by the stats endpoint
+limiters: Dict[str, 'AdmissionLimiter'] = {}
+
+admission_in_flight = registry.gauge('admission_in_flight', 'Requests currently running', ('endpoint',))
+admission_queue_depth = registry.gauge('admission_queue_depth', 'Requests waiting for a slot', ('endpoint',))
+admission_shed = registry.counter('admission_shed_total', 'Requests shed by admission control', ('endpoint', 'reason'))
+
+
+class AdmissionLimiter:
+    """Concurrency limit with a bounded, deadline-aware wait queue"""
+
+    def __init__(self, name: str, max_concurrent: int, max_queue: int, queue_timeout: float):
+        self.name = name
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+
+        self._condition = threading.Condition()
+        self.in_flight = 0
+        self.queued = 0
+        self.admitted_total = 0
+        self.shed_total = 0
+        self.timed_out_total = 0
+        # Exponentially weighted service time, used to estimate Retry-After
+        self.avg_service_time = 1.0
+
+        limiters[name] = self
+
+    @classmethod
+    def from_env(cls, name: str, max_concurrent: int, max_queue: int, queue_timeout: float) -> 'AdmissionLimiter':
+        """Build a limiter whose defaults can be overridden with ADMISSION_<NAME>_* variables"""
+        prefix = f"ADMISSION_{name.upper()}_"
+        return cls(
+            name,
+            max_concurrent=int(os.environ.get(prefix + "MAX_CONCURRENT", max_concurrent)),
+            max_queue=int(os.environ.get(prefix + "MAX_QUEUE", max_queue)),
+            queue_timeout=float(os.environ.get(prefix + "QUEUE_TIMEOUT", queue_timeout))
+        )
+
+    def acquire(self) -> Optional[str]:
+        """
+        Try to take a slot. Returns None when admitted, otherwise the reason the
+        request was shed: 'queue_full' or 'queue_timeout'.
+        """
+        with self._condition:
+            if self.in_flight < self.max_concurrent:
+                self.in_flight += 1
+                self.admitted_total += 1
+                return None
+
+            if self.queued >= self.max_queue:
+                self.shed_total += 1
+                admission_shed.inc(endpoint=self.name, reason='queue_full')
+                return 'queue_full'
+
+            self.queued += 1
+            deadline = time.monotonic() + self.queue_timeout
+            try:
+                while self.in_flight >= self.max_concurrent:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self.timed_out_total += 1
+                        self.shed_total += 1
+                        admission_shed.inc(endpoint=self.name, reason='queue_timeout')
+                        return 'queue_timeout'
+                    self._condition.wait(remaining)
+
+                self.in_flight += 1
+                self.admitted_total += 1
+                return None
+            finally:
+                self.queued -= 1
+
+    def release(self, service_time: float):
+        with self._condition:
+            self.in_flight -= 1
+            self.avg_service_time = 0.8 * self.avg_service_time + 0.2 * service_time
+            self._condition.notify()
+
+    def under_pressure(self) -> bool:
+        """True while requests are waiting for a slot, i.e. the endpoint is at capacity"""
+        with self._condition:
+            return self.queued > 0
+
+    def retry_after(self) -> int:
+        """Seconds until a slot is likely to free up, for the Retry-After header"""
+        waiting = self.queued + 1
+        return max(1, math.ceil(self.avg_service_time * waiting / max(1, self.max_concurrent)))
+
+    def stats(self) -> Dict:
+        with self._condition:
+            return {
+                'in_flight': self.in_flight,
+                'queue_depth': self.queued,
+                'max_concurrent': self.max_concurrent,
+                'max_queue': self.max_queue,
+                'queue_timeout': self.queue_timeout,
+                'admitted_total': self.admitted_total,
+                'shed_total': self.shed_total,
+                'timed_out_total': self.timed_out_total,
+                'avg_service_time': round(self.avg_service_time, 3)
+            }
+
+
+def _collect_gauges():
+    for name, limiter in limiters.items():
+        admission_in_flight.set(limiter.in_flight, endpoint=name)
+        admission_queue_depth.set(limiter.queued, endpoint=name)
+
+
+registry.collectors.append(_collect_gauges)
+
+
+def shed_response(limiter: AdmissionLimiter, reason: str):
+    """Default response for a shed request: 429 when the queue is full, 503 when the wait timed out"""
+    status = 429 if reason == 'queue_full' else 503
+    response = jsonify({
+        'success': False,
+        'error': 'The service is busy right now. Please try again shortly.'
+    })
+    response.status_code = status
+    response.headers['Retry-After'] = str(limiter.retry_after())
+    return response
+
+
+def admission_controlled(limiter: AdmissionLimiter, on_shed: Optional[Callable] = None):
+    """
+    Decorator that runs a view under `limiter`. When the request is shed,
+    `on_shed(limiter, reason)` builds the response (default: shed_response).
+    """
+    shed = on_shed or shed_response
+
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            reason = limiter.acquire()
+            if reason:
+                return shed(limiter, reason)
+            start = time.monotonic()
+            streamed = False
+            try:
+                response = view(*args, **kwargs)
+                # A streamed response keeps its slot until the stream is finished or abandoned
+                if isinstance(response, Response) and response.is_streamed:
+                    response.call_on_close(lambda: limiter.release(time.monotonic() - start))
+                    streamed = True
+                return response
+            finally:
+                if not streamed:
+                    limiter.release(time.monotonic() - start)
+        return wrapper
+
+    return decorator
@@ -1,19 +1,28 @@
 import json
 import logging
 import os
+import time
 from datetime import datetime, timedelta
 from typing import Dict, List, Optional, Any
 import asyncio
-from dataclasses import dataclass
+from dataclasses import dataclass, replace
 
-from langchain_groq import ChatGroq
 from langchain_core.prompts import ChatPromptTemplate
 from pydantic import BaseModel, Field
 from langchain.tools import Tool
 from langchain_core.messages import HumanMessage, SystemMessage
 
+from agent_memory import agent_memory
 from weather_service import WeatherService
 from budget_optimizer import BudgetOptimizer
+from llm_factory import create_chat_model
+from metrics import registry
+from trip_context import TripContext
+
+AGENT_CHECK_TIMEOUT = float(os.environ.get("AGENT_CHECK_TIMEOUT", 5))
+
+agent_check_duration = registry.histogram('agent_check_duration_seconds', 'Proactive monitoring latency per agent',
+                                          ('agent', 'outcome'))
 
 @dataclass
 class AgentContext:
@@ -24,6 +33,7 @@ class AgentContext:
     travel_date: Optional[datetime] = None
     budget_remaining: Optional[float] = None
     user_preferences: Dict[str, Any] = None
+    trip: Optional[TripContext] = None  # the itinerary being monitored, see trip_context.trip_context_for
     
 class TravelAgentCoordinator:
     """
@@ -37,36 +47,28 @@ class TravelAgentCoordinator:
         
         # Initialize base LLM
         try:
-            self.llm = ChatGroq(
-                groq_api_key=os.environ.get("GROQ_API_KEY"),
-                model_name="llama-3.1-8b-instant",
-                temperature=0.3,  # Lower temperature for more consistent decisions
-                max_tokens=1000
-            )
+            # Lower temperature for more consistent decisions
+            self.llm = create_chat_model(temperature=0.3, max_tokens=1000, operation='agent')
         except Exception as e:
             logging.error(f"Failed to initialize LLM: {e}")
             self.llm = None
         
-        # Agent memory for learning patterns
-        self.agent_memory = {
-            'successful_recommendations': [],
-            'user_feedback_patterns': {},
-            'weather_adaptations': [],
-            'budget_optimizations': []
-        }
+        # Bounded memory for learning patterns, persisted and shared across workers
+        self.agent_memory = agent_memory
     
-    def create_weather_agent(self) -> Tool:
+    def create_weather_agent(self, trip: Optional[TripContext] = None) -> Tool:
         """Weather monitoring and advisory agent"""
         def weather_analysis(query: str) -> str:
             try:
                 # Parse location from query
-                location = self._extract_location(query)
+                location = self._extract_location(query, trip)
                 if not location:
                     return "Location not specified for weather analysis"
                 
-                # Get current weather and forecast
-                current = self.weather_service.get_current_weather(location)
-                forecast = self.weather_service.get_forecast(location, days=3)
+                # Get current weather and forecast in one geocode + two concurrent requests
+                bundle = self.weather_service.get_weather_bundle(location, days=3) or {}
+                current = bundle.get('current')
+                forecast = bundle.get('forecast')
                 
                 if not current:
                     return f"Weather data unavailable for {location}"
@@ -91,12 +93,12 @@ class TravelAgentCoordinator:
             func=weather_analysis
         )
     
-    def create_budget_agent(self) -> Tool:
+    def create_budget_agent(self, trip: Optional[TripContext] = None) -> Tool:
         """Budget monitoring and optimization agent"""
         def budget_analysis(query: str) -> str:
             try:
                 # Extract budget context from query
-                context = self._extract_budget_context(query)
+                context = self._extract_budget_context(query, trip)
                 
                 # Analyze spending patterns and suggest optimizations
                 recommendations = self.budget_optimizer.get_budget_recommendations(
@@ -125,11 +127,11 @@ class TravelAgentCoordinator:
             func=budget_analysis
         )
     
-    def create_activity_agent(self) -> Tool:
+    def create_activity_agent(self, trip: Optional[TripContext] = None) -> Tool:
         """Activity discovery and management agent"""
         def activity_recommendations(query: str) -> str:
             try:
-                context = self._extract_activity_context(query)
+                context = self._extract_activity_context(query, trip)
                 
                 # Generate personalized activity suggestions
                 activities = self._discover_activities(context)
@@ -153,14 +155,21 @@ class TravelAgentCoordinator:
             func=activity_recommendations
         )
     
-    async def proactive_monitoring(self, context: AgentContext) -> Dict[str, Any]:
+    async def proactive_monitoring(self, context: AgentContext, timeout: float = AGENT_CHECK_TIMEOUT) -> Dict[str, Any]:
         """
         Proactive monitoring that runs autonomously to detect:
         - Weather changes requiring itinerary adjustments
         - Budget optimization opportunities
         - New activity suggestions
         - Travel disruptions or improvements
+        
+        The agents run concurrently, each with `timeout` seconds; one that is
+        late or fails leaves its results empty and is listed in `timed_out` or
+        `errors`, so the whole check takes as long as the slowest agent.
         """
+        if context.trip and not context.current_location:
+            context = replace(context, current_location=context.trip.destination)
+        
         monitoring_results = {
             'weather_alerts': [],
             'budget_insights': [],
@@ -168,55 +177,59 @@ class TravelAgentCoordinator:
             'urgent_notifications': []
         }
         
+        checks = []
+        if context.current_location:
+            checks.append(('weather', 'weather_alerts', self._check_weather_proactively))
+        if context.budget_remaining is not None:
+            checks.append(('budget', 'budget_insights', self._monitor_budget_proactively))
+        checks.append(('activity', 'activity_suggestions', self._discover_activities_proactively))
+        
+        outcomes = await asyncio.gather(*(self._run_agent(name, check, context, timeout) for name, _, check in checks))
+        
+        latency = {}
+        for (name, result_key, _), (result, outcome, elapsed) in zip(checks, outcomes):
+            latency[name] = round(elapsed * 1000, 1)
+            if outcome == 'ok':
+                monitoring_results[result_key] = result
+            elif outcome == 'timeout':
+                monitoring_results.setdefault('timed_out', []).append(name)
+            else:
+                monitoring_results.setdefault('errors', []).append(f"{name}: {result}")
+        monitoring_results['agent_latency_ms'] = latency
+        monitoring_results['partial'] = 'timed_out' in monitoring_results or 'errors' in monitoring_results
+        
         try:
-            # Weather monitoring
-            if context.current_location:
-                weather_check = await self._check_weather_proactively(context)
-                monitoring_results['weather_alerts'] = weather_check
-            
-            # Budget monitoring  
-            if context.budget_remaining is not None:
-                budget_check = await self._monitor_budget_proactively(context)
-                monitoring_results['budget_insights'] = budget_check
-            
-            # Activity discovery
-            activity_check = await self._discover_activities_proactively(context)
-            monitoring_results['activity_suggestions'] = activity_check
-            
             # Generate coordinated recommendations
             coordinated_advice = await self._coordinate_agent_recommendations(monitoring_results)
             monitoring_results['coordinated_recommendations'] = coordinated_advice
-            
         except Exception as e:
             logging.error(f"Proactive monitoring failed: {e}")
-            monitoring_results['errors'] = [str(e)]
+            monitoring_results.setdefault('errors', []).append(str(e))
         
         return monitoring_results
     
+    async def _run_agent(self, name: str, check, context: AgentContext, timeout: float):
+        """(result or error message, 'ok' | 'timeout' | 'error', seconds) for one agent's check"""
+        start = time.perf_counter()
+        try:
+            result, outcome = await asyncio.wait_for(check(context), timeout), 'ok'
+        except asyncio.TimeoutError:
+            logging.warning(f"{name} agent timed out after {timeout}s")
+            result, outcome = None, 'timeout'
+        except Exception as e:
+            logging.error(f"{name} agent failed: {e}")
+            result, outcome = str(e), 'error'
+        elapsed = time.perf_counter() - start
+        agent_check_duration.observe(elapsed, agent=name, outcome=outcome)
+        return result, outcome, elapsed
+    
     def learn_from_interaction(self, interaction_data: Dict[str, Any]):
         """
         Learn from user interactions to improve future recommendations
         """
         try:
-            # Store successful recommendations
-            if interaction_data.get('feedback') == 'positive':
-                self.agent_memory['successful_recommendations'].append({
-                    'timestamp': datetime.now().isoformat(),
-                    'recommendation_type': interaction_data.get('type'),
-                    'context': interaction_data.get('context'),
-                    'success_factors': interaction_data.get('success_factors', [])
-                })
-            
-            # Update user preference patterns
-            user_id = interaction_data.get('user_id')
-            if user_id:
-                if user_id not in self.agent_memory['user_feedback_patterns']:
-                    self.agent_memory['user_feedback_patterns'][user_id] = []
-                
-                self.agent_memory['user_feedback_patterns'][user_id].append({
-                    'timestamp': datetime.now().isoformat(),
-                    'interaction': interaction_data
-                })
+            # Successful recommendations, success factor counts and the user's recent feedback
+            self.agent_memory.record_interaction(interaction_data)
             
             # Adapt agent behavior based on patterns
             self._adapt_agent_strategies()
@@ -251,18 +264,25 @@ class TravelAgentCoordinator:
             'changes': changes
         }
     
-    def _extract_location(self, query: str) -> Optional[str]:
-        """Extract location from query string"""
+    def _extract_location(self, query: str, trip: Optional[TripContext] = None) -> Optional[str]:
+        """Extract location from query string, else the trip's destination"""
         # Simple extraction - could be enhanced with NLP
         words = query.lower().split()
         locations = ['mumbai', 'delhi', 'bangalore', 'goa', 'kerala', 'rajasthan']
         for word in words:
             if word in locations:
                 return word.title()
-        return None
+        return trip.destination if trip else None
     
-    def _extract_budget_context(self, query: str) -> Dict:
-        """Extract budget context from query"""
+    def _extract_budget_context(self, query: str, trip: Optional[TripContext] = None) -> Dict:
+        """Extract budget context from query, filled in from the trip when there is one"""
+        if trip:
+            return {
+                'destination': self._extract_location(query, trip),
+                'duration': trip.duration,
+                'budget': trip.budget,
+                'interests': trip.interests
+            }
         return {
             'destination': self._extract_location(query) or '',
             'duration': 3,  # Default
@@ -270,11 +290,11 @@ class TravelAgentCoordinator:
             'interests': []
         }
     
-    def _extract_activity_context(self, query: str) -> Dict:
+    def _extract_activity_context(self, query: str, trip: Optional[TripContext] = None) -> Dict:
         """Extract activity context from query"""
         return {
-            'location': self._extract_location(query),
-            'interests': [],
+            'location': self._extract_location(query, trip),
+            'interests': trip.interests if trip else [],
             'budget_range': 'medium',
             'time_of_day': 'any'
         }
@@ -284,7 +304,8 @@ class TravelAgentCoordinator:
         alerts = []
         if context.current_location:
             try:
-                current = self.weather_service.get_current_weather(context.current_location)
+                # Native async client, so the event loop keeps serving the other agents
+                current = await self.weather_service.aget_current_weather(context.current_location)
                 if current and current.get('main', {}).get('temp', 0) > 40:
                     alerts.append({
                         'type': 'extreme_heat',
@@ -399,14 +420,11 @@ class TravelAgentCoordinator:
     
     def _adapt_agent_strategies(self):
         """Adapt agent strategies based on learned patterns"""
-        # Analyze successful recommendation patterns
-        successful = self.agent_memory['successful_recommendations']
-        
-        # Extract common success factors
-        success_factors = {}
-        for rec in successful[-10:]:  # Last 10 successful recommendations
-            for factor in rec.get('success_factors', []):
-                success_factors[factor] = success_factors.get(factor, 0) + 1
+        # Most common success factors, recent ones weighted more (kept up to date incrementally)
+        success_factors = dict(self.agent_memory.top_factors(10))
         
         # Adapt strategies based on patterns
-        logging.info(f"Adapting strategies based on success factors: {success_factors}")
\ No newline at end of file
+        logging.info(f"Adapting strategies based on success factors: {success_factors}")
+
+
+agent_coordinator = TravelAgentCoordinator()
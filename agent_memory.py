@@ -0,0 +1,308 @@
+"""
+Bounded, persistent learning memory for TravelAgentCoordinator.
+
+Everything the coordinator learns from interactions stays within fixed limits:
+
+- one ring buffer (deque) of compact records per category, AGENT_MEMORY_CATEGORY_SIZE long;
+- the last AGENT_MEMORY_PER_USER interactions per user, for at most
+  AGENT_MEMORY_MAX_USERS users (least recently seen dropped first);
+- success-factor counts as exponentially decayed counters (half-life
+  AGENT_MEMORY_HALF_LIFE seconds), at most AGENT_MEMORY_MAX_FACTORS of them.
+  Each counter is stored scaled to a common epoch, so an update is one
+  addition and scores only ever grow; the strongest TOP_TRACKED are therefore
+  kept up to date on every update instead of being re-ranked on every read.
+
+Records keep only a timestamp, type, feedback and success factors, never the
+full interaction payload. Every AGENT_MEMORY_FLUSH_INTERVAL seconds a worker
+merges what it learned since its last flush (itself held in the same bounded
+structures) into the AgentMemoryState row. The row is compact JSON, written
+under an optimistic version check on a background thread. The worker then
+adopts the merged state of every worker, so memory survives restarts and is
+shared across workers.
+"""
+import heapq
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Dict, List, Optional, Tuple
+
+from flask import has_app_context
+from sqlalchemy import insert, select, update
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+
+from app import app, db
+from metrics import registry
+from models import AgentMemoryState
+
+AGENT_MEMORY_CATEGORY_SIZE = int(os.environ.get("AGENT_MEMORY_CATEGORY_SIZE", 200))
+AGENT_MEMORY_PER_USER = int(os.environ.get("AGENT_MEMORY_PER_USER", 20))
+AGENT_MEMORY_MAX_USERS = int(os.environ.get("AGENT_MEMORY_MAX_USERS", 1000))
+AGENT_MEMORY_MAX_FACTORS = int(os.environ.get("AGENT_MEMORY_MAX_FACTORS", 500))
+AGENT_MEMORY_HALF_LIFE = float(os.environ.get("AGENT_MEMORY_HALF_LIFE", 7 * 24 * 3600))
+AGENT_MEMORY_FLUSH_INTERVAL = int(os.environ.get("AGENT_MEMORY_FLUSH_INTERVAL", 300))
+CATEGORIES = ('successful_recommendations', 'weather_adaptations', 'budget_optimizations')
+STATE_KEY = 'coordinator'
+MAX_FACTORS_PER_RECORD = 10
+TOP_TRACKED = 32
+MAX_REBASE_HALF_LIVES = 500  # rescale counters before 2 ** elapsed half-lives gets near float limits
+FLUSH_ATTEMPTS = 3
+
+agent_memory_records = registry.gauge('agent_memory_records', 'Records held in agent memory', ('part',))
+
+
+class _Store:
+    """The bounded structures, used both for what a worker knows and for what it has yet to flush"""
+
+    def __init__(self, category_size: int, per_user: int, max_users: int, max_factors: int, half_life: float,
+                 state: Optional[Dict] = None):
+        self.category_size = category_size
+        self.per_user = per_user
+        self.max_users = max_users
+        self.max_factors = max_factors
+        self.half_life = half_life
+        state = state or {}
+        self.categories = {category: deque(state.get('categories', {}).get(category, []), maxlen=category_size)
+                           for category in CATEGORIES}
+        # Stored oldest-seen first, so the LRU order survives a round trip
+        self.users: Dict[str, deque] = OrderedDict(
+            (user, deque(records, maxlen=per_user)) for user, records in state.get('users', []))
+        self.epoch = state.get('epoch', time.time())
+        self.factors: Dict[str, float] = dict(state.get('factors', {}))  # count scaled to 2 ** (epoch offset)
+        self._retop()
+
+    def empty(self) -> '_Store':
+        return _Store(self.category_size, self.per_user, self.max_users, self.max_factors, self.half_life)
+
+    def _weight(self, now: float) -> float:
+        """What one count at `now` is worth in this store's scaled units"""
+        if (now - self.epoch) / self.half_life > MAX_REBASE_HALF_LIVES:
+            scale = 0.5 ** ((now - self.epoch) / self.half_life)
+            self.factors = {factor: score * scale for factor, score in self.factors.items()}
+            self.epoch = now
+            self._retop()
+        return 2.0 ** ((now - self.epoch) / self.half_life)
+
+    def add_record(self, category: str, record: List):
+        self.categories[category].append(record)
+
+    def add_user_record(self, user: str, record: List):
+        history = self.users.get(user)
+        if history is None:
+            history = self.users[user] = deque(maxlen=self.per_user)
+            while len(self.users) > self.max_users:
+                self.users.popitem(last=False)
+        self.users.move_to_end(user)
+        history.append(record)
+
+    def add_factors(self, factors: List[str], now: float, count: float = 1.0):
+        weight = count * self._weight(now)
+        for factor in factors:
+            score = self.factors[factor] = self.factors.get(factor, 0.0) + weight
+            self._track(factor, score)
+        if len(self.factors) > 2 * self.max_factors:  # amortized: trim back down in one go
+            self._trim(self.max_factors)
+
+    def _trim(self, size: int):
+        self.factors = dict(heapq.nlargest(size, self.factors.items(), key=lambda item: item[1]))
+        self._retop()
+
+    def _retop(self):
+        self._top = dict(heapq.nlargest(TOP_TRACKED, self.factors.items(), key=lambda item: item[1]))
+
+    def _track(self, factor: str, score: float):
+        if factor in self._top or len(self._top) < TOP_TRACKED:
+            self._top[factor] = score
+            return
+        weakest = min(self._top, key=self._top.get)
+        if score > self._top[weakest]:
+            del self._top[weakest]
+            self._top[factor] = score
+
+    def top_factors(self, n: int, now: float) -> List[Tuple[str, float]]:
+        ranked = self._top if n <= TOP_TRACKED else self.factors
+        scale = 0.5 ** ((now - self.epoch) / self.half_life)
+        return [(factor, round(score * scale, 2))
+                for factor, score in heapq.nlargest(n, ranked.items(), key=lambda item: item[1])]
+
+    def merge(self, other: '_Store'):
+        """Add everything in `other` (learned later than anything here) to this store"""
+        for category, records in other.categories.items():
+            self.categories[category].extend(records)
+        for user, records in other.users.items():
+            for record in records:
+                self.add_user_record(user, record)
+        scale = 2.0 ** ((other.epoch - self.epoch) / self.half_life)
+        for factor, score in other.factors.items():
+            self.factors[factor] = self.factors.get(factor, 0.0) + score * scale
+        if len(self.factors) > self.max_factors:
+            self._trim(self.max_factors)
+        else:
+            self._retop()
+
+    def to_state(self) -> Dict:
+        return {
+            'categories': {category: list(records) for category, records in self.categories.items()},
+            'users': [[user, list(records)] for user, records in self.users.items()],
+            'epoch': self.epoch,
+            'factors': {factor: round(score, 6) for factor, score in self.factors.items()}
+        }
+
+
+class AgentMemory:
+    def __init__(self, category_size: int = AGENT_MEMORY_CATEGORY_SIZE, per_user: int = AGENT_MEMORY_PER_USER,
+                 max_users: int = AGENT_MEMORY_MAX_USERS, max_factors: int = AGENT_MEMORY_MAX_FACTORS,
+                 half_life: float = AGENT_MEMORY_HALF_LIFE, flush_interval: int = AGENT_MEMORY_FLUSH_INTERVAL):
+        self.flush_interval = flush_interval
+        self._local = _Store(category_size, per_user, max_users, max_factors, half_life)
+        self._pending = self._local.empty()  # learned since the last flush
+        self._lock = threading.Lock()
+        self._loaded = False
+        self._flushing = False
+        self._last_flush = time.time()
+
+    def _new_store(self, state: Optional[Dict] = None) -> _Store:
+        local = self._local
+        return _Store(local.category_size, local.per_user, local.max_users, local.max_factors, local.half_life, state)
+
+    def remember(self, category: str, record: List):
+        """Append a compact record ([timestamp, ...]) to one of CATEGORIES"""
+        with self._lock:
+            self._local.add_record(category, record)
+            self._pending.add_record(category, record)
+        self._maybe_flush()
+
+    def record_interaction(self, interaction: Dict):
+        """Learn from one interaction: successes and their factors, plus the user's recent feedback"""
+        self._ensure_loaded()
+        now = time.time()
+        kind = interaction.get('type')
+        with self._lock:
+            if interaction.get('feedback') == 'positive':
+                factors = [str(f)[:100] for f in interaction.get('success_factors') or []][:MAX_FACTORS_PER_RECORD]
+                record = [round(now), kind, factors]
+                for store in (self._local, self._pending):
+                    store.add_record('successful_recommendations', record)
+                    store.add_factors(factors, now)
+
+            user_id = interaction.get('user_id')
+            if user_id is not None:
+                record = [round(now), kind, interaction.get('feedback')]
+                for store in (self._local, self._pending):
+                    store.add_user_record(str(user_id), record)
+        self._maybe_flush()
+
+    def top_factors(self, n: int = 10) -> List[Tuple[str, float]]:
+        """The most successful factors by decayed count, strongest first"""
+        self._ensure_loaded()
+        with self._lock:
+            return self._local.top_factors(n, time.time())
+
+    def user_history(self, user_id) -> List[List]:
+        """[timestamp, type, feedback] for the user's recent interactions, oldest first"""
+        with self._lock:
+            return list(self._local.users.get(str(user_id), ()))
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                'categories': {category: len(records) for category, records in self._local.categories.items()},
+                'users': len(self._local.users),
+                'user_records': sum(len(records) for records in self._local.users.values()),
+                'factors': len(self._local.factors)
+            }
+
+    # Persistence
+
+    @staticmethod
+    def _load_row(conn) -> Tuple[Optional[Dict], int]:
+        table = AgentMemoryState.__table__
+        row = conn.execute(select(table.c.data, table.c.version).where(table.c.key == STATE_KEY)).first()
+        if row is None:
+            return None, 0
+        return json.loads(row.data), row.version
+
+    def _ensure_loaded(self):
+        if self._loaded or not has_app_context():
+            return
+        self._loaded = True
+        try:
+            with db.engine.connect() as conn:
+                state, _ = self._load_row(conn)
+        except (SQLAlchemyError, ValueError) as e:
+            logging.error(f"Could not load agent memory: {e}")
+            return
+        if state:
+            with self._lock:
+                local = self._new_store(state)
+                local.merge(self._local)
+                self._local = local
+
+    def flush(self) -> bool:
+        """Merge what this worker learned into the stored state and adopt the result. Needs an app context."""
+        with self._lock:
+            pending, self._pending = self._pending, self._local.empty()
+        table = AgentMemoryState.__table__
+        for _ in range(FLUSH_ATTEMPTS):
+            try:
+                with db.engine.begin() as conn:
+                    state, version = self._load_row(conn)
+                    merged = self._new_store(state)
+                    merged.merge(pending)
+                    data = json.dumps(merged.to_state(), separators=(',', ':'))
+                    if state is None:
+                        conn.execute(insert(table).values(key=STATE_KEY, data=data, version=1))
+                    else:
+                        updated = conn.execute(update(table)
+                                               .where(table.c.key == STATE_KEY, table.c.version == version)
+                                               .values(data=data, version=version + 1))
+                        if updated.rowcount == 0:
+                            continue  # another worker flushed in between; merge again on top of theirs
+            except IntegrityError:
+                continue
+            except (SQLAlchemyError, ValueError) as e:
+                logging.error(f"Could not persist agent memory: {e}")
+                break
+            with self._lock:
+                # Every worker's learning, plus whatever arrived here during the flush
+                merged.merge(self._pending)
+                self._local = merged
+            self._loaded = True
+            return True
+
+        with self._lock:  # keep it for the next flush
+            pending.merge(self._pending)
+            self._pending = pending
+        return False
+
+    def _maybe_flush(self):
+        if self._flushing or time.time() - self._last_flush < self.flush_interval:
+            return
+        self._flushing = True
+        self._last_flush = time.time()
+
+        def target():
+            try:
+                with app.app_context():
+                    self.flush()
+            except Exception as e:
+                logging.error(f"Agent memory flush failed: {e}")
+            finally:
+                self._flushing = False
+
+        threading.Thread(target=target, name='agent-memory-flush', daemon=True).start()
+
+
+agent_memory = AgentMemory()
+
+
+def _collect_gauges():
+    stats = agent_memory.stats()
+    agent_memory_records.set(sum(stats['categories'].values()), part='categories')
+    agent_memory_records.set(stats['user_records'], part='users')
+    agent_memory_records.set(stats['factors'], part='factors')
+
+
+registry.collectors.append(_collect_gauges)
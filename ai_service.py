@@ -4,21 +4,18 @@ import logging
 from typing import Dict, List, Any, Optional
 
 # LangChain imports
-from langchain_groq import ChatGroq
 from langchain_core.prompts import ChatPromptTemplate, SystemMessagePromptTemplate, HumanMessagePromptTemplate
 from langchain_core.output_parsers import JsonOutputParser
 from pydantic import BaseModel, Field
 from langchain.chains import LLMChain
 
+from metrics import LLMMetricsCallback
+from llm_factory import create_chat_model, api_key
+
 # Initialize LangChain with Groq
 try:
-    llm = ChatGroq(
-        groq_api_key=os.environ.get("GROQ_API_KEY"),
-        model_name="llama-3.1-8b-instant",
-        temperature=0.7,
-        max_tokens=4000
-    )
-    print(f"LangChain GROQ client initialized successfully with key length: {len(os.environ.get('GROQ_API_KEY', ''))}")
+    llm = create_chat_model(temperature=0.7, max_tokens=4000)
+    print(f"LangChain GROQ client initialized successfully with key length: {len(api_key() or '')}")
 except Exception as e:
     print(f"Error initializing LangChain GROQ client: {e}")
     llm = None
@@ -112,25 +109,11 @@ def generate_basic_itinerary(destination, duration, budget, interests):
     
     return basic_itinerary
 
-def generate_travel_itinerary(destination, duration, budget, interests):
-    """
-    Generate a detailed travel itinerary using LangChain for Indian tourists
-    """
-    if not llm:
-        logging.warning("LangChain LLM not available, using basic itinerary")
-        return generate_basic_itinerary(destination, duration, budget, interests)
-    
-    try:
-        # Prepare interests string
-        interests_str = ", ".join(interests) if interests else "general sightseeing"
-        
-        # Create system prompt template
-        system_template = """You are an expert travel planner specializing in trips for Indian tourists. 
+ITINERARY_SYSTEM_TEMPLATE = """You are an expert travel planner specializing in trips for Indian tourists. 
         You create detailed, culturally-aware itineraries with accurate costs in Indian Rupees.
         Always respond with valid JSON that matches the exact schema provided."""
-        
-        # Create human prompt template
-        human_template = """Create a detailed {duration}-day travel itinerary for {destination} for Indian tourists with a budget of ₹{budget}.
+
+ITINERARY_HUMAN_TEMPLATE = """Create a detailed {duration}-day travel itinerary for {destination} for Indian tourists with a budget of ₹{budget}.
 
 Tourist interests: {interests}
 
@@ -175,46 +158,76 @@ Return ONLY a valid JSON object with this exact structure:
 }}
 
 Plan each day to cover one geographical area/zone efficiently. Ensure realistic travel times and costs within the specified budget."""
-        
-        # Create prompt template
-        prompt = ChatPromptTemplate.from_messages([
-            SystemMessagePromptTemplate.from_template(system_template),
-            HumanMessagePromptTemplate.from_template(human_template)
-        ])
-        
-        # Create chain with LangChain
-        chain = prompt | llm
-        
-        # Execute chain
-        response = chain.invoke({
-            "destination": destination,
-            "duration": duration,
-            "budget": budget,
-            "interests": interests_str
-        })
-        
-        content = response.content.strip()
-        
-        # Extract JSON if wrapped in markdown
-        if '```json' in content:
-            start = content.find('```json') + 7
-            end = content.find('```', start)
-            content = content[start:end].strip()
-        elif '```' in content:
-            start = content.find('```') + 3
-            end = content.find('```', start)
-            content = content[start:end].strip()
-        
-        try:
-            itinerary_data = json.loads(content)
-            logging.info(f"Successfully generated LangChain itinerary for {destination}")
-            return itinerary_data
-        except json.JSONDecodeError as json_error:
-            logging.error(f"LangChain JSON decode error: {json_error}")
-            return generate_basic_itinerary(destination, duration, budget, interests)
-            
+
+STATION_CODE_SYSTEM_PROMPT = "You are an Indian Railways expert. Your task is to provide the primary, most common railway station code for a given Indian city. Respond with ONLY the station code in uppercase. For example, for 'New Delhi' respond with 'NDLS'. For 'Kolkata' respond with 'HWH'. If you cannot find a code, respond with 'None'."
+
+def _llm_config(operation):
+    """Per-call LangChain config that records latency and token usage under `operation`"""
+    return {"callbacks": [LLMMetricsCallback(operation)]}
+
+def _itinerary_chain():
+    prompt = ChatPromptTemplate.from_messages([
+        SystemMessagePromptTemplate.from_template(ITINERARY_SYSTEM_TEMPLATE),
+        HumanMessagePromptTemplate.from_template(ITINERARY_HUMAN_TEMPLATE)
+    ])
+    return prompt | llm
+
+def _itinerary_inputs(destination, duration, budget, interests):
+    return {
+        "destination": destination,
+        "duration": duration,
+        "budget": budget,
+        "interests": ", ".join(interests) if interests else "general sightseeing"
+    }
+
+def extract_json_content(content):
+    """Strip markdown code fences the model sometimes wraps JSON in"""
+    content = content.strip()
+    if '```json' in content:
+        start = content.find('```json') + 7
+        end = content.find('```', start)
+        content = content[start:end].strip()
+    elif '```' in content:
+        start = content.find('```') + 3
+        end = content.find('```', start)
+        content = content[start:end].strip()
+    return content
+
+class ItineraryGenerationError(Exception):
+    """The LLM could not produce a usable itinerary (unavailable, call failed, or unparsable reply)"""
+
+def generate_llm_itinerary(destination, duration, budget, interests):
+    """
+    Generate an itinerary with the LLM only. Raises ItineraryGenerationError instead
+    of falling back to the basic template, so callers can retry failed requests later.
+    """
+    if not llm:
+        raise ItineraryGenerationError("LangChain LLM not available")
+
+    try:
+        response = _itinerary_chain().invoke(_itinerary_inputs(destination, duration, budget, interests), config=_llm_config('itinerary'))
     except Exception as e:
-        logging.error(f"LangChain error generating itinerary: {e}")
+        raise ItineraryGenerationError(f"LangChain error generating itinerary: {e}") from e
+
+    try:
+        itinerary_data = json.loads(extract_json_content(response.content))
+    except json.JSONDecodeError as json_error:
+        raise ItineraryGenerationError(f"LangChain JSON decode error: {json_error}") from json_error
+    if not isinstance(itinerary_data, dict) or not itinerary_data.get('days'):
+        raise ItineraryGenerationError("LangChain reply has no itinerary days")
+
+    logging.info(f"Successfully generated LangChain itinerary for {destination}")
+    return itinerary_data
+
+def generate_travel_itinerary(destination, duration, budget, interests):
+    """
+    Generate a detailed travel itinerary using LangChain for Indian tourists,
+    falling back to the basic itinerary when the LLM fails
+    """
+    try:
+        return generate_llm_itinerary(destination, duration, budget, interests)
+    except ItineraryGenerationError as e:
+        logging.error(f"{e}; using basic itinerary")
         return generate_basic_itinerary(destination, duration, budget, interests)
 
 def get_location_suggestions(query):
@@ -239,18 +252,8 @@ def get_location_suggestions(query):
         chain = prompt | llm
         
         # Execute chain
-        response = chain.invoke({"query": query})
-        content = response.content.strip()
-        
-        # Extract JSON if wrapped
-        if '```json' in content:
-            start = content.find('```json') + 7
-            end = content.find('```', start)
-            content = content[start:end].strip()
-        elif '```' in content:
-            start = content.find('```') + 3
-            end = content.find('```', start)
-            content = content[start:end].strip()
+        response = chain.invoke({"query": query}, config=_llm_config('location_suggestions'))
+        content = extract_json_content(response.content)
         
         suggestions = json.loads(content)
         return suggestions if isinstance(suggestions, list) else []
@@ -261,6 +264,23 @@ def get_location_suggestions(query):
 
 # Add this new function to your ai_service.py file
 
+def _station_code_chain():
+    prompt = ChatPromptTemplate.from_messages([
+        ("system", STATION_CODE_SYSTEM_PROMPT),
+        ("human", "City: {city}")
+    ])
+    return prompt | llm
+
+def _parse_station_code(response, city_name: str) -> Optional[str]:
+    code = response.content.strip().upper()
+
+    if code.lower() == 'none' or len(code) > 6: # Basic validation
+        logging.warning(f"Could not find a valid station code for '{city_name}'.")
+        return None
+    
+    logging.info(f"Found station code '{code}' for city '{city_name}'.")
+    return code
+
 def get_station_code(city_name: str) -> Optional[str]:
     """
     Uses the LLM to find the primary Indian Railways station code for a given city.
@@ -269,23 +289,9 @@ def get_station_code(city_name: str) -> Optional[str]:
         return None
 
     try:
-        prompt = ChatPromptTemplate.from_messages([
-            ("system", "You are an Indian Railways expert. Your task is to provide the primary, most common railway station code for a given Indian city. Respond with ONLY the station code in uppercase. For example, for 'New Delhi' respond with 'NDLS'. For 'Kolkata' respond with 'HWH'. If you cannot find a code, respond with 'None'."),
-            ("human", "City: {city}")
-        ])
-
-        chain = prompt | llm
-        response = chain.invoke({"city": city_name})
-        
-        code = response.content.strip().upper()
-
-        if code.lower() == 'none' or len(code) > 6: # Basic validation
-            logging.warning(f"Could not find a valid station code for '{city_name}'.")
-            return None
-        
-        logging.info(f"Found station code '{code}' for city '{city_name}'.")
-        return code
+        response = _station_code_chain().invoke({"city": city_name}, config=_llm_config('station_code'))
+        return _parse_station_code(response, city_name)
 
     except Exception as e:
         logging.error(f"Error getting station code for '{city_name}': {e}")
-        return None        
\ No newline at end of file
+        return None
@@ -0,0 +1,279 @@
+"""
+Similarity-based cache of chatbot answers.
+
+Questions are normalized, stripped of stop words and turned into L2-normalized
+hashed bag-of-words vectors (unigrams and bigrams, ANSWER_CACHE_DIMENSIONS
+buckets), so near-duplicates such as "what's the weather like in Goa" and
+"how is the weather in goa" land close together without any model download.
+
+Entries are scoped by the trip destination plus the places the question names
+(via the gazetteer), so "weather in Goa" can never answer "weather in Jaipur".
+Questions about the user's own trip ("is my budget enough", "what's on day 2")
+are also scoped by the version of the trip context the answer was written with,
+so they are only ever served for that same itinerary as it was then; generic
+ones ("cheap food in Jaipur") are shared by every trip to the destination.
+
+Each scope key also carries the current generation of every place in it, a
+counter kept in the answer_cache_generation table. invalidate(place) bumps it
+(refresh_weather_alerts does so when a place's alerts change), which moves every
+worker to fresh scopes within ANSWER_CACHE_GENERATION_TTL seconds, the time a
+worker trusts its memoized copy of a counter.
+
+Within a scope a lookup is one matrix-vector product; the best match is used
+when its cosine similarity is at least ANSWER_CACHE_THRESHOLD. Entries expire
+after ANSWER_CACHE_TTL seconds (WEATHER_ANSWER_TTL for weather questions), and
+the least recently used scopes go once there are more than ANSWER_CACHE_MAX_SCOPES.
+
+Short questions ("and tomorrow?") and follow-ups that name no place ("how do
+I get there") depend on the conversation so far and are never cached.
+"""
+import logging
+import os
+import re
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from flask import has_app_context
+from sqlalchemy import insert, select, update
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+
+from gazetteer import gazetteer, normalize
+from metrics import record_cache
+
+ANSWER_CACHE_ENABLED = os.environ.get("ANSWER_CACHE_ENABLED", "true").lower() in ('1', 'true', 'yes')
+ANSWER_CACHE_THRESHOLD = float(os.environ.get("ANSWER_CACHE_THRESHOLD", 0.82))
+ANSWER_CACHE_TTL = int(os.environ.get("ANSWER_CACHE_TTL", 6 * 3600))
+WEATHER_ANSWER_TTL = int(os.environ.get("WEATHER_ANSWER_TTL", 3600))
+ANSWER_CACHE_GENERATION_TTL = float(os.environ.get("ANSWER_CACHE_GENERATION_TTL", 30))
+ANSWER_CACHE_MAX_SCOPES = int(os.environ.get("ANSWER_CACHE_MAX_SCOPES", 500))
+ANSWER_CACHE_SCOPE_ENTRIES = int(os.environ.get("ANSWER_CACHE_SCOPE_ENTRIES", 100))
+ANSWER_CACHE_DIMENSIONS = 1024
+MIN_CONTENT_WORDS = 2
+BIGRAM_WEIGHT = 0.5  # word order matters a little, so reworded questions still match
+
+STOP_WORDS = frozenset("""
+a an the is are was were be been am do does did i me my we our you your he she they them their it its
+to of in on at for from with about into by as and or but if so than then this that these those there here
+what whats which who whom how when where why can could would should will shall may might must please tell
+give any some much many very just also like know want need get go going let lets im id ive hi hello hey
+today now currently right
+""".split())
+# Words that make a question lean on earlier messages
+FOLLOW_UP_WORDS = frozenset("that this those these there them they he she above previous same again else".split())
+WEATHER_WORDS = frozenset("weather temperature rain raining rainy forecast climate hot cold humid monsoon storm snow".split())
+# Words that tie a question to the user's own trip rather than the destination
+PERSONAL_WORDS = frozenset("my our we us mine ours itinerary schedule booked".split())
+_DAY_NUMBER = re.compile(r'\bday \d+\b')
+MAX_MEMOIZED_GENERATIONS = 5000
+
+
+def question_terms(question: str) -> Tuple[List[str], bool]:
+    """Content words of a question, and whether it reads as a follow-up"""
+    words = normalize(question).split()
+    follow_up = any(word in FOLLOW_UP_WORDS for word in words)
+    return [word for word in words if word not in STOP_WORDS], follow_up
+
+
+def vectorize(terms: List[str]) -> np.ndarray:
+    """Signed feature hashing of unigrams and (half-weight) bigrams, log-scaled and L2-normalized"""
+    vector = np.zeros(ANSWER_CACHE_DIMENSIONS, dtype=np.float32)
+    features = [(term, 1.0) for term in terms] + [(f"{a} {b}", BIGRAM_WEIGHT) for a, b in zip(terms, terms[1:])]
+    for feature, weight in features:
+        digest = zlib.crc32(feature.encode('utf-8'))
+        vector[digest % ANSWER_CACHE_DIMENSIONS] += weight if digest & 0x80000000 else -weight
+    np.copysign(np.log1p(np.abs(vector)), vector, out=vector)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+def is_personal(question: str) -> bool:
+    """Whether the answer depends on the asker's trip ("is my budget enough", "what's on day 2")"""
+    text = normalize(question)
+    return _DAY_NUMBER.search(text) is not None or any(word in PERSONAL_WORDS for word in text.split())
+
+
+class _Generations:
+    """Per-place invalidation counters from the answer_cache_generation table, memoized briefly per worker"""
+
+    def __init__(self, ttl: float = ANSWER_CACHE_GENERATION_TTL):
+        self.ttl = ttl
+        self._memo: Dict[str, Tuple[int, float]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, place_key: str) -> int:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._memo.get(place_key)
+            if entry is not None and entry[1] > now:
+                return entry[0]
+        generation = self._load(place_key)
+        with self._lock:
+            if len(self._memo) >= MAX_MEMOIZED_GENERATIONS:
+                self._memo.clear()
+            self._memo[place_key] = (generation, now + self.ttl)
+        return generation
+
+    def bump(self, place_key: str):
+        engine, table = self._table()
+        with self._lock:
+            self._memo.pop(place_key, None)
+        if engine is None:
+            return
+        bumped = {'generation': table.c.generation + 1, 'updated_at': datetime.utcnow()}
+        # Own connection, so invalidating never commits the caller's ORM session
+        try:
+            with engine.begin() as conn:
+                updated = conn.execute(update(table).where(table.c.place_key == place_key).values(**bumped))
+                if updated.rowcount == 0:
+                    conn.execute(insert(table).values(place_key=place_key, generation=1, updated_at=datetime.utcnow()))
+        except IntegrityError:
+            # Another worker created the row first; bump it instead
+            try:
+                with engine.begin() as conn:
+                    conn.execute(update(table).where(table.c.place_key == place_key).values(**bumped))
+            except SQLAlchemyError as e:
+                logging.error(f"Answer cache invalidation failed for '{place_key}': {e}")
+        except SQLAlchemyError as e:
+            logging.error(f"Answer cache invalidation failed for '{place_key}': {e}")
+
+    def clear(self):
+        with self._lock:
+            self._memo.clear()
+
+    @staticmethod
+    def _table():
+        if not has_app_context():
+            return None, None
+        from app import db
+        from models import AnswerCacheGeneration
+        return db.engine, AnswerCacheGeneration.__table__
+
+    def _load(self, place_key: str) -> int:
+        engine, table = self._table()
+        if engine is None:
+            return 0
+        try:
+            with engine.connect() as conn:
+                generation = conn.execute(
+                    select(table.c.generation).where(table.c.place_key == place_key)).scalar()
+        except SQLAlchemyError as e:
+            logging.error(f"Answer cache generation read failed for '{place_key}': {e}")
+            return 0
+        return generation or 0
+
+
+class _Scope:
+    def __init__(self):
+        self.questions: List[str] = []
+        self.answers: List[str] = []
+        self.expires: List[float] = []
+        self.matrix = np.zeros((0, ANSWER_CACHE_DIMENSIONS), dtype=np.float32)
+
+    def drop_expired(self, now: float):
+        keep = [i for i, expires in enumerate(self.expires) if expires > now]
+        if len(keep) < len(self.expires):
+            self.questions = [self.questions[i] for i in keep]
+            self.answers = [self.answers[i] for i in keep]
+            self.expires = [self.expires[i] for i in keep]
+            self.matrix = self.matrix[keep]
+
+    def add(self, question: str, answer: str, vector: np.ndarray, expires: float, max_entries: int):
+        self.questions.append(question)
+        self.answers.append(answer)
+        self.expires.append(expires)
+        self.matrix = np.vstack([self.matrix, vector])
+        if len(self.answers) > max_entries:
+            del self.questions[0], self.answers[0], self.expires[0]
+            self.matrix = self.matrix[1:]
+
+
+class AnswerCache:
+    def __init__(self, threshold: float = ANSWER_CACHE_THRESHOLD, max_scopes: int = ANSWER_CACHE_MAX_SCOPES,
+                 scope_entries: int = ANSWER_CACHE_SCOPE_ENTRIES):
+        self.threshold = threshold
+        self.max_scopes = max_scopes
+        self.scope_entries = scope_entries
+        self._scopes: Dict[Tuple[str, Tuple[str, ...], str, Tuple[int, ...]], _Scope] = OrderedDict()
+        self._lock = threading.Lock()
+        self.generations = _Generations()
+
+    def _prepare(self, question: str, destination: Optional[str], trip_version: Optional[str]):
+        """(scope key, vector, weather?) for a cacheable question, else None"""
+        if not ANSWER_CACHE_ENABLED:
+            return None
+        terms, follow_up = question_terms(question)
+        if len(terms) < MIN_CONTENT_WORDS:
+            return None
+        places = tuple(sorted(gazetteer.places_in(question)))
+        # "how do I get there" needs the conversation; "is that far from Baga" names its place
+        if follow_up and not places:
+            return None
+        destination = normalize(destination or '')
+        version = (trip_version or '') if is_personal(question) else ''
+        generations = tuple(self.generations.get(place) if place else 0 for place in (destination,) + tuple(map(normalize, places)))
+        scope = (destination, places, version, generations)
+        return scope, vectorize(terms), any(term in WEATHER_WORDS for term in terms)
+
+    def lookup(self, question: str, destination: Optional[str] = None, trip_version: Optional[str] = None) -> Optional[str]:
+        """`trip_version` is the TripContext version the answer may depend on, if the chat has a trip"""
+        prepared = self._prepare(question, destination, trip_version)
+        if prepared is None:
+            return None
+        scope_key, vector, _ = prepared
+        answer = None
+        with self._lock:
+            scope = self._scopes.get(scope_key)
+            if scope is not None:
+                self._scopes.move_to_end(scope_key)
+                scope.drop_expired(time.time())
+                if scope.answers:
+                    similarities = scope.matrix @ vector
+                    best = int(np.argmax(similarities))
+                    if similarities[best] >= self.threshold:
+                        answer = scope.answers[best]
+        record_cache('chatbot_answer', answer is not None)
+        return answer
+
+    def store(self, question: str, answer: str, destination: Optional[str] = None, trip_version: Optional[str] = None):
+        prepared = self._prepare(question, destination, trip_version)
+        if prepared is None or not answer:
+            return
+        scope_key, vector, weather = prepared
+        expires = time.time() + (WEATHER_ANSWER_TTL if weather else ANSWER_CACHE_TTL)
+        with self._lock:
+            scope = self._scopes.get(scope_key)
+            if scope is None:
+                scope = self._scopes[scope_key] = _Scope()
+                while len(self._scopes) > self.max_scopes:
+                    self._scopes.popitem(last=False)
+            self._scopes.move_to_end(scope_key)
+            scope.add(question, answer, vector, expires, self.scope_entries)
+
+    def invalidate(self, place: str):
+        """Retire cached answers about `place`, whether it was the trip or a place asked about, in every worker"""
+        keys = {normalize(place)}
+        canonical = gazetteer.lookup(place)
+        if canonical:
+            keys.add(normalize(canonical['name']))
+        for key in keys - {''}:
+            self.generations.bump(key)
+
+    def clear(self):
+        with self._lock:
+            self._scopes.clear()
+        self.generations.clear()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                'scopes': len(self._scopes),
+                'entries': sum(len(scope.answers) for scope in self._scopes.values())
+            }
+
+
+answer_cache = AnswerCache()
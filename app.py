@@ -2,6 +2,8 @@ import os
 import logging
 from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import inspect, text
+from sqlalchemy.exc import OperationalError, ProgrammingError
 from sqlalchemy.orm import DeclarativeBase
 from werkzeug.middleware.proxy_fix import ProxyFix
 from dotenv import load_dotenv
@@ -45,12 +47,67 @@ app.config["SQLALCHEMY_DATABASE_URI"] = database_url
 # initialize the app with the extension
 db.init_app(app)
 
+# request/dependency metrics (/metrics), opt-in request profiling (/api/profiles) and span tracing
+import metrics  # noqa: E402
+import profiling  # noqa: E402
+import tracing  # noqa: E402
+metrics.init_app(app)
+profiling.init_app(app)
+tracing.init_app(app)
+
+def _has_column(table_name, column_name):
+    return any(column['name'] == column_name for column in inspect(db.engine).get_columns(table_name))
+
+def add_missing_columns():
+    """
+    db.create_all() only creates missing tables. Add nullable columns (and their
+    indexes) that models gained since an existing table was created. Every
+    gunicorn worker runs this at import, so losing a race to another worker that
+    added the same column (or index) first is not an error.
+    """
+    inspector = inspect(db.engine)
+    for table in db.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {column['name'] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing or not column.nullable:
+                continue
+            column_type = column.type.compile(dialect=db.engine.dialect)
+            try:
+                with db.engine.begin() as conn:
+                    conn.execute(text(f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}'))
+            except (OperationalError, ProgrammingError):
+                if not _has_column(table.name, column.name):
+                    raise
+                continue  # another worker added it (and creates its indexes)
+            for index in table.indexes:
+                if index.columns.contains_column(column):
+                    try:
+                        index.create(db.engine, checkfirst=True)
+                    except (OperationalError, ProgrammingError):
+                        if index.name not in {i['name'] for i in inspect(db.engine).get_indexes(table.name)}:
+                            raise
+            app.logger.info(f"Added column {table.name}.{column.name}")
+
 with app.app_context():
     # Import models and routes
     import models  # noqa: F401
     import routes  # noqa: F401
+    import commands  # noqa: F401
+    import weather_alerts  # noqa: F401
+    import trip_monitoring  # noqa: F401
+    
+    try:
+        db.create_all()
+    except (OperationalError, ProgrammingError):
+        # Another worker booting at the same time created a table first; the rest still need creating
+        db.create_all()
+    add_missing_columns()
     
-    db.create_all()
+    # Background jobs (weather alerts, ...) when SCHEDULER_ENABLED is set
+    import scheduler  # noqa: E402
+    scheduler.init_app(app)
 
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=5000, debug=True)
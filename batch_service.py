@@ -0,0 +1,374 @@
+"""
+Bulk itinerary generation for tour operators.
+
+A batch is a list of trip requests (destination x duration x budget x interests)
+loaded from CSV or JSON. Identical requests are collapsed, generation runs on a
+small thread pool throttled to the Groq rate limit, and finished itineraries
+are written back in chunks with bulk inserts. Once generation is over, their
+checkpoints are geocoded and their chat suggestions computed in one pass, with
+suggestion model calls throttled by the same limiter. Items that are not 'done'
+are picked up again when a batch is resumed.
+
+A run first claims its batch with a conditional UPDATE, so only one process
+(CLI or any web worker) generates a batch at a time. The claim is kept alive
+through heartbeat_at; one silent for BATCH_CLAIM_TIMEOUT seconds belongs to a
+run that died and can be taken over.
+"""
+import csv
+import hashlib
+import io
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from sqlalchemy import insert, or_, update
+
+from app import app, db
+from models import TravelItinerary, Checkpoint, BatchJob, BatchItem, checkpoint_rows
+from ai_service import generate_llm_itinerary
+from checkpoint_geocoding import geocode_checkpoints
+from chat_suggestions import precompute_suggestions
+from trip_context import store_trip_context
+
+BATCH_MAX_WORKERS = int(os.environ.get("BATCH_MAX_WORKERS", 4))
+BATCH_LLM_RPM = float(os.environ.get("BATCH_LLM_RPM", 30))  # Groq requests per minute
+BATCH_COMMIT_SIZE = int(os.environ.get("BATCH_COMMIT_SIZE", 20))
+BATCH_CLAIM_TIMEOUT = int(os.environ.get("BATCH_CLAIM_TIMEOUT", 15 * 60))
+
+
+class RateLimiter:
+    """Thread-safe token bucket: at most `rate_per_minute` acquisitions per minute"""
+
+    def __init__(self, rate_per_minute: float, burst: int = 1):
+        self.interval = 60.0 / rate_per_minute if rate_per_minute > 0 else 0
+        self.capacity = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        if not self.interval:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) / self.interval)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) * self.interval
+            time.sleep(wait)
+
+
+def parse_batch_requests(content: str, fmt: str) -> List[Dict]:
+    """
+    Parse raw batch input. CSV needs destination, duration and budget columns and
+    an optional interests column separated by ';' or '|'. JSON is a list of objects
+    (or {"requests": [...]}) with the same keys; interests may be a list.
+    Raises ValueError when the input is not in that shape.
+    """
+    if fmt == 'json':
+        data = json.loads(content)
+        if isinstance(data, dict):
+            data = data.get('requests', [])
+        if not isinstance(data, list):
+            raise ValueError("expected a list of trip requests")
+        return data
+
+    rows = []
+    for row in csv.DictReader(io.StringIO(content.lstrip('\ufeff'))):
+        interests = (row.get('interests') or '').replace('|', ';')
+        rows.append({
+            'destination': row.get('destination', ''),
+            'duration': row.get('duration'),
+            'budget': row.get('budget'),
+            'interests': [i for i in interests.split(';') if i.strip()]
+        })
+    return rows
+
+
+def normalize_request(raw: Dict) -> Optional[Dict]:
+    """Validate one request and compute its dedupe key; returns None if it is unusable"""
+    if not isinstance(raw, dict):
+        return None
+    try:
+        destination = str(raw.get('destination', '')).strip()
+        duration = int(raw.get('duration'))
+        budget = float(raw.get('budget'))
+    except (TypeError, ValueError):
+        return None
+
+    if not destination or duration <= 0 or budget <= 0:
+        return None
+
+    interests = raw.get('interests') or []
+    if isinstance(interests, str):
+        interests = interests.replace('|', ';').split(';')
+    if not isinstance(interests, list):
+        return None
+    interests = sorted({str(i).strip().lower() for i in interests if i and str(i).strip()})
+
+    key_source = json.dumps([destination.lower(), duration, round(budget, 2), interests])
+    return {
+        'request_key': hashlib.sha1(key_source.encode('utf-8')).hexdigest(),
+        'destination': destination,
+        'duration': duration,
+        'budget': budget,
+        'interests': interests
+    }
+
+
+def create_batch(raw_requests: List[Dict], name: Optional[str] = None) -> Dict:
+    """Dedupe the requests and store them as a new batch. Returns a summary including rejected rows."""
+    items = {}
+    invalid = []
+    for index, raw in enumerate(raw_requests):
+        request_data = normalize_request(raw)
+        if request_data is None:
+            invalid.append(index)
+            continue
+        items.setdefault(request_data['request_key'], request_data)
+
+    valid_count = len(raw_requests) - len(invalid)
+    batch = BatchJob(
+        name=name,
+        total_items=len(items),
+        duplicate_count=valid_count - len(items)
+    )
+    db.session.add(batch)
+    db.session.flush()
+
+    if items:
+        db.session.execute(insert(BatchItem), [
+            {
+                'batch_id': batch.id,
+                'request_key': item['request_key'],
+                'destination': item['destination'],
+                'duration': item['duration'],
+                'budget': item['budget'],
+                'interests': json.dumps(item['interests']),
+                'status': 'pending'
+            }
+            for item in items.values()
+        ])
+    db.session.commit()
+
+    return {
+        'batch_id': batch.id,
+        'total_items': batch.total_items,
+        'duplicates_removed': batch.duplicate_count,
+        'invalid_rows': invalid
+    }
+
+
+def claim_batch(batch_id: int) -> bool:
+    """Mark the batch running for this caller; False while another run holds a live claim"""
+    now = datetime.utcnow()
+    stale = now - timedelta(seconds=BATCH_CLAIM_TIMEOUT)
+    claimed = db.session.execute(
+        update(BatchJob)
+        .where(BatchJob.id == batch_id,
+               or_(BatchJob.status.is_(None), BatchJob.status != 'running',
+                   BatchJob.heartbeat_at.is_(None), BatchJob.heartbeat_at < stale))
+        .values(status='running', heartbeat_at=now)
+        .execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+    return claimed.rowcount == 1
+
+
+def _heartbeat(batch_id: int):
+    """Keep this run's claim alive; own connection, so it never commits the session's work"""
+    table = BatchJob.__table__
+    with db.engine.begin() as conn:
+        conn.execute(update(table).where(table.c.id == batch_id).values(heartbeat_at=datetime.utcnow()))
+
+
+def _flush_results(results: List[Dict]) -> List[int]:
+    """Bulk-insert finished itineraries and their checkpoints, mark the items done; returns the itinerary ids"""
+    itineraries = []
+    for result in results:
+        item = result['item']
+        itinerary = TravelItinerary(
+            destination=item['destination'],
+            duration=item['duration'],
+            budget=item['budget']
+        )
+        itinerary.set_interests_list(item['interests'])
+        itinerary.set_itinerary_data(result['itinerary_data'])
+        store_trip_context(itinerary)
+        itineraries.append(itinerary)
+
+    # A single flush emits one batched INSERT ... RETURNING for all itineraries
+    db.session.add_all(itineraries)
+    db.session.flush()
+
+    checkpoints = []
+    for itinerary, result in zip(itineraries, results):
+        for row in checkpoint_rows(result['itinerary_data']):
+            checkpoints.append(dict(row, itinerary_id=itinerary.id))
+    if checkpoints:
+        db.session.execute(insert(Checkpoint), checkpoints)
+
+    now = datetime.utcnow()
+    db.session.execute(update(BatchItem), [
+        {'id': result['item']['id'], 'status': 'done', 'itinerary_id': itinerary.id, 'error': None, 'updated_at': now}
+        for itinerary, result in zip(itineraries, results)
+    ])
+    db.session.commit()
+    return [itinerary.id for itinerary in itineraries]
+
+
+def _post_process(batch_id: int, itinerary_ids: List[int], limiter: 'RateLimiter'):
+    """
+    Geocode checkpoints and compute chat suggestions for the new itineraries, a
+    chunk at a time. A batch usually repeats destinations, so most suggestions
+    come from the shared cache; the model calls it does need wait on `limiter`.
+    """
+    for start in range(0, len(itinerary_ids), BATCH_COMMIT_SIZE):
+        chunk = itinerary_ids[start:start + BATCH_COMMIT_SIZE]
+        try:
+            geocode_checkpoints(chunk)
+        except Exception as e:
+            db.session.rollback()
+            logging.error(f"Geocoding batch {batch_id} checkpoints failed: {e}")
+        try:
+            precompute_suggestions(chunk, before_model_call=limiter.acquire)
+        except Exception as e:
+            db.session.rollback()
+            logging.error(f"Computing chat suggestions for batch {batch_id} failed: {e}")
+        _heartbeat(batch_id)
+
+
+def _mark_failed(failures: List[Dict]):
+    now = datetime.utcnow()
+    db.session.execute(update(BatchItem), [
+        {'id': failure['id'], 'status': 'failed', 'error': failure['error'], 'updated_at': now}
+        for failure in failures
+    ])
+    db.session.commit()
+
+
+def run_batch(batch_id: int, max_workers: int = BATCH_MAX_WORKERS, rate_per_minute: float = BATCH_LLM_RPM) -> Dict:
+    """
+    Generate every item of a batch that is not done yet. Safe to call again on a
+    partially completed batch: finished items are skipped. Returns the manifest, or
+    just the 'running' status when another run holds the batch. Must run inside an
+    app context.
+    """
+    if not db.session.get(BatchJob, batch_id):
+        raise ValueError(f"Batch {batch_id} not found")
+    if not claim_batch(batch_id):
+        return {'batch_id': batch_id, 'status': 'running'}
+
+    try:
+        pending = BatchItem.query.filter(BatchItem.batch_id == batch_id, BatchItem.status != 'done').all()
+        # Plain dicts so worker threads never touch ORM objects
+        work = [{
+            'id': item.id,
+            'destination': item.destination,
+            'duration': item.duration,
+            'budget': item.budget,
+            'interests': item.get_interests_list()
+        } for item in pending]
+
+        limiter = RateLimiter(rate_per_minute)
+
+        def generate(item):
+            limiter.acquire()
+            # Never the basic template: a failed or throttled item is marked failed so a resume retries it
+            return generate_llm_itinerary(item['destination'], item['duration'], item['budget'], item['interests'])
+
+        logging.info(f"Batch {batch_id}: generating {len(work)} itineraries with {max_workers} workers")
+        buffer, failures, itinerary_ids = [], [], []
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {executor.submit(generate, item): item for item in work}
+            for future in as_completed(futures):
+                item = futures[future]
+                try:
+                    itinerary_data = future.result()
+                    buffer.append({'item': item, 'itinerary_data': itinerary_data})
+                except Exception as e:
+                    logging.error(f"Batch {batch_id} item {item['id']} failed: {e}")
+                    failures.append({'id': item['id'], 'error': str(e)})
+                _heartbeat(batch_id)
+
+                if len(buffer) >= BATCH_COMMIT_SIZE:
+                    itinerary_ids.extend(_flush_results(buffer))
+                    buffer = []
+
+        if buffer:
+            itinerary_ids.extend(_flush_results(buffer))
+        if failures:
+            _mark_failed(failures)
+
+        _post_process(batch_id, itinerary_ids, limiter)
+
+        batch = db.session.get(BatchJob, batch_id)
+        remaining = BatchItem.query.filter(BatchItem.batch_id == batch_id, BatchItem.status != 'done').count()
+        batch.status = 'completed' if remaining == 0 else 'partial'
+        batch.finished_at = datetime.utcnow()
+        db.session.commit()
+
+        return batch_manifest(batch_id)
+
+    except Exception:
+        db.session.rollback()
+        batch = db.session.get(BatchJob, batch_id)
+        if batch:
+            batch.status = 'partial'
+            db.session.commit()
+        raise
+
+
+def run_batch_in_background(batch_id: int, **kwargs) -> threading.Thread:
+    """Process a batch on a daemon thread with its own app context"""
+    def target():
+        with app.app_context():
+            try:
+                run_batch(batch_id, **kwargs)
+            except Exception as e:
+                logging.error(f"Batch {batch_id} failed: {e}")
+
+    thread = threading.Thread(target=target, name=f"batch-{batch_id}", daemon=True)
+    thread.start()
+    return thread
+
+
+def batch_manifest(batch_id: int) -> Optional[Dict]:
+    """Status of a batch and one entry per item, with the itinerary id once generated"""
+    batch = db.session.get(BatchJob, batch_id)
+    if not batch:
+        return None
+
+    items = BatchItem.query.filter_by(batch_id=batch_id).order_by(BatchItem.id).all()
+    counts = {}
+    for item in items:
+        counts[item.status] = counts.get(item.status, 0) + 1
+
+    return {
+        'batch_id': batch.id,
+        'name': batch.name,
+        'status': batch.status,
+        'total_items': batch.total_items,
+        'duplicates_removed': batch.duplicate_count,
+        'counts': counts,
+        'created_at': batch.created_at.isoformat() if batch.created_at else None,
+        'finished_at': batch.finished_at.isoformat() if batch.finished_at else None,
+        'items': [{
+            'request_key': item.request_key,
+            'destination': item.destination,
+            'duration': item.duration,
+            'budget': item.budget,
+            'interests': item.get_interests_list(),
+            'status': item.status,
+            'itinerary_id': item.itinerary_id,
+            'error': item.error
+        } for item in items]
+    }
@@ -0,0 +1,90 @@
+"""
+Concurrency benchmark for the outbound-call-heavy endpoints.
+
+Fires N concurrent requests at one endpoint and reports throughput and latency
+percentiles. Run it against the same endpoint under each worker profile, so
+the only difference between the runs is the worker class:
+
+    WORKER_PROFILE=sync  gunicorn -c gunicorn.conf.py -w 1 main:app
+    python benchmarks/concurrency_bench.py /api/weather/Goa -c 200
+
+    WORKER_PROFILE=async gunicorn -c gunicorn.conf.py -w 1 main:app
+    python benchmarks/concurrency_bench.py /api/weather/Goa -c 200
+
+With a single sync worker, requests queue behind each upstream wait and total
+time grows roughly linearly with concurrency. With a single gevent worker the
+waits overlap and total time stays close to one upstream round trip. Point the
+app at replay_server.py and restart it between runs, so both profiles start
+with a cold weather cache and actually wait on the upstream.
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+import httpx
+
+
+async def _one(client, method, path, payload):
+    start = time.perf_counter()
+    try:
+        if method == 'POST':
+            response = await client.post(path, json=payload)
+        else:
+            response = await client.get(path)
+        status = response.status_code
+    except httpx.HTTPError:
+        status = 'error'
+    return time.perf_counter() - start, status
+
+
+async def run(base_url, path, concurrency, total, method, payload):
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, timeout=300, limits=limits) as client:
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def bounded():
+            async with semaphore:
+                return await _one(client, method, path, payload)
+
+        start = time.perf_counter()
+        results = await asyncio.gather(*(bounded() for _ in range(total)))
+        elapsed = time.perf_counter() - start
+
+    latencies = sorted(r[0] for r in results)
+    statuses = {}
+    for _, status in results:
+        statuses[status] = statuses.get(status, 0) + 1
+
+    def pct(p):
+        return latencies[min(len(latencies) - 1, int(p * len(latencies)))]
+
+    print(f"{method} {path}  concurrency={concurrency} requests={total}")
+    print(f"  wall time   {elapsed:.2f}s  ({total / elapsed:.1f} req/s)")
+    print(f"  latency     p50={pct(0.50):.3f}s p95={pct(0.95):.3f}s p99={pct(0.99):.3f}s "
+          f"mean={statistics.mean(latencies):.3f}s")
+    print(f"  statuses    {statuses}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('path', help="Endpoint path, e.g. /api/weather/Goa")
+    parser.add_argument('--base-url', default='http://localhost:5000')
+    parser.add_argument('-c', '--concurrency', type=int, default=100)
+    parser.add_argument('-n', '--requests', type=int, default=None, help="Total requests (default: concurrency)")
+    parser.add_argument('--chat', metavar='MESSAGE', help="POST this message as a chatbot request")
+    parser.add_argument('--city', help="POST this city as a station-code request")
+    args = parser.parse_args()
+
+    method, payload = 'GET', None
+    if args.chat:
+        method, payload = 'POST', {'message': args.chat}
+    elif args.city:
+        method, payload = 'POST', {'city': args.city}
+
+    total = args.requests or args.concurrency
+    asyncio.run(run(args.base_url, args.path, args.concurrency, total, method, payload))
+
+
+if __name__ == '__main__':
+    main()
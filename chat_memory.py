@@ -0,0 +1,106 @@
+"""
+Token-budgeted conversation memory for TravelChatbot.
+
+The most recent messages are kept verbatim as long as they fit in
+CHATBOT_RECENT_TOKENS (the last exchange always stays, however long).
+Older exchanges are folded into a rolling summary, one compact line each
+(the gist of the question and of the answer). The oldest lines are dropped
+once the summary exceeds CHATBOT_SUMMARY_TOKENS. Summarizing is extractive,
+so it never adds a model call to a turn.
+
+Token counts are estimated at ~4 characters per token; that is close enough
+for Llama-family tokenizers to keep prompts within budget.
+"""
+import os
+import re
+from typing import List, Optional
+
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, SystemMessage
+
+from metrics import TOKEN_BUCKETS, registry
+
+CHATBOT_RECENT_TOKENS = int(os.environ.get("CHATBOT_RECENT_TOKENS", 1200))
+CHATBOT_SUMMARY_TOKENS = int(os.environ.get("CHATBOT_SUMMARY_TOKENS", 300))
+CHARS_PER_TOKEN = 4
+GIST_WORDS = 18  # per side of a summarized exchange
+
+chatbot_prompt_tokens = registry.histogram('chatbot_prompt_tokens', 'Estimated prompt tokens per chatbot turn, by part',
+                                           ('part',), buckets=TOKEN_BUCKETS)
+
+_SENTENCE_END = re.compile(r'(?<=[.!?])\s')
+
+
+def estimate_tokens(text: str) -> int:
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def message_tokens(messages: List[BaseMessage]) -> int:
+    # A few tokens of role/format overhead per message
+    return sum(estimate_tokens(message.content) + 4 for message in messages)
+
+
+def gist(text: str, max_words: int = GIST_WORDS) -> str:
+    """First sentence of `text`, cut to `max_words` words"""
+    first = _SENTENCE_END.split(' '.join(text.split()), maxsplit=1)[0]
+    words = first.split()
+    return ' '.join(words[:max_words]) + ('…' if len(words) > max_words else '')
+
+
+class TokenBudgetMemory:
+    def __init__(self, recent_tokens: int = CHATBOT_RECENT_TOKENS, summary_tokens: int = CHATBOT_SUMMARY_TOKENS):
+        self.recent_tokens = recent_tokens
+        self.summary_tokens = summary_tokens
+        self.messages: List[BaseMessage] = []
+        self.summary_lines: List[str] = []
+
+    def save(self, user_message: str, response: str):
+        self.messages.extend([HumanMessage(content=user_message), AIMessage(content=response)])
+        self._compact()
+
+    def load(self, messages: List[BaseMessage]):
+        """Replace the memory with stored messages; anything over budget goes to the summary"""
+        self.messages = list(messages)
+        self.summary_lines = []
+        self._compact()
+
+    def clear(self):
+        self.messages = []
+        self.summary_lines = []
+
+    @property
+    def summary(self) -> str:
+        return '\n'.join(self.summary_lines)
+
+    def context_messages(self) -> List[BaseMessage]:
+        """The summary as a system message, if there is one"""
+        if not self.summary_lines:
+            return []
+        return [SystemMessage(content=f"Earlier in this conversation:\n{self.summary}")]
+
+    def _compact(self):
+        # Fold the oldest exchange into the summary until the rest fits (the last exchange always stays)
+        while len(self.messages) > 2 and message_tokens(self.messages) > self.recent_tokens:
+            oldest = self.messages[:2] if self.messages[0].type == 'human' else self.messages[:1]
+            del self.messages[:len(oldest)]
+            self.summary_lines.append(self._summarize(oldest))
+        while len(self.summary_lines) > 1 and estimate_tokens(self.summary) > self.summary_tokens:
+            del self.summary_lines[0]
+
+    @staticmethod
+    def _summarize(messages: List[BaseMessage]) -> str:
+        parts = [f"{'User' if message.type == 'human' else 'You'}: {gist(message.content)}" for message in messages]
+        return '- ' + ' / '.join(parts)
+
+
+def record_prompt_tokens(context: List[BaseMessage], history: List[BaseMessage], message: str,
+                         system_tokens: Optional[int] = 0):
+    """Observe one turn's prompt size, in total and by part"""
+    parts = {
+        'system': system_tokens or 0,
+        'context': message_tokens(context),
+        'history': message_tokens(history),
+        'input': estimate_tokens(message),
+    }
+    for part, tokens in parts.items():
+        chatbot_prompt_tokens.observe(tokens, part=part)
+    chatbot_prompt_tokens.observe(sum(parts.values()), part='total')
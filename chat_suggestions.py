@@ -0,0 +1,176 @@
+"""
+Chatbot suggestions, computed once per itinerary instead of on every page view.
+
+After an itinerary is saved its suggestions are filled in by a small shared
+pool (SUGGESTION_WORKERS threads, at most SUGGESTION_QUEUE itineraries waiting;
+beyond that the work is dropped and the chatbot page asks again later) and
+stored in TravelItinerary.chat_suggestions, so /chatbot/<id> renders straight
+from the database. Suggestions depend only on the destination and
+interests, so they are also kept in the SuggestionCache table under
+suggestion_key(destination, interests): every later itinerary with the same
+key reuses them without an LLM call until they are SUGGESTION_CACHE_TTL
+seconds old. Fallback suggestions (model unavailable or unparsable reply) are
+shown but never stored, so the next save or page view tries again.
+"""
+import hashlib
+import json
+import logging
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional
+
+from sqlalchemy import insert, select, update
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+
+from app import app, db
+from chatbot_service import fallback_suggestions
+from chatbot_sessions import chatbot_manager
+from gazetteer import gazetteer, normalize
+from metrics import record_cache
+from models import SuggestionCache, TravelItinerary
+
+SUGGESTION_CACHE_TTL = int(os.environ.get("SUGGESTION_CACHE_TTL", 7 * 24 * 3600))
+SUGGESTION_WORKERS = int(os.environ.get("SUGGESTION_WORKERS", 2))
+SUGGESTION_QUEUE = int(os.environ.get("SUGGESTION_QUEUE", 32))
+MAX_KEY_LENGTH = 200
+
+_executor = ThreadPoolExecutor(max_workers=SUGGESTION_WORKERS, thread_name_prefix='suggestions')
+# Itineraries whose suggestions this process is computing or has queued
+_in_progress = set()
+_in_progress_lock = threading.Lock()
+
+
+def suggestion_key(destination: str, interests: Optional[List[str]]) -> str:
+    """Canonical destination plus sorted interests, e.g. 'jaipur|culture,food'"""
+    place = gazetteer.lookup(destination)
+    name = normalize(place['name'] if place and place.get('match') == 'exact' else destination)
+    key = f"{name}|{','.join(sorted({normalize(i) for i in interests or [] if normalize(i)}))}"
+    if len(key) > MAX_KEY_LENGTH:
+        key = hashlib.sha1(key.encode('utf-8')).hexdigest()
+    return key
+
+
+def _valid(context) -> bool:
+    return (isinstance(context, dict) and not context.get('fallback')
+            and isinstance(context.get('suggestions'), list) and bool(context['suggestions']))
+
+
+def cached_suggestions(key: str) -> Optional[Dict]:
+    """Fresh shared suggestions for `key`, if any"""
+    cutoff = datetime.utcnow() - timedelta(seconds=SUGGESTION_CACHE_TTL)
+    try:
+        row = db.session.execute(
+            select(SuggestionCache.data).where(SuggestionCache.query_key == key, SuggestionCache.updated_at >= cutoff)
+        ).first()
+    except SQLAlchemyError as e:
+        logging.error(f"Suggestion cache read failed for '{key}': {e}")
+        row = None
+    record_cache('chat_suggestions', row is not None)
+    return json.loads(row.data) if row else None
+
+
+def _store(key: str, context: Dict):
+    values = {'data': json.dumps(context), 'updated_at': datetime.utcnow()}
+    table = SuggestionCache.__table__
+    # Own connection, so caching never commits the caller's ORM session
+    try:
+        with db.engine.begin() as conn:
+            updated = conn.execute(update(table).where(table.c.query_key == key).values(**values))
+            if updated.rowcount == 0:
+                conn.execute(insert(table).values(query_key=key, **values))
+    except IntegrityError:
+        pass  # another worker stored it first
+    except SQLAlchemyError as e:
+        logging.error(f"Suggestion cache write failed for '{key}': {e}")
+
+
+def suggestions_for(destination: str, interests: Optional[List[str]],
+                    before_model_call: Optional[Callable[[], None]] = None) -> Dict:
+    """
+    Shared suggestions for a destination and interests, asking the model only on a
+    cache miss. `before_model_call` runs first, e.g. a rate limiter's acquire.
+    """
+    key = suggestion_key(destination, interests)
+    context = cached_suggestions(key)
+    if context is None:
+        if before_model_call:
+            before_model_call()
+        context = chatbot_manager.shared_chatbot().get_contextual_suggestions(destination, interests)
+        if not _valid(context):
+            return fallback_suggestions(destination)
+        context = {'weather_context': context.get('weather_context', ''),
+                   'suggestions': [str(s) for s in context['suggestions']]}
+        _store(key, context)
+    return context
+
+
+def precompute_suggestions(itinerary_ids: List[int], before_model_call: Optional[Callable[[], None]] = None) -> Dict:
+    """Fill in chat_suggestions for the itineraries that have none. Must run inside an app context."""
+    rows = db.session.execute(
+        select(TravelItinerary.id, TravelItinerary.destination, TravelItinerary.interests)
+        .where(TravelItinerary.id.in_(itinerary_ids), TravelItinerary.chat_suggestions.is_(None))
+    ).all()
+
+    # One lookup (and at most one model call) per distinct destination and interests
+    groups: Dict[str, List] = {}
+    for row in rows:
+        interests = json.loads(row.interests) if row.interests else []
+        groups.setdefault(suggestion_key(row.destination, interests), []).append((row, interests))
+
+    updates = []
+    for members in groups.values():
+        row, interests = members[0]
+        context = suggestions_for(row.destination, interests, before_model_call)
+        if context.get('fallback'):
+            continue
+        data = json.dumps(context)
+        updates.extend({'id': member.id, 'chat_suggestions': data} for member, _ in members)
+    if updates:
+        db.session.execute(update(TravelItinerary), updates)
+        db.session.commit()
+
+    return {'itineraries': len(rows), 'keys': len(groups), 'stored': len(updates)}
+
+
+def precompute_suggestions_in_background(itinerary_id: int) -> Optional[Future]:
+    """Queue one itinerary's suggestions on the shared pool; no-op if already queued or the queue is full"""
+    with _in_progress_lock:
+        if itinerary_id in _in_progress or len(_in_progress) >= SUGGESTION_WORKERS + SUGGESTION_QUEUE:
+            return None
+        _in_progress.add(itinerary_id)
+
+    def target():
+        try:
+            with app.app_context():
+                precompute_suggestions([itinerary_id])
+        except Exception as e:
+            logging.error(f"Computing chat suggestions for itinerary {itinerary_id} failed: {e}")
+        finally:
+            with _in_progress_lock:
+                _in_progress.discard(itinerary_id)
+
+    return _executor.submit(target)
+
+
+def page_suggestions(itinerary: TravelItinerary) -> List[str]:
+    """
+    Suggestions for the chatbot page without waiting on the model: stored ones,
+    else the shared cache (stored on the itinerary for next time), else generic
+    ones while the real ones are computed in the background.
+    """
+    context = itinerary.get_chat_suggestions()
+    if context is None:
+        context = cached_suggestions(suggestion_key(itinerary.destination, itinerary.get_interests_list()))
+        if context is not None:
+            itinerary.chat_suggestions = json.dumps(context)
+            try:
+                db.session.commit()
+            except SQLAlchemyError as e:
+                db.session.rollback()
+                logging.error(f"Could not store chat suggestions for itinerary {itinerary.id}: {e}")
+        else:
+            precompute_suggestions_in_background(itinerary.id)
+            context = fallback_suggestions(itinerary.destination)
+    return context.get('suggestions', [])
@@ -5,28 +5,43 @@ from typing import Dict, List, Optional
 import os
 
 # LangChain imports
-from langchain_groq import ChatGroq
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
-from langchain_core.messages import HumanMessage, AIMessage
-from langchain.memory import ConversationBufferWindowMemory
-from langchain.chains import ConversationChain
+from langchain_core.messages import SystemMessage
+
+from llm_factory import create_chat_model
+from ai_service import extract_json_content
+from answer_cache import answer_cache
+from intent_router import intent_router
+from chat_memory import TokenBudgetMemory, estimate_tokens, record_prompt_tokens
+from trip_context import TripContext
+
+CHATBOT_HISTORY_EXCHANGES = int(os.environ.get("CHATBOT_HISTORY_EXCHANGES", 10))  # persisted per conversation
+
+def create_chatbot_llm():
+    return create_chat_model(temperature=0.7, max_tokens=300, operation='chatbot')
+
+def fallback_suggestions(destination):
+    """Generic suggestions for when the model is unavailable; `fallback` marks them as not worth caching"""
+    return {
+        'weather_context': f"Check the current weather in {destination} before you travel.",
+        'suggestions': [
+            f"Popular attractions in {destination}",
+            "Local food specialties to try",
+            "Best transportation options",
+            "Cultural etiquette to follow"
+        ],
+        'fallback': True
+    }
 
 class TravelChatbot:
-    def __init__(self):
+    def __init__(self, llm=None):
+        """`llm` lets many chatbots (one per conversation) share one client"""
         try:
             # Initialize LangChain LLM
-            self.llm = ChatGroq(
-                groq_api_key=os.environ.get("GROQ_API_KEY"),
-                model_name="llama-3.1-8b-instant",
-                temperature=0.7,
-                max_tokens=300
-            )
-            
-            # Initialize conversation memory
-            self.memory = ConversationBufferWindowMemory(
-                k=10,  # Keep last 10 exchanges
-                return_messages=True
-            )
+            self.llm = llm or create_chatbot_llm()
+            
+            # Recent turns verbatim, older ones summarized, within a token budget
+            self.memory = TokenBudgetMemory()
             
             # Create conversation prompt template
             self.prompt = ChatPromptTemplate.from_messages([
@@ -50,17 +65,17 @@ class TravelChatbot:
                 - Safety: Give responsible travel advice
                 
                 Respond in a friendly, knowledgeable tone. Keep responses under 200 words unless detailed explanation is needed."""),
+                MessagesPlaceholder(variable_name="context"),
                 MessagesPlaceholder(variable_name="history"),
                 ("human", "{input}")
             ])
             
-            # Create conversation chain
-            self.conversation = ConversationChain(
-                llm=self.llm,
-                memory=self.memory,
-                prompt=self.prompt,
-                verbose=True
-            )
+            self._system_tokens = estimate_tokens(self.prompt.messages[0].prompt.template)
+            self._context_source = None
+            self._context_block = ""
+            
+            # Create conversation chain; trip context and history are passed in on every turn
+            self.conversation = self.prompt | self.llm
             
             print("LangChain chatbot initialized successfully")
         except Exception as e:
@@ -70,7 +85,7 @@ class TravelChatbot:
             self.conversation = None
 
     def get_context_from_itinerary(self, itinerary_data):
-        """Extract relevant context from user's itinerary"""
+        """Compact description of the user's trip for the system prompt"""
         try:
             if isinstance(itinerary_data, str):
                 itinerary_data = json.loads(itinerary_data)
@@ -79,40 +94,125 @@ class TravelChatbot:
             duration = itinerary_data.get('duration', 0)
             budget = itinerary_data.get('budget_breakdown', {})
             
-            context = f"""
-            Current Trip Context:
-            - Destination: {destination}
-            - Duration: {duration} days
-            - Budget breakdown: Accommodation ₹{budget.get('accommodation', 0)}, Food ₹{budget.get('food', 0)}, Transport ₹{budget.get('transport', 0)}
-            
-            You are helping with this specific trip. Provide contextual advice based on this itinerary.
-            """
-            
-            return context
+            return (f"The user's trip: {destination}, {duration} days. Budget: accommodation ₹{budget.get('accommodation', 0)}, "
+                    f"food ₹{budget.get('food', 0)}, transport ₹{budget.get('transport', 0)}. "
+                    "Tailor advice to this trip.")
         except Exception as e:
             logging.error(f"Error extracting itinerary context: {e}")
             return ""
 
+    def _trip_context(self, itinerary_context):
+        """The trip's system block: precompiled for a TripContext, else built once per itinerary"""
+        if not itinerary_context:
+            return ""
+        if isinstance(itinerary_context, TripContext):
+            return itinerary_context.prompt
+        if itinerary_context != self._context_source:
+            self._context_block = self.get_context_from_itinerary(itinerary_context)
+            self._context_source = itinerary_context
+        return self._context_block
+
+    @staticmethod
+    def _trip(itinerary_context):
+        if isinstance(itinerary_context, TripContext):
+            return itinerary_context.as_trip()
+        if isinstance(itinerary_context, str):
+            try:
+                itinerary_context = json.loads(itinerary_context)
+            except ValueError:
+                return {}
+        return itinerary_context if isinstance(itinerary_context, dict) else {}
+
+    @staticmethod
+    def _cache_scope(itinerary_context):
+        """
+        (destination, trip version) for the answer cache, or None when the answer may
+        depend on a trip that has no version to scope it by (a raw itinerary dict)
+        """
+        if isinstance(itinerary_context, TripContext):
+            return itinerary_context.destination, itinerary_context.version
+        if itinerary_context:
+            return None
+        return None, None
+
+    def _store_answer(self, user_message, response, itinerary_context):
+        scope = self._cache_scope(itinerary_context)
+        if scope is not None:
+            answer_cache.store(user_message, response, *scope)
+
+    def _local_answer(self, user_message, itinerary_context, user_preferences=None):
+        """Simple weather/budget/transport questions answered by intent_router, remembered as this exchange"""
+        trip = self._trip(itinerary_context)
+        if user_preferences:
+            trip = dict(trip, interests=user_preferences)
+        try:
+            answer = intent_router.answer(user_message, trip)
+        except Exception as e:
+            logging.error(f"Intent router error: {e}")
+            return None
+        if answer:
+            self.remember(user_message, answer)
+        return answer
+
+    def _cached_answer(self, user_message, itinerary_context):
+        """A stored answer to a near-identical question about the same place and trip, remembered as this exchange"""
+        scope = self._cache_scope(itinerary_context)
+        cached = answer_cache.lookup(user_message, *scope) if scope is not None else None
+        if cached:
+            self.remember(user_message, cached)
+        return cached
+
+    def _chain_inputs(self, user_message, itinerary_context=None):
+        """Prompt variables: trip context and conversation summary as system messages, then recent turns"""
+        trip_context = self._trip_context(itinerary_context)
+        context = ([SystemMessage(content=trip_context)] if trip_context else []) + self.memory.context_messages()
+        history = list(self.memory.messages)
+        record_prompt_tokens(context, history, user_message, self._system_tokens)
+        return {'context': context, 'history': history, 'input': user_message}
+
+    def remember(self, user_message, response):
+        """Record one exchange; older ones are folded into the summary once over budget"""
+        self.memory.save(user_message, response)
+
+    def history(self):
+        """The messages remembered verbatim, oldest first"""
+        return list(self.memory.messages) if self.memory else []
+
+    def load_history(self, messages):
+        """Restore remembered messages, e.g. from the database after a restart"""
+        if self.memory:
+            self.memory.load(messages)
+
+    def _direct_messages(self, user_message, itinerary_context=None):
+        """Single-shot prompt used when the conversation chain fails"""
+        context_info = self._trip_context(itinerary_context)
+        
+        return [
+            ("system", f"""You are an expert travel companion AI for Indian tourists. 
+            {context_info}
+            
+            Provide helpful, culturally-aware travel advice. Keep responses under 200 words."""),
+            ("human", user_message)
+        ]
+
     def generate_response(self, user_message, itinerary_context=None, user_preferences=None):
         """Generate chatbot response using LangChain"""
         if not self.conversation:
             return self.get_fallback_response(user_message)
         
+        cached = self._cached_answer(user_message, itinerary_context)
+        if cached:
+            return cached
+        
+        local = self._local_answer(user_message, itinerary_context, user_preferences)
+        if local:
+            return local
+        
         try:
-            # Build context from itinerary if available
-            context_info = ""
-            if itinerary_context:
-                context_info = self.get_context_from_itinerary(itinerary_context)
-                # Add context to the conversation temporarily
-                if context_info:
-                    enhanced_message = f"Context: {context_info}\n\nUser question: {user_message}"
-                else:
-                    enhanced_message = user_message
-            else:
-                enhanced_message = user_message
-            
             # Generate response using LangChain conversation chain
-            response = self.conversation.predict(input=enhanced_message)
+            response = self.conversation.invoke(self._chain_inputs(user_message, itinerary_context)).content
+            self.remember(user_message, response)
+            self._store_answer(user_message, response, itinerary_context)
             
             return response
             
@@ -120,25 +220,50 @@ class TravelChatbot:
             logging.error(f"LangChain error generating chatbot response: {e}")
             # Fallback to direct LLM call
             try:
-                context_info = ""
-                if itinerary_context:
-                    context_info = self.get_context_from_itinerary(itinerary_context)
-                
-                messages = [
-                    ("system", f"""You are an expert travel companion AI for Indian tourists. 
-                    {context_info}
-                    
-                    Provide helpful, culturally-aware travel advice. Keep responses under 200 words."""),
-                    ("human", user_message)
-                ]
-                
-                response = self.llm.invoke(messages)
+                response = self.llm.invoke(self._direct_messages(user_message, itinerary_context))
                 return response.content
                 
             except Exception as fallback_error:
                 logging.error(f"Fallback chatbot error: {fallback_error}")
                 return self.get_fallback_response(user_message)
 
+    def stream_response(self, user_message, itinerary_context=None, user_preferences=None):
+        """
+        Yield the answer in pieces as the LLM produces them. The exchange is only
+        remembered once complete; closing the generator early (client gone) also
+        closes the upstream stream.
+        """
+        if not self.conversation:
+            yield self.get_fallback_response(user_message)
+            return
+        
+        cached = self._cached_answer(user_message, itinerary_context) or \
+            self._local_answer(user_message, itinerary_context, user_preferences)
+        if cached:
+            yield cached
+            return
+        
+        chunks = []
+        stream = self.conversation.stream(self._chain_inputs(user_message, itinerary_context))
+        try:
+            for chunk in stream:
+                if chunk.content:
+                    chunks.append(chunk.content)
+                    yield chunk.content
+        except Exception as e:
+            logging.error(f"LangChain error streaming chatbot response: {e}")
+            if chunks:
+                raise
+            # Nothing sent yet, so the rule-based answer can still stand in
+            yield self.get_fallback_response(user_message)
+            return
+        finally:
+            stream.close()
+        
+        response = ''.join(chunks)
+        self.remember(user_message, response)
+        self._store_answer(user_message, response, itinerary_context)
+
     def get_fallback_response(self, user_message):
         """Provide rule-based responses when AI is unavailable"""
         message_lower = user_message.lower()
@@ -161,15 +286,7 @@ class TravelChatbot:
     def get_contextual_suggestions(self, destination, interests=None):
         """Generate proactive travel suggestions using LangChain"""
         if not self.llm:
-            return {
-                'weather_context': f"Check the current weather in {destination} before you travel.",
-                'suggestions': [
-                    f"Popular attractions in {destination}",
-                    "Local food specialties to try",
-                    "Best transportation options",
-                    "Cultural etiquette to follow"
-                ]
-            }
+            return fallback_suggestions(destination)
         
         try:
             interests_str = ", ".join(interests) if interests else "general tourism"
@@ -193,32 +310,12 @@ class TravelChatbot:
                 "interests": interests_str
             })
             
-            content = response.content.strip()
-            
-            # Extract JSON if wrapped
-            if '```json' in content:
-                start = content.find('```json') + 7
-                end = content.find('```', start)
-                content = content[start:end].strip()
-            elif '```' in content:
-                start = content.find('```') + 3
-                end = content.find('```', start)
-                content = content[start:end].strip()
-            
-            suggestions_data = json.loads(content)
+            suggestions_data = json.loads(extract_json_content(response.content))
             return suggestions_data
             
         except Exception as e:
             logging.error(f"LangChain error getting contextual suggestions: {e}")
-            return {
-                'weather_context': f"Check the current weather in {destination} before you travel.",
-                'suggestions': [
-                    f"Research popular attractions in {destination}",
-                    "Try local cuisine specialties", 
-                    "Learn about local customs and etiquette",
-                    "Plan your transportation in advance"
-                ]
-            }
+            return fallback_suggestions(destination)
     
     def clear_history(self):
         """Clear conversation history"""
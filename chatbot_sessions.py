@@ -0,0 +1,231 @@
+"""
+Per-conversation TravelChatbot instances, reused across requests.
+
+A conversation is keyed by the browser's chat id (kept in the Flask session)
+and the itinerary it is about. Its chatbot, and with it the prompt, chain and
+token-budgeted memory, stays in an LRU held by ChatbotSessionManager; all chatbots
+share one Groq client. Conversations idle for CHATBOT_SESSION_IDLE_SECONDS are
+dropped, and the least recently used go first whenever there are more than
+CHATBOT_MAX_SESSIONS or their remembered messages exceed
+CHATBOT_MAX_MEMORY_BYTES.
+
+With CHATBOT_PERSIST_HISTORY set, every exchange is also written to the
+ChatMessage table (the last CHATBOT_HISTORY_EXCHANGES exchanges) and reloaded when a
+conversation is not in memory, so it survives restarts and moves between
+workers.
+"""
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import List, Optional
+
+from flask import session
+from langchain_core.messages import AIMessage, HumanMessage
+from sqlalchemy import delete, insert
+
+from app import db
+from chatbot_service import CHATBOT_HISTORY_EXCHANGES, TravelChatbot, create_chatbot_llm
+from metrics import record_cache, registry
+from models import ChatMessage
+
+CHATBOT_MAX_SESSIONS = int(os.environ.get("CHATBOT_MAX_SESSIONS", 500))
+CHATBOT_MAX_MEMORY_BYTES = int(os.environ.get("CHATBOT_MAX_MEMORY_BYTES", 16 * 1024 * 1024))
+CHATBOT_SESSION_IDLE_SECONDS = int(os.environ.get("CHATBOT_SESSION_IDLE_SECONDS", 1800))
+CHATBOT_PERSIST_HISTORY = os.environ.get("CHATBOT_PERSIST_HISTORY", "").lower() in ('1', 'true', 'yes')
+CHATBOT_HISTORY_MAX_CHARS = 2000  # per stored message
+
+chatbot_sessions_gauge = registry.gauge('chatbot_sessions', 'Conversations held in memory')
+chatbot_memory_bytes = registry.gauge('chatbot_memory_bytes', 'Bytes of remembered chatbot messages')
+chatbot_evictions = registry.counter('chatbot_session_evictions_total', 'Conversations dropped from memory', ('reason',))
+chatbot_first_token = registry.histogram('chatbot_first_token_seconds', 'Time until the first streamed chatbot token')
+
+
+def session_key(itinerary_id: Optional[int], client_id: Optional[str] = None) -> str:
+    """
+    Conversation key for the current browser and itinerary. API clients without
+    cookies can pass their own `client_id` instead.
+    """
+    if not client_id:
+        client_id = session.get('chat_id')
+        if not client_id:
+            client_id = session['chat_id'] = uuid.uuid4().hex
+    return f"{client_id[:64]}:{itinerary_id or 'general'}"
+
+
+def _message_bytes(messages) -> int:
+    return sum(len(message.content.encode('utf-8')) for message in messages)
+
+
+class ChatSession:
+    def __init__(self, key: str, chatbot: TravelChatbot):
+        self.key = key
+        self.chatbot = chatbot
+        self.lock = threading.Lock()  # one exchange at a time per conversation
+        self.last_used = time.monotonic()
+        self.size = _message_bytes(chatbot.history())
+
+
+class ChatbotSessionManager:
+    def __init__(self, max_sessions: int = CHATBOT_MAX_SESSIONS, max_bytes: int = CHATBOT_MAX_MEMORY_BYTES,
+                 idle_seconds: int = CHATBOT_SESSION_IDLE_SECONDS, persist: bool = CHATBOT_PERSIST_HISTORY):
+        self.max_sessions = max_sessions
+        self.max_bytes = max_bytes
+        self.idle_seconds = idle_seconds
+        self.persist = persist
+        self.total_bytes = 0
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+        self._llm = None
+        self._shared = None
+
+    def llm(self):
+        with self._lock:
+            if self._llm is None:
+                self._llm = create_chatbot_llm()
+            return self._llm
+
+    def shared_chatbot(self) -> TravelChatbot:
+        """A memory-less chatbot for one-off calls such as contextual suggestions"""
+        if self._shared is None:
+            self._shared = TravelChatbot(llm=self.llm())
+        return self._shared
+
+    @contextmanager
+    def conversation(self, key: str):
+        """The chatbot for `key`, held exclusively for one exchange; new messages are persisted afterwards"""
+        chat = self._checkout(key)
+        with chat.lock:
+            before = chat.chatbot.history()
+            try:
+                yield chat.chatbot
+            finally:
+                after = chat.chatbot.history()
+                added = [message for message in after if not any(message is old for old in before)]
+                if added:
+                    self._resize(chat, _message_bytes(after))
+                    if self.persist:
+                        _save_messages(key, added)
+
+    def _checkout(self, key: str) -> ChatSession:
+        now = time.monotonic()
+        with self._lock:
+            self._evict_idle(now)
+            chat = self._sessions.get(key)
+            if chat:
+                self._sessions.move_to_end(key)
+                chat.last_used = now
+        if chat:
+            record_cache('chatbot_session', True)
+            return chat
+        record_cache('chatbot_session', False)
+
+        chatbot = TravelChatbot(llm=self.llm())
+        if self.persist:
+            chatbot.load_history(_load_messages(key))
+        chat = ChatSession(key, chatbot)
+
+        with self._lock:
+            existing = self._sessions.get(key)
+            if existing:  # another request for this conversation got here first
+                self._sessions.move_to_end(key)
+                return existing
+            self._sessions[key] = chat
+            self.total_bytes += chat.size
+            self._evict_over_limits(keep=key)
+        return chat
+
+    def _resize(self, chat: ChatSession, size: int):
+        with self._lock:
+            if self._sessions.get(chat.key) is chat:
+                self.total_bytes += size - chat.size
+            chat.size = size
+            chat.last_used = time.monotonic()
+            self._evict_over_limits(keep=chat.key)
+
+    def _drop(self, key: str, reason: str):
+        chat = self._sessions.pop(key)
+        self.total_bytes -= chat.size
+        chatbot_evictions.inc(reason=reason)
+
+    def _evict_idle(self, now: float):
+        # The LRU order is also last-use order, so idle conversations are at the front
+        while self._sessions:
+            key, chat = next(iter(self._sessions.items()))
+            if now - chat.last_used <= self.idle_seconds:
+                break
+            self._drop(key, 'idle')
+
+    def _evict_over_limits(self, keep: str):
+        while len(self._sessions) > 1 and (len(self._sessions) > self.max_sessions or self.total_bytes > self.max_bytes):
+            key = next(iter(self._sessions))
+            if key == keep:
+                self._sessions.move_to_end(key)
+                key = next(iter(self._sessions))
+            self._drop(key, 'sessions' if len(self._sessions) > self.max_sessions else 'memory')
+
+    def clear(self, key: str):
+        """Forget a conversation in memory and in the database"""
+        with self._lock:
+            if key in self._sessions:
+                self._drop(key, 'cleared')
+        if self.persist:
+            try:
+                db.session.execute(delete(ChatMessage).where(ChatMessage.session_key == key))
+                db.session.commit()
+            except Exception as e:
+                db.session.rollback()
+                logging.error(f"Could not clear chat history for {key}: {e}")
+
+    def stats(self):
+        with self._lock:
+            return {
+                'sessions': len(self._sessions),
+                'memory_bytes': self.total_bytes,
+                'max_sessions': self.max_sessions,
+                'max_memory_bytes': self.max_bytes
+            }
+
+
+def _load_messages(key: str) -> List:
+    try:
+        rows = (ChatMessage.query.filter_by(session_key=key)
+                .order_by(ChatMessage.id.desc()).limit(2 * CHATBOT_HISTORY_EXCHANGES).all())
+    except Exception as e:
+        logging.error(f"Could not load chat history for {key}: {e}")
+        return []
+    return [HumanMessage(content=row.content) if row.role == 'human' else AIMessage(content=row.content)
+            for row in reversed(rows)]
+
+
+def _save_messages(key: str, messages: List):
+    try:
+        db.session.execute(insert(ChatMessage), [
+            {'session_key': key, 'role': 'human' if message.type == 'human' else 'ai',
+             'content': message.content[:CHATBOT_HISTORY_MAX_CHARS]}
+            for message in messages
+        ])
+        # Keep only what a reload uses; older turns live on in the summary rebuilt from these
+        cutoff = (db.session.query(ChatMessage.id).filter_by(session_key=key)
+                  .order_by(ChatMessage.id.desc()).offset(2 * CHATBOT_HISTORY_EXCHANGES).limit(1).scalar())
+        if cutoff:
+            db.session.execute(delete(ChatMessage).where(ChatMessage.session_key == key, ChatMessage.id <= cutoff))
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        logging.error(f"Could not save chat history for {key}: {e}")
+
+
+chatbot_manager = ChatbotSessionManager()
+
+
+def _collect_gauges():
+    stats = chatbot_manager.stats()
+    chatbot_sessions_gauge.set(stats['sessions'])
+    chatbot_memory_bytes.set(stats['memory_bytes'])
+
+
+registry.collectors.append(_collect_gauges)
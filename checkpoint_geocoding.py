@@ -0,0 +1,132 @@
+"""
+Coordinates for checkpoint locations, resolved once on the server.
+
+After an itinerary is saved, every checkpoint without coordinates is geocoded
+in one batch: each distinct location is looked up in the gazetteer near the
+trip's destination, and the remainder through WeatherService.locate_many
+(cache, then concurrent HTTP). Results farther than CHECKPOINT_MAX_DISTANCE_KM
+from the destination are discarded as wrong matches, as are partial gazetteer
+matches (only the city of "X Cafe, Jaipur"). Coordinates are written back with
+one bulk UPDATE; checkpoints that could not be located are stamped with
+geocode_failed_at and left alone for CHECKPOINT_GEOCODE_RETRY_DAYS.
+"""
+import logging
+import os
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import or_, select, update
+
+from app import app, db
+from gazetteer import gazetteer, haversine_km
+from models import Checkpoint, TravelItinerary
+from weather_service import weather_service
+
+CHECKPOINT_GEOCODE_WORKERS = int(os.environ.get("CHECKPOINT_GEOCODE_WORKERS", 4))
+CHECKPOINT_MAX_DISTANCE_KM = float(os.environ.get("CHECKPOINT_MAX_DISTANCE_KM", 300))
+CHECKPOINT_GEOCODE_RETRY_DAYS = int(os.environ.get("CHECKPOINT_GEOCODE_RETRY_DAYS", 7))
+
+# Itineraries currently being geocoded by this process
+_in_progress = set()
+_in_progress_lock = threading.Lock()
+
+
+def _plausible(coords: Optional[Dict], center: Optional[Tuple[float, float]]) -> bool:
+    if not coords:
+        return False
+    if center is None:
+        return True
+    return haversine_km(center[0], center[1], coords['lat'], coords['lon']) <= CHECKPOINT_MAX_DISTANCE_KM
+
+
+def _retry_cutoff() -> datetime:
+    return datetime.utcnow() - timedelta(days=CHECKPOINT_GEOCODE_RETRY_DAYS)
+
+
+def needs_geocoding(checkpoint: Checkpoint) -> bool:
+    """No coordinates yet, and no recent attempt that came up empty"""
+    return checkpoint.lat is None and (checkpoint.geocode_failed_at is None
+                                       or checkpoint.geocode_failed_at < _retry_cutoff())
+
+
+def geocode_checkpoints(itinerary_ids: List[int], max_workers: int = CHECKPOINT_GEOCODE_WORKERS,
+                        retry_failed: bool = False) -> Dict:
+    """
+    Fill in lat/lon for the itineraries' checkpoints that have none, skipping
+    recent failures unless `retry_failed`. Must run inside an app context.
+    """
+    query = (
+        select(Checkpoint.id, Checkpoint.location, TravelItinerary.destination)
+        .join(TravelItinerary, Checkpoint.itinerary_id == TravelItinerary.id)
+        .where(Checkpoint.itinerary_id.in_(itinerary_ids), Checkpoint.lat.is_(None))
+    )
+    if not retry_failed:
+        query = query.where(or_(Checkpoint.geocode_failed_at.is_(None), Checkpoint.geocode_failed_at < _retry_cutoff()))
+    rows = db.session.execute(query).all()
+    if not rows:
+        return {'checkpoints': 0, 'located': 0, 'failed': 0}
+
+    centers = {}
+    for destination in {row.destination for row in rows}:
+        coords = weather_service.get_coordinates(destination)
+        centers[destination] = (coords['lat'], coords['lon']) if coords else None
+
+    # Gazetteer first, disambiguated by the destination; collect the rest for one batched lookup
+    resolved: Dict[Tuple[str, str], Optional[Dict]] = {}
+    remaining = set()
+    for row in rows:
+        key = (row.location, row.destination)
+        if key in resolved or not row.location:
+            continue
+        place = gazetteer.lookup(row.location, near=centers[row.destination])
+        if place and place.get('match') == 'exact' and _plausible(place, centers[row.destination]):
+            resolved[key] = place
+        else:
+            remaining.add(key)
+
+    located = weather_service.locate_many((location for location, _ in remaining), max_workers=max_workers)
+    for location, destination in remaining:
+        coords = located.get(location)
+        resolved[(location, destination)] = coords if _plausible(coords, centers[destination]) else None
+
+    now = datetime.utcnow()
+    updates = []
+    for row in rows:
+        coords = resolved.get((row.location, row.destination))
+        if coords:
+            updates.append({'id': row.id, 'lat': coords['lat'], 'lon': coords['lon'], 'geocode_failed_at': None})
+        else:
+            updates.append({'id': row.id, 'lat': None, 'lon': None, 'geocode_failed_at': now})
+    db.session.execute(update(Checkpoint), updates)
+    db.session.commit()
+
+    located = sum(1 for entry in updates if entry['lat'] is not None)
+    return {'checkpoints': len(rows), 'located': located, 'failed': len(rows) - located}
+
+
+def geocode_checkpoints_in_background(itinerary_id: int) -> Optional[threading.Thread]:
+    """Geocode one itinerary's checkpoints on a daemon thread; no-op if already running"""
+    with _in_progress_lock:
+        if itinerary_id in _in_progress:
+            return None
+        _in_progress.add(itinerary_id)
+
+    def target():
+        try:
+            with app.app_context():
+                geocode_checkpoints([itinerary_id])
+        except Exception as e:
+            logging.error(f"Geocoding checkpoints for itinerary {itinerary_id} failed: {e}")
+        finally:
+            with _in_progress_lock:
+                _in_progress.discard(itinerary_id)
+
+    thread = threading.Thread(target=target, name=f"geocode-{itinerary_id}", daemon=True)
+    thread.start()
+    return thread
+
+
+def geocoding_in_progress(itinerary_id: int) -> bool:
+    with _in_progress_lock:
+        return itinerary_id in _in_progress
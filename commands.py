@@ -0,0 +1,154 @@
+"""
+Flask CLI commands, e.g. `flask --app main batch-generate trips.csv`.
+"""
+import csv
+import json
+import re
+
+import click
+
+from app import app
+from tracing import summarize_traces, TRACE_FILE
+from weather_service import weather_service
+from budget_optimizer import BudgetOptimizer
+from batch_service import (parse_batch_requests, create_batch, run_batch, batch_manifest,
+                           BATCH_MAX_WORKERS, BATCH_LLM_RPM)
+from weather_alerts import refresh_weather_alerts, WEATHER_ALERT_LOOKAHEAD_DAYS, WEATHER_ALERT_WORKERS
+from checkpoint_geocoding import geocode_checkpoints, CHECKPOINT_GEOCODE_WORKERS
+from chat_suggestions import precompute_suggestions
+from trip_monitoring import run_trip_monitoring, TRIP_MONITOR_CONCURRENCY, TRIP_MONITOR_BATCH
+from models import TravelItinerary
+
+DATASET_PATH = 'tourism_iternary_dataset (1).csv'
+
+
+@app.cli.command('batch-generate')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--name', help="Batch name (defaults to the file name)")
+@click.option('--workers', default=BATCH_MAX_WORKERS, show_default=True, help="Concurrent generations")
+@click.option('--rpm', default=BATCH_LLM_RPM, show_default=True, help="LLM requests per minute")
+@click.option('--manifest', type=click.Path(dir_okay=False), help="Write the result manifest to this file")
+def batch_generate(path, name, workers, rpm, manifest):
+    """Generate itineraries for every trip request in a CSV or JSON file."""
+    fmt = 'json' if path.lower().endswith('.json') else 'csv'
+    with open(path, encoding='utf-8') as f:
+        try:
+            raw_requests = parse_batch_requests(f.read(), fmt)
+        except ValueError as e:
+            raise click.ClickException(f"Could not parse {path}: {e}")
+
+    summary = create_batch(raw_requests, name=name or path)
+    click.echo(f"Batch {summary['batch_id']}: {summary['total_items']} unique requests, "
+               f"{summary['duplicates_removed']} duplicates removed, {len(summary['invalid_rows'])} invalid rows")
+
+    _run_and_report(summary['batch_id'], workers, rpm, manifest)
+
+
+@app.cli.command('batch-resume')
+@click.argument('batch_id', type=int)
+@click.option('--workers', default=BATCH_MAX_WORKERS, show_default=True, help="Concurrent generations")
+@click.option('--rpm', default=BATCH_LLM_RPM, show_default=True, help="LLM requests per minute")
+@click.option('--manifest', type=click.Path(dir_okay=False), help="Write the result manifest to this file")
+def batch_resume(batch_id, workers, rpm, manifest):
+    """Finish the pending and failed items of an earlier batch."""
+    if not batch_manifest(batch_id):
+        raise click.ClickException(f"Batch {batch_id} not found")
+    _run_and_report(batch_id, workers, rpm, manifest)
+
+
+def _run_and_report(batch_id, workers, rpm, manifest_path):
+    result = run_batch(batch_id, max_workers=workers, rate_per_minute=rpm)
+    click.echo(f"Batch {batch_id} {result['status']}: {result.get('counts', {})}")
+
+    if manifest_path:
+        with open(manifest_path, 'w', encoding='utf-8') as f:
+            json.dump(result, f, indent=2)
+        click.echo(f"Manifest written to {manifest_path}")
+
+
+@app.cli.command('trace-summary')
+@click.argument('path', default=TRACE_FILE, type=click.Path(exists=True, dir_okay=False))
+@click.option('--top', default=20, show_default=True, help="Number of span names to show")
+def trace_summary(path, top):
+    """Show which spans (DB, LLM, weather calls) drive tail latency."""
+    click.echo(f"{'span':<45} {'count':>7} {'p50 ms':>10} {'p95 ms':>10} {'p99 ms':>10}")
+    for row in summarize_traces(path)[:top]:
+        click.echo(f"{row['name'][:45]:<45} {row['count']:>7} {row['p50_ms']:>10.1f} {row['p95_ms']:>10.1f} {row['p99_ms']:>10.1f}")
+
+
+def dataset_destinations(path=DATASET_PATH):
+    """Destination names from the tourism dataset, plus their plain city form
+    ("Kochi (Cochin)" -> "Kochi", "Amritsar - Extended" -> "Amritsar")."""
+    names = []
+    with open(path, encoding='utf-8-sig') as f:
+        for row in csv.DictReader(f):
+            destination = (row.get('input__destination') or '').strip()
+            if not destination:
+                continue
+            names.append(destination)
+            plain = re.split(r'\s+-\s+|\s*\(', destination)[0].strip()
+            if plain and plain != destination:
+                names.append(plain)
+    return list(dict.fromkeys(names))
+
+
+@app.cli.command('warm-geocache')
+@click.option('--workers', default=4, show_default=True, help="Concurrent geocoding requests")
+def warm_geocache(workers):
+    """Geocode every dataset destination and BudgetOptimizer destination type."""
+    names = dataset_destinations() + [name.title() for name in BudgetOptimizer().destination_types]
+    stats = weather_service.warm_coordinates(names, max_workers=workers)
+    click.echo(f"{len(names)} names: {stats['cached']} already cached, "
+               f"{stats['found']} geocoded, {stats['missing']} not found (cached as misses)")
+
+
+@app.cli.command('refresh-weather-alerts')
+@click.option('--days', default=WEATHER_ALERT_LOOKAHEAD_DAYS, show_default=True, help="Look this many days ahead")
+@click.option('--workers', default=WEATHER_ALERT_WORKERS, show_default=True, help="Concurrent forecast requests")
+def refresh_alerts(days, workers):
+    """Recompute severe-weather alerts for upcoming trips (run from cron when the scheduler is off)."""
+    stats = refresh_weather_alerts(lookahead_days=days, max_workers=workers)
+    click.echo(f"{stats['trips']} trips, {stats['destinations']} destinations "
+               f"({stats['forecasts_missing']} without forecast): {stats['alerts']} alerts stored")
+
+
+@app.cli.command('monitor-trips')
+@click.option('--concurrency', default=TRIP_MONITOR_CONCURRENCY, show_default=True, help="Trips monitored at once")
+@click.option('--batch', default=TRIP_MONITOR_BATCH, show_default=True, help="Trips per batch")
+def monitor_trips(concurrency, batch):
+    """Run proactive monitoring for trips under way and store notifications (cron alternative to the scheduler)."""
+    stats = run_trip_monitoring(concurrency=concurrency, batch_size=batch)
+    click.echo(f"{stats['trips']} trips in {stats['destinations']} destinations "
+               f"({stats['weather_fetched']} with weather, {stats['partial']} partial): "
+               f"{stats['notifications']} new notifications")
+
+
+@app.cli.command('geocode-checkpoints')
+@click.option('--workers', default=CHECKPOINT_GEOCODE_WORKERS, show_default=True, help="Concurrent geocoding requests")
+@click.option('--chunk', default=50, show_default=True, help="Itineraries per batch")
+@click.option('--retry-failed', is_flag=True, help="Also retry checkpoints that recently failed to geocode")
+def geocode_checkpoints_command(workers, chunk, retry_failed):
+    """Backfill coordinates for checkpoints saved without them."""
+    ids = [row.id for row in TravelItinerary.query.with_entities(TravelItinerary.id).order_by(TravelItinerary.id)]
+    totals = {'checkpoints': 0, 'located': 0, 'failed': 0}
+    for start in range(0, len(ids), chunk):
+        stats = geocode_checkpoints(ids[start:start + chunk], max_workers=workers, retry_failed=retry_failed)
+        for key in totals:
+            totals[key] += stats[key]
+    click.echo(f"{totals['located']} of {totals['checkpoints']} checkpoints without coordinates located, "
+               f"{totals['failed']} not found")
+
+
+@app.cli.command('precompute-suggestions')
+@click.option('--chunk', default=100, show_default=True, help="Itineraries per batch")
+def precompute_suggestions_command(chunk):
+    """Backfill chatbot suggestions for itineraries saved without them."""
+    ids = [row.id for row in TravelItinerary.query.with_entities(TravelItinerary.id)
+           .filter(TravelItinerary.chat_suggestions.is_(None)).order_by(TravelItinerary.id)]
+    totals = {'itineraries': 0, 'keys': 0, 'stored': 0}
+    for start in range(0, len(ids), chunk):
+        stats = precompute_suggestions(ids[start:start + chunk])
+        for key in totals:
+            totals[key] += stats[key]
+    click.echo(f"{totals['stored']} of {totals['itineraries']} itineraries given suggestions "
+               f"({totals['keys']} destination/interest combinations)")
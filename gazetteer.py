@@ -0,0 +1,200 @@
+"""
+Offline gazetteer of Indian cities, towns, regions and major attractions.
+
+Loaded once from india_gazetteer.csv into parallel arrays (names, kinds,
+states, and `array('d')` latitudes/longitudes) with a dict from normalized
+name/alias to row numbers and a uniform grid (GAZETTEER_CELL_DEGREES cells)
+for nearest-neighbour queries. Lookups never leave the process, so
+WeatherService and /api/geocode consult it before any HTTP geocoder.
+"""
+import csv
+import logging
+import math
+import os
+import re
+from array import array
+from typing import Dict, List, Optional, Tuple
+
+GAZETTEER_PATH = os.environ.get("GAZETTEER_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                                               "india_gazetteer.csv"))
+GAZETTEER_CELL_DEGREES = 1.0
+EARTH_RADIUS_KM = 6371.0
+
+# Trailing qualifiers that never help identify a place
+_SUFFIXES = (' india', ' bharat')
+
+
+def normalize(name: str) -> str:
+    """Lower-case, '&' -> 'and', punctuation dropped, whitespace collapsed"""
+    name = (name or '').lower().replace('&', ' and ').replace("'", '').replace('’', '')
+    name = re.sub(r'[^a-z0-9]+', ' ', name).strip()
+    for suffix in _SUFFIXES:
+        if name.endswith(suffix):
+            name = name[:-len(suffix)].strip()
+    return name
+
+
+def haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = phi2 - phi1
+    dlmb = math.radians(lon2 - lon1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlmb / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+class Gazetteer:
+    def __init__(self, path: str = GAZETTEER_PATH, cell_degrees: float = GAZETTEER_CELL_DEGREES):
+        self.cell = cell_degrees
+        self.names: List[str] = []
+        self.kinds: List[str] = []
+        self.states: List[str] = []
+        self.lat = array('d')
+        self.lon = array('d')
+        self._by_name: Dict[str, List[int]] = {}
+        self._grid: Dict[Tuple[int, int], array] = {}
+        self._load(path)
+
+        # Smallest km per degree anywhere in the data, so grid rings give a safe distance bound
+        max_abs_lat = min(89.0, max((abs(v) for v in self.lat), default=0.0) + self.cell)
+        self._min_km_per_degree = math.radians(1) * EARTH_RADIUS_KM * math.cos(math.radians(max_abs_lat))
+
+    def _load(self, path: str):
+        try:
+            with open(path, newline='', encoding='utf-8') as f:
+                for row in csv.DictReader(f):
+                    self._add(row)
+        except OSError as e:
+            logging.error(f"Could not load gazetteer from {path}: {e}")
+
+    def _add(self, row: Dict):
+        index = len(self.names)
+        self.names.append(row['name'])
+        self.kinds.append(row['kind'])
+        self.states.append(row['state'])
+        self.lat.append(float(row['lat']))
+        self.lon.append(float(row['lon']))
+
+        keys = [row['name']] + [alias for alias in (row.get('aliases') or '').split(';') if alias]
+        for key in dict.fromkeys(normalize(k) for k in keys):
+            self._by_name.setdefault(key, []).append(index)
+
+        cell = self._cell(self.lat[index], self.lon[index])
+        self._grid.setdefault(cell, array('i')).append(index)
+
+    def __len__(self):
+        return len(self.names)
+
+    def _cell(self, lat: float, lon: float) -> Tuple[int, int]:
+        return math.floor(lat / self.cell), math.floor(lon / self.cell)
+
+    def place(self, index: int, distance_km: Optional[float] = None, match: Optional[str] = None) -> Dict:
+        result = {
+            'name': self.names[index],
+            'lat': self.lat[index],
+            'lon': self.lon[index],
+            'state': self.states[index],
+            'kind': self.kinds[index]
+        }
+        if distance_km is not None:
+            result['distance_km'] = round(distance_km, 2)
+        if match is not None:
+            result['match'] = match
+        return result
+
+    def _best(self, indexes: List[int], near: Optional[Tuple[float, float]]) -> int:
+        if near is None or len(indexes) == 1:
+            return indexes[0]
+        return min(indexes, key=lambda i: haversine_km(near[0], near[1], self.lat[i], self.lon[i]))
+
+    def lookup(self, name: str, near: Optional[Tuple[float, float]] = None) -> Optional[Dict]:
+        """
+        Resolve a place name or alias. Comma-separated names ("Amber Fort, Jaipur")
+        are tried whole, then part by part, most specific first; the later parts
+        break ties between places that share a name. `near` (lat, lon) does the same.
+        `match` is 'exact' when the first part resolved, 'partial' when only a
+        broader part did (e.g. just the city).
+        """
+        parts = [normalize(part) for part in (name or '').split(',')]
+        parts = [part for part in parts if part]
+        if not parts:
+            return None
+
+        indexes = self._by_name.get(' '.join(parts))
+        if indexes:
+            return self.place(self._best(indexes, near), match='exact')
+
+        for position, part in enumerate(parts):
+            indexes = self._by_name.get(part)
+            if not indexes:
+                continue
+            context = near
+            if len(indexes) > 1 and context is None:
+                for later in parts[position + 1:]:
+                    if later in self._by_name:
+                        first = self._by_name[later][0]
+                        context = (self.lat[first], self.lon[first])
+                        break
+            return self.place(self._best(indexes, context), match='exact' if position == 0 else 'partial')
+        return None
+
+    def places_in(self, text: str, max_words: int = 3) -> List[str]:
+        """Names of the places mentioned in free text ("cheap food near Juhu, Mumbai"), longest match first"""
+        words = normalize(text).split()
+        found = []
+        i = 0
+        while i < len(words):
+            for n in range(min(max_words, len(words) - i), 0, -1):
+                indexes = self._by_name.get(' '.join(words[i:i + n]))
+                if indexes:
+                    found.append(self.names[indexes[0]])
+                    i += n
+                    break
+            else:
+                i += 1
+        return list(dict.fromkeys(found))
+
+    def nearest(self, lat: float, lon: float, k: int = 1, kinds: Optional[List[str]] = None,
+                max_km: Optional[float] = None) -> List[Dict]:
+        """The k closest places to (lat, lon), nearest first, via an expanding ring search over the grid"""
+        if not self.names or k <= 0:
+            return []
+
+        center_lat, center_lon = self._cell(lat, lon)
+        cells = list(self._grid)
+        max_ring = max(max(abs(c[0] - center_lat), abs(c[1] - center_lon)) for c in cells)
+
+        found: List[Tuple[float, int]] = []
+        for ring in range(max_ring + 1):
+            for cell in self._ring_cells(center_lat, center_lon, ring):
+                for index in self._grid.get(cell, ()):
+                    if kinds and self.kinds[index] not in kinds:
+                        continue
+                    distance = haversine_km(lat, lon, self.lat[index], self.lon[index])
+                    if max_km is None or distance <= max_km:
+                        found.append((distance, index))
+            found.sort()
+            del found[k:]
+            # Everything in ring + 1 or beyond is at least `ring` whole cells away
+            bound = ring * self.cell * self._min_km_per_degree
+            if len(found) == k and found[-1][0] <= bound:
+                break
+            if max_km is not None and bound > max_km:
+                break
+
+        return [self.place(index, distance) for distance, index in found]
+
+    @staticmethod
+    def _ring_cells(center_lat: int, center_lon: int, ring: int):
+        if ring == 0:
+            yield center_lat, center_lon
+            return
+        for dlat in range(-ring, ring + 1):
+            if abs(dlat) == ring:
+                for dlon in range(-ring, ring + 1):
+                    yield center_lat + dlat, center_lon + dlon
+            else:
+                yield center_lat + dlat, center_lon - ring
+                yield center_lat + dlat, center_lon + ring
+
+
+gazetteer = Gazetteer()
@@ -0,0 +1,28 @@
+# Gunicorn worker profiles.
+#
+#   WORKER_PROFILE=sync  (default) - classic sync workers, one request per worker.
+#   WORKER_PROFILE=async           - gevent workers. Each worker multiplexes up to
+#                                    WORKER_CONNECTIONS requests; sockets are
+#                                    monkey-patched, so the ordinary views park
+#                                    while Groq / OpenWeatherMap respond instead
+#                                    of pinning a whole worker.
+#
+# Run with: gunicorn -c gunicorn.conf.py main:app
+import multiprocessing
+import os
+
+bind = os.environ.get("BIND", "0.0.0.0:5000")
+profile = os.environ.get("WORKER_PROFILE", "sync")
+
+if profile == "async":
+    worker_class = "gevent"
+    workers = int(os.environ.get("WEB_CONCURRENCY", 2))
+    worker_connections = int(os.environ.get("WORKER_CONNECTIONS", 500))
+    # LLM calls routinely take 10-30s; don't let the arbiter kill busy workers
+    timeout = int(os.environ.get("WORKER_TIMEOUT", 120))
+else:
+    worker_class = "sync"
+    workers = int(os.environ.get("WEB_CONCURRENCY", multiprocessing.cpu_count() * 2 + 1))
+    timeout = int(os.environ.get("WORKER_TIMEOUT", 60))
+
+keepalive = 5
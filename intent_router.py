@@ -0,0 +1,216 @@
+"""
+Local intent routing for the chatbot.
+
+Short, single-topic weather, budget and transport questions are answered here
+from WeatherService and BudgetOptimizer data instead of an LLM round trip.
+A question is routed locally only when two independent signals agree:
+
+- a compiled multi-pattern matcher (one regex with a named group per intent,
+  built from the keyword rules of TravelChatbot.get_fallback_response) finds
+  exactly one intent, and
+- a small multinomial naive Bayes model, trained at import on SEED_EXAMPLES
+  and the same keywords, puts at least INTENT_ROUTER_CONFIDENCE on that same
+  intent (place names are left out; they say where, not what).
+
+Everything else (open-ended, multi-topic or longer than INTENT_MAX_WORDS content
+words) goes to the model, as does any question the local data cannot answer,
+e.g. a budget question without an itinerary.
+"""
+import math
+import os
+import re
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+from answer_cache import question_terms
+from budget_optimizer import BudgetOptimizer
+from gazetteer import gazetteer
+from metrics import registry
+from weather_service import weather_service
+
+INTENT_ROUTER_ENABLED = os.environ.get("INTENT_ROUTER_ENABLED", "true").lower() in ('1', 'true', 'yes')
+INTENT_ROUTER_CONFIDENCE = float(os.environ.get("INTENT_ROUTER_CONFIDENCE", 0.45))
+INTENT_MAX_WORDS = 10
+KEYWORD_WEIGHT = 2
+LOCAL_INTENTS = ('weather', 'budget', 'transport')
+
+INTENT_KEYWORDS = {
+    'weather': ['weather', 'temperature', 'rain', 'raining', 'rainy', 'climate', 'forecast', 'hot', 'cold',
+                'humid', 'sunny', 'monsoon', 'umbrella', 'degrees'],
+    'budget': ['budget', 'cost', 'costs', 'money', 'expensive', 'cheap', 'afford', 'spend', 'spending',
+               'price', 'prices', 'rupees', 'inr', '₹'],
+    'transport': ['transport', 'travel', 'train', 'trains', 'bus', 'buses', 'metro', 'taxi', 'cab', 'cabs', 'auto',
+                  'rickshaw', 'flight', 'get around', 'getting around', 'commute', 'uber', 'ola'],
+    'food': ['food', 'eat', 'eating', 'restaurant', 'restaurants', 'cuisine', 'dish', 'dishes', 'vegetarian',
+             'street food', 'breakfast', 'lunch', 'dinner'],
+}
+
+SEED_EXAMPLES = {
+    'weather': [
+        "what is the weather like", "will it rain tomorrow", "how hot is it there", "temperature today",
+        "is it cold at night", "weather forecast for this week", "should I carry an umbrella",
+        "is it monsoon season now", "how humid is it", "will it be sunny for sightseeing",
+        "current weather conditions", "do I need warm clothes",
+    ],
+    'budget': [
+        "how much money should I budget", "is my budget enough", "how much will the trip cost",
+        "how much should I spend per day", "is it expensive", "daily budget for food and stay",
+        "how can I save money", "cheap options to cut costs", "what is my budget breakdown",
+        "how much to spend on hotels", "can I afford this trip", "price of things there",
+    ],
+    'transport': [
+        "how do I get around", "best way to travel in the city", "is there a metro", "should I take a taxi",
+        "how to book train tickets", "local transport options", "are auto rickshaws safe",
+        "bus or train", "how to reach the airport", "cab apps that work", "how do I commute daily",
+        "is uber available",
+    ],
+    'food': [
+        "what food should I try", "best restaurants nearby", "vegetarian options", "famous local dishes",
+        "where to eat street food", "good places for dinner", "what is the local cuisine",
+        "breakfast places", "is street food safe",
+    ],
+    'other': [
+        "plan a romantic evening", "tell me about the history of the fort", "what are the must see places",
+        "is it safe for solo women travellers", "what should I pack", "suggest a day trip",
+        "what festivals are happening", "write a short travel poem", "any cultural etiquette I should know",
+        "hidden gems off the beaten path", "recommend photography spots", "things to do with kids",
+        "how do I greet people politely", "what souvenirs should I buy",
+    ],
+}
+
+TRANSPORT_TIPS = {
+    'metro': "Use the metro for longer hops and app cabs or autos for the last mile; avoid road travel at rush hour.",
+    'hill': "Shared jeeps and local taxis are the usual way around; roads are slow, so allow extra time between stops.",
+    'beach': "Renting a scooter is the cheapest way to hop between beaches; app cabs are limited, so agree taxi fares upfront.",
+    'historical': "Autos and app cabs cover most sights; hiring a car for the day works well when sights are spread out.",
+    'spiritual': "Most sights are walkable or a short auto ride apart; expect crowds and slow traffic near temples and ghats.",
+}
+
+chatbot_routes = registry.counter('chatbot_routed_total', 'Chatbot questions by intent and where they were answered',
+                                  ('intent', 'route'))
+
+
+def _build_matcher() -> re.Pattern:
+    groups = []
+    for intent, keywords in INTENT_KEYWORDS.items():
+        alternatives = '|'.join(re.escape(k) for k in sorted(keywords, key=len, reverse=True))
+        groups.append(f"(?P<{intent}>{alternatives})")
+    return re.compile(r'(?<!\w)(?:' + '|'.join(groups) + r')(?!\w)', re.IGNORECASE)
+
+
+class NaiveBayes:
+    """Multinomial naive Bayes over content words with add-one smoothing"""
+
+    def __init__(self, examples: Dict[str, List[str]], keywords: Optional[Dict[str, List[str]]] = None):
+        self.labels = list(examples)
+        counts = {label: Counter() for label in self.labels}
+        for label, texts in examples.items():
+            for text in texts:
+                counts[label].update(question_terms(text)[0])
+        # The matcher's keywords count as extra evidence, so one strong word is enough for a short question
+        for label, words in (keywords or {}).items():
+            for word in words:
+                counts[label].update(question_terms(word)[0] * KEYWORD_WEIGHT)
+        vocabulary = set().union(*counts.values())
+        total_examples = sum(len(texts) for texts in examples.values())
+        self.log_prior = {label: math.log(len(examples[label]) / total_examples) for label in self.labels}
+        self.log_likelihood = {}
+        self.log_unseen = {}
+        for label in self.labels:
+            total = sum(counts[label].values()) + len(vocabulary)
+            self.log_likelihood[label] = {word: math.log((n + 1) / total) for word, n in counts[label].items()}
+            self.log_unseen[label] = math.log(1 / total)
+
+    def predict(self, terms: List[str]) -> Tuple[str, float]:
+        """Most likely label and its posterior probability"""
+        scores = {}
+        for label in self.labels:
+            likelihood = self.log_likelihood[label]
+            unseen = self.log_unseen[label]
+            scores[label] = self.log_prior[label] + sum(likelihood.get(term, unseen) for term in terms)
+        best = max(scores, key=scores.get)
+        normalizer = sum(math.exp(score - scores[best]) for score in scores.values())
+        return best, 1 / normalizer
+
+
+class IntentRouter:
+    def __init__(self):
+        self.matcher = _build_matcher()
+        self.model = NaiveBayes(SEED_EXAMPLES, INTENT_KEYWORDS)
+        self.budget_optimizer = BudgetOptimizer()
+
+    def classify(self, message: str) -> Tuple[str, float]:
+        """('weather' | 'budget' | 'transport' | 'food' | 'other', confidence) for routing"""
+        matched = {match.lastgroup for match in self.matcher.finditer(message)}
+        # The model has never seen most place names
+        terms = [term for term in question_terms(message)[0] if not gazetteer.lookup(term)]
+        if len(matched) != 1 or len(terms) > INTENT_MAX_WORDS:
+            return 'other', 0.0
+        intent = matched.pop()
+        label, probability = self.model.predict(terms)
+        return (intent, probability) if label == intent else ('other', 0.0)
+
+    def answer(self, message: str, trip: Optional[Dict] = None) -> Optional[str]:
+        """A locally computed answer, or None when the question should go to the LLM"""
+        if not INTENT_ROUTER_ENABLED:
+            return None
+        intent, confidence = self.classify(message)
+        response = None
+        if intent in LOCAL_INTENTS and confidence >= INTENT_ROUTER_CONFIDENCE:
+            trip = trip or {}
+            places = gazetteer.places_in(message)
+            destination = places[0] if places else trip.get('destination')
+            response = getattr(self, f"_answer_{intent}")(destination, trip)
+        chatbot_routes.inc(intent=intent, route='local' if response else 'llm')
+        return response
+
+    def _answer_weather(self, destination: Optional[str], trip: Dict) -> Optional[str]:
+        if not destination:
+            return None
+        bundle = weather_service.get_weather_bundle(destination, days=2)
+        if not bundle or not bundle.get('current'):
+            return None
+        current = bundle['current']
+        lines = [
+            f"Right now in {current.get('name', destination)} it's {current['main']['temp']:.0f}°C "
+            f"(feels like {current['main']['feels_like']:.0f}°C) with {current['weather'][0]['description']}, "
+            f"humidity {current['main']['humidity']}%."
+        ]
+        forecast = bundle.get('forecast') or []
+        if forecast:
+            temperatures = [slot['temperature'] for slot in forecast[:8]]
+            lines.append(f"Over the next 24 hours expect {min(temperatures):.0f}–{max(temperatures):.0f}°C.")
+            wet = [slot for slot in forecast[:16] if slot.get('precipitation', 0) > 0.5 or slot['main'] == 'Rain']
+            if wet:
+                lines.append(f"Rain is likely around {wet[0]['datetime'].strftime('%a %I %p').replace(' 0', ' ')}, "
+                             "so keep an umbrella handy.")
+            else:
+                lines.append("No rain is expected in the next two days.")
+        return ' '.join(lines)
+
+    def _answer_budget(self, destination: Optional[str], trip: Dict) -> Optional[str]:
+        breakdown = trip.get('budget_breakdown') or {}
+        duration = trip.get('duration') or 0
+        total = sum(value for value in breakdown.values() if isinstance(value, (int, float)))
+        if not destination or not total or not duration:
+            return None
+        advice = self.budget_optimizer.get_budget_recommendations(destination, duration, total, trip.get('interests', []))
+        split = ', '.join(f"{category} ₹{amount:,.0f}" for category, amount in advice['budget_breakdown'].items())
+        return (f"Your {duration}-day {destination} plan comes to about ₹{total:,.0f}, roughly ₹{advice['daily_budget']:,} "
+                f"a day, which is a {advice['budget_tier']} trip. A balanced split would be: {split}. "
+                f"Tips: {'; '.join(advice['tips'])}.")
+
+    def _answer_transport(self, destination: Optional[str], trip: Dict) -> Optional[str]:
+        if not destination:
+            return None
+        destination_type = self.budget_optimizer.get_destination_type(destination)
+        answer = TRANSPORT_TIPS.get(destination_type, TRANSPORT_TIPS['historical'])
+        transport_budget = (trip.get('budget_breakdown') or {}).get('transport')
+        if transport_budget and trip.get('duration'):
+            answer += (f" Your plan sets aside ₹{transport_budget:,.0f} for transport, "
+                       f"about ₹{transport_budget / trip['duration']:,.0f} a day.")
+        return (f"Getting around {destination}: {answer} For intercity legs, Indian Railways is the most economical; "
+                "book early for long routes.")
+
+
+intent_router = IntentRouter()
@@ -0,0 +1,39 @@
+"""
+Single place where the Groq chat models are built.
+
+GROQ_API_BASE points every model at another Groq-compatible endpoint, e.g. the
+replay_server.py stand-in for offline load tests; without a GROQ_API_KEY a
+placeholder key is used there since the stand-in does not check it.
+"""
+import os
+from typing import Optional
+
+from langchain_groq import ChatGroq
+
+from metrics import LLMMetricsCallback
+
+GROQ_API_KEY = os.environ.get("GROQ_API_KEY")
+GROQ_API_BASE = os.environ.get("GROQ_API_BASE")
+GROQ_MODEL = os.environ.get("GROQ_MODEL", "llama-3.1-8b-instant")
+
+
+def api_key() -> Optional[str]:
+    if GROQ_API_KEY:
+        return GROQ_API_KEY
+    return 'replay' if GROQ_API_BASE else None
+
+
+def create_chat_model(temperature: float, max_tokens: int, operation: Optional[str] = None) -> ChatGroq:
+    """ChatGroq with the shared model settings; `operation` attaches an LLMMetricsCallback"""
+    options = {}
+    if GROQ_API_BASE:
+        options['groq_api_base'] = GROQ_API_BASE
+    if operation:
+        options['callbacks'] = [LLMMetricsCallback(operation)]
+    return ChatGroq(
+        groq_api_key=api_key(),
+        model_name=GROQ_MODEL,
+        temperature=temperature,
+        max_tokens=max_tokens,
+        **options
+    )
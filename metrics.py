@@ -0,0 +1,440 @@
+"""
+Lightweight in-process metrics with Prometheus text exposition.
+
+Collects per-route request latency, outbound dependency latency and errors
+(Groq, OpenWeatherMap), LLM token usage, cache hit ratios and DB query counts
+per request, and serves them on /metrics.
+
+Multi-worker aggregation: when METRICS_DIR is set, every worker periodically
+dumps its samples to METRICS_DIR/metrics_<pid>.json and /metrics merges all
+dumps. Counters and histograms from exited workers are kept so totals stay
+monotonic; gauges are only taken from live workers.
+"""
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, Tuple
+
+from flask import Response, g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+import tracing
+
+try:
+    from langchain_core.callbacks import BaseCallbackHandler
+except ImportError:  # metrics still work for everything but LLM calls
+    BaseCallbackHandler = object
+
+METRICS_DIR = os.environ.get("METRICS_DIR")
+METRICS_FLUSH_INTERVAL = float(os.environ.get("METRICS_FLUSH_INTERVAL", 5))
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+TOKEN_BUCKETS = (64, 128, 256, 512, 1024, 2048, 4096, 8192)
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def _key(self, labels: Dict) -> Tuple:
+        return tuple(str(labels.get(name, '')) for name in self.labelnames)
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            return {'|'.join(key): value for key, value in self._values.items()}
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    kind = 'gauge'
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                # Per-bucket (non-cumulative) counts, then sum and count
+                entry = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            counts = entry[0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[index] += 1
+                    break
+            else:
+                counts[-1] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+
+class Registry:
+    def __init__(self):
+        self.metrics: Dict[str, _Metric] = {}
+        # Called at scrape time to refresh gauges that are read from elsewhere
+        self.collectors: List[Callable[[], None]] = []
+
+    def register(self, metric: _Metric) -> _Metric:
+        self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, documentation, labelnames=()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=()) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def collect(self) -> Dict:
+        for collector in self.collectors:
+            try:
+                collector()
+            except Exception:
+                pass
+        return {name: metric.snapshot() for name, metric in self.metrics.items()}
+
+
+registry = Registry()
+
+http_request_duration = registry.histogram(
+    'http_request_duration_seconds', 'Request latency by route', ('route', 'method', 'status'))
+db_queries_per_request = registry.histogram(
+    'db_queries_per_request', 'SQL statements executed per request', ('route',), buckets=COUNT_BUCKETS)
+db_query_duration = registry.histogram(
+    'db_query_duration_seconds', 'SQL statement latency', ('operation',))
+dependency_duration = registry.histogram(
+    'dependency_request_duration_seconds', 'Outbound call latency by dependency', ('dependency', 'operation'))
+dependency_errors = registry.counter(
+    'dependency_errors_total', 'Failed outbound calls by dependency', ('dependency', 'operation'))
+llm_tokens = registry.counter(
+    'llm_tokens_total', 'LLM tokens consumed', ('operation', 'kind'))
+cache_requests = registry.counter(
+    'cache_requests_total', 'Cache lookups by result', ('cache', 'result'))
+render_duration = registry.histogram(
+    'render_duration_seconds', 'Time spent rendering documents', ('kind',))
+
+# Observers notified of every outbound call (used by request profiling/tracing)
+_dependency_listeners: List[Callable[[Dict], None]] = []
+
+
+def add_dependency_listener(listener: Callable[[Dict], None]):
+    _dependency_listeners.append(listener)
+
+
+def _notify_dependency(record: Dict):
+    for listener in _dependency_listeners:
+        try:
+            listener(record)
+        except Exception:
+            pass
+
+
+@contextmanager
+def track_dependency(dependency: str, operation: str, **details):
+    """Time (and trace) an outbound call; exceptions are counted as errors and re-raised"""
+    start = time.perf_counter()
+    error = None
+    try:
+        with tracing.span(f"{dependency}.{operation}", kind='client', **details):
+            yield
+    except Exception as e:
+        error = e
+        dependency_errors.inc(dependency=dependency, operation=operation)
+        raise
+    finally:
+        elapsed = time.perf_counter() - start
+        dependency_duration.observe(elapsed, dependency=dependency, operation=operation)
+        _notify_dependency({
+            'dependency': dependency,
+            'operation': operation,
+            'duration': elapsed,
+            'error': repr(error) if error else None,
+            **details
+        })
+
+
+def record_cache(cache: str, hit: bool):
+    cache_requests.inc(cache=cache, result='hit' if hit else 'miss')
+
+
+class LLMMetricsCallback(BaseCallbackHandler):
+    """LangChain callback that times Groq calls and counts their token usage"""
+
+    def __init__(self, operation: str):
+        self.operation = operation
+        self._starts = {}
+        self._spans = {}
+
+    def _start(self, run_id):
+        self._starts[run_id] = time.perf_counter()
+        llm_span = tracing.start_span('groq.llm', kind='client', operation=self.operation)
+        if llm_span is not None:
+            self._spans[run_id] = llm_span
+
+    def on_llm_start(self, serialized, prompts, *, run_id, **kwargs):
+        self._start(run_id)
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+        self._start(run_id)
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        prompt_tokens, completion_tokens = _token_usage(response)
+        if prompt_tokens:
+            llm_tokens.inc(prompt_tokens, operation=self.operation, kind='prompt')
+        if completion_tokens:
+            llm_tokens.inc(completion_tokens, operation=self.operation, kind='completion')
+
+        llm_span = self._spans.pop(run_id, None)
+        if llm_span is not None:
+            llm_span.set_attribute('llm.prompt_tokens', prompt_tokens)
+            llm_span.set_attribute('llm.completion_tokens', completion_tokens)
+            llm_span.end()
+
+        start = self._starts.pop(run_id, None)
+        if start is not None:
+            elapsed = time.perf_counter() - start
+            dependency_duration.observe(elapsed, dependency='groq', operation=self.operation)
+            _notify_dependency({'dependency': 'groq', 'operation': self.operation, 'duration': elapsed, 'error': None})
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        dependency_errors.inc(dependency='groq', operation=self.operation)
+
+        llm_span = self._spans.pop(run_id, None)
+        if llm_span is not None:
+            llm_span.end(error)
+
+        start = self._starts.pop(run_id, None)
+        if start is not None:
+            elapsed = time.perf_counter() - start
+            dependency_duration.observe(elapsed, dependency='groq', operation=self.operation)
+            _notify_dependency({'dependency': 'groq', 'operation': self.operation, 'duration': elapsed, 'error': repr(error)})
+
+
+def _token_usage(response) -> Tuple[int, int]:
+    usage = (getattr(response, 'llm_output', None) or {}).get('token_usage') or {}
+    if usage:
+        return usage.get('prompt_tokens', 0), usage.get('completion_tokens', 0)
+
+    prompt_tokens = completion_tokens = 0
+    for generations in getattr(response, 'generations', []):
+        for generation in generations:
+            metadata = getattr(getattr(generation, 'message', None), 'usage_metadata', None) or {}
+            prompt_tokens += metadata.get('input_tokens', 0)
+            completion_tokens += metadata.get('output_tokens', 0)
+    return prompt_tokens, completion_tokens
+
+
+# --- SQL statement counting ---
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_start_time', []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    starts = conn.info.get('query_start_time')
+    if not starts:
+        return
+    elapsed = time.perf_counter() - starts.pop()
+    operation = statement.lstrip().split(' ', 1)[0].upper()
+    db_query_duration.observe(elapsed, operation=operation)
+    if has_request_context() and hasattr(g, 'db_query_count'):
+        g.db_query_count += 1
+
+
+# --- Multi-worker aggregation ---
+
+_last_flush = 0.0
+
+
+def _dump_path(pid: int) -> str:
+    return os.path.join(METRICS_DIR, f"metrics_{pid}.json")
+
+
+def flush(force: bool = False):
+    """Write this worker's samples to METRICS_DIR (throttled)"""
+    global _last_flush
+    if not METRICS_DIR:
+        return
+    now = time.monotonic()
+    if not force and now - _last_flush < METRICS_FLUSH_INTERVAL:
+        return
+    _last_flush = now
+
+    os.makedirs(METRICS_DIR, exist_ok=True)
+    path = _dump_path(os.getpid())
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(registry.collect(), f)
+    os.replace(tmp_path, path)
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+        return True
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+
+
+def _merge(total: Dict, samples: Dict, include_gauges: bool):
+    for name, values in samples.items():
+        metric = registry.metrics.get(name)
+        if metric is None or (metric.kind == 'gauge' and not include_gauges):
+            continue
+        merged = total.setdefault(name, {})
+        for key, value in values.items():
+            if metric.kind == 'histogram':
+                if key not in merged:
+                    merged[key] = [list(value[0]), value[1], value[2]]
+                else:
+                    entry = merged[key]
+                    entry[0] = [a + b for a, b in zip(entry[0], value[0])]
+                    entry[1] += value[1]
+                    entry[2] += value[2]
+            else:
+                merged[key] = merged.get(key, 0) + value
+
+
+def aggregate() -> Dict:
+    """Samples from this worker plus every other worker's dump"""
+    total = {}
+    _merge(total, registry.collect(), include_gauges=True)
+    if not METRICS_DIR or not os.path.isdir(METRICS_DIR):
+        return total
+
+    own = os.getpid()
+    for filename in os.listdir(METRICS_DIR):
+        if not (filename.startswith('metrics_') and filename.endswith('.json')):
+            continue
+        try:
+            pid = int(filename[len('metrics_'):-len('.json')])
+        except ValueError:
+            continue
+        if pid == own:
+            continue
+        try:
+            with open(os.path.join(METRICS_DIR, filename)) as f:
+                samples = json.load(f)
+        except (OSError, ValueError):
+            continue
+        _merge(total, samples, include_gauges=_pid_alive(pid))
+    return total
+
+
+# --- Exposition ---
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _labels(metric: _Metric, key: str, extra: Optional[Tuple[str, str]] = None) -> str:
+    values = key.split('|') if metric.labelnames else []
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(metric.labelnames, values)]
+    if extra:
+        pairs.append(f'{extra[0]}="{extra[1]}"')
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def render_prometheus(samples: Dict) -> str:
+    lines = []
+    for name, metric in registry.metrics.items():
+        values = samples.get(name)
+        if not values:
+            continue
+        lines.append(f"# HELP {name} {metric.documentation}")
+        lines.append(f"# TYPE {name} {metric.kind}")
+        for key, value in sorted(values.items()):
+            if metric.kind == 'histogram':
+                counts, total, count = value
+                cumulative = 0
+                for bound, bucket_count in zip(metric.buckets, counts):
+                    cumulative += bucket_count
+                    lines.append(f"{name}_bucket{_labels(metric, key, ('le', repr(float(bound))))} {cumulative}")
+                lines.append(f"{name}_bucket{_labels(metric, key, ('le', '+Inf'))} {count}")
+                lines.append(f"{name}_sum{_labels(metric, key)} {total}")
+                lines.append(f"{name}_count{_labels(metric, key)} {count}")
+            else:
+                lines.append(f"{name}{_labels(metric, key)} {value}")
+
+    # Derived hit ratio, so dashboards don't need to do the division
+    cache_values = samples.get('cache_requests_total', {})
+    ratios = {}
+    for key, value in cache_values.items():
+        cache, result = key.split('|')
+        hits, total = ratios.get(cache, (0, 0))
+        ratios[cache] = (hits + (value if result == 'hit' else 0), total + value)
+    if ratios:
+        lines.append("# HELP cache_hit_ratio Fraction of cache lookups that hit")
+        lines.append("# TYPE cache_hit_ratio gauge")
+        for cache, (hits, total) in sorted(ratios.items()):
+            lines.append(f'cache_hit_ratio{{cache="{_escape(cache)}"}} {hits / total if total else 0}')
+
+    return '\n'.join(lines) + '\n'
+
+
+def init_app(app):
+    """Register request hooks and the /metrics endpoint"""
+
+    @app.before_request
+    def _start_request_timer():
+        g.request_start_time = time.perf_counter()
+        g.db_query_count = 0
+
+    @app.after_request
+    def _record_request(response):
+        start = getattr(g, 'request_start_time', None)
+        if start is not None:
+            route = request.url_rule.rule if request.url_rule else 'unmatched'
+            http_request_duration.observe(
+                time.perf_counter() - start, route=route, method=request.method, status=response.status_code)
+            db_queries_per_request.observe(g.db_query_count, route=route)
+            flush()
+        return response
+
+    def metrics_endpoint():
+        return Response(render_prometheus(aggregate()), mimetype='text/plain; version=0.0.4')
+
+    app.add_url_rule('/metrics', 'metrics', metrics_endpoint)
@@ -9,8 +9,14 @@ class TravelItinerary(db.Model):
     budget = db.Column(db.Float, nullable=False)
     interests = db.Column(db.Text)  # JSON string of interests
     itinerary_data = db.Column(db.Text)  # JSON string of generated itinerary
+    start_date = db.Column(db.Date, index=True)  # first day of the trip, when known
+    trip_context = db.Column(db.Text)  # compact JSON TripContext, see trip_context.py
+    trip_context_version = db.Column(db.String(16))  # its version, so readers never re-hash itinerary_data
+    chat_suggestions = db.Column(db.Text)  # JSON, precomputed by chat_suggestions after the itinerary is saved
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     checkpoints = db.relationship('Checkpoint', backref='itinerary', lazy=True, cascade='all, delete-orphan')
+    weather_alerts = db.relationship('WeatherAlert', backref='itinerary', lazy=True, cascade='all, delete-orphan')
+    notifications = db.relationship('Notification', backref='itinerary', lazy=True, cascade='all, delete-orphan')
     
     def get_interests_list(self):
         if self.interests:
@@ -27,6 +33,11 @@ class TravelItinerary(db.Model):
     
     def set_itinerary_data(self, data):
         self.itinerary_data = json.dumps(data)
+    
+    def get_chat_suggestions(self):
+        if self.chat_suggestions:
+            return json.loads(self.chat_suggestions)
+        return None
 
 class Checkpoint(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -39,7 +50,144 @@ class Checkpoint(db.Model):
     is_completed = db.Column(db.Boolean, default=False)
     completed_at = db.Column(db.DateTime)
     notes = db.Column(db.Text)
+    lat = db.Column(db.Float)  # filled in by checkpoint_geocoding after the itinerary is saved
+    lon = db.Column(db.Float)
+    geocode_failed_at = db.Column(db.DateTime)  # last attempt that found nothing; not retried for a while
     
     def mark_completed(self):
         self.is_completed = True
         self.completed_at = datetime.utcnow()
+
+
+def checkpoint_rows(itinerary_data):
+    """Checkpoint column values (minus itinerary_id) for each activity in a generated itinerary"""
+    rows = []
+    for day_data in itinerary_data.get('days', []):
+        day_num = day_data.get('day', 1)
+        for activity in day_data.get('activities', []):
+            # Prepare notes with opening hours and tips
+            notes_parts = []
+            if activity.get('opening_hours'):
+                notes_parts.append(f"opening_hours:{activity.get('opening_hours')}")
+            if activity.get('tips'):
+                notes_parts.append(f"tips:{activity.get('tips')}")
+            if activity.get('travel_time_to_next'):
+                notes_parts.append(f"travel_time:{activity.get('travel_time_to_next')}")
+            if activity.get('transportation_mode'):
+                notes_parts.append(f"transport:{activity.get('transportation_mode')}")
+            if activity.get('duration'):
+                notes_parts.append(f"duration:{activity.get('duration')}")
+            
+            rows.append({
+                'day': day_num,
+                'time': activity.get('time', '09:00'),
+                'location': activity.get('location', ''),
+                'activity': activity.get('description', ''),
+                'estimated_cost': activity.get('cost', 0.0),
+                'notes': ', '.join(notes_parts) if notes_parts else None
+            })
+    return rows
+
+class BatchJob(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(200))
+    status = db.Column(db.String(20), default='pending')  # pending, running, completed, partial
+    total_items = db.Column(db.Integer, default=0)
+    duplicate_count = db.Column(db.Integer, default=0)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    finished_at = db.Column(db.DateTime)
+    heartbeat_at = db.Column(db.DateTime)  # refreshed by the process running the batch; see batch_service.claim_batch
+    items = db.relationship('BatchItem', backref='batch', lazy=True, cascade='all, delete-orphan')
+
+class BatchItem(db.Model):
+    __table_args__ = (db.UniqueConstraint('batch_id', 'request_key'),)
+    
+    id = db.Column(db.Integer, primary_key=True)
+    batch_id = db.Column(db.Integer, db.ForeignKey('batch_job.id'), nullable=False, index=True)
+    request_key = db.Column(db.String(40), nullable=False)  # sha1 of the normalized request
+    destination = db.Column(db.String(200), nullable=False)
+    duration = db.Column(db.Integer, nullable=False)
+    budget = db.Column(db.Float, nullable=False)
+    interests = db.Column(db.Text)  # JSON string of interests
+    status = db.Column(db.String(20), default='pending', index=True)  # pending, done, failed
+    itinerary_id = db.Column(db.Integer, db.ForeignKey('travel_itinerary.id'))
+    error = db.Column(db.Text)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    def get_interests_list(self):
+        if self.interests:
+            return json.loads(self.interests)
+        return []
+
+class GeocodeCache(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    query_key = db.Column(db.String(200), nullable=False, unique=True)  # normalized place name
+    found = db.Column(db.Boolean, nullable=False, default=True)  # False caches "no such place"
+    lat = db.Column(db.Float)
+    lon = db.Column(db.Float)
+    name = db.Column(db.String(200))
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+class AnswerCacheGeneration(db.Model):
+    """Per-place counter in every answer cache scope key; bumping it invalidates the place in every worker"""
+    id = db.Column(db.Integer, primary_key=True)
+    place_key = db.Column(db.String(200), nullable=False, unique=True)  # gazetteer.normalize(place)
+    generation = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+class SuggestionCache(db.Model):
+    """Chatbot suggestions shared by every itinerary with the same destination and interests"""
+    id = db.Column(db.Integer, primary_key=True)
+    query_key = db.Column(db.String(200), nullable=False, unique=True)  # see chat_suggestions.suggestion_key
+    data = db.Column(db.Text, nullable=False)  # JSON: weather_context, suggestions
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+class WeatherAlert(db.Model):
+    """Severe weather expected during a trip, precomputed by the weather alerts job"""
+    id = db.Column(db.Integer, primary_key=True)
+    itinerary_id = db.Column(db.Integer, db.ForeignKey('travel_itinerary.id'), nullable=False, index=True)
+    destination = db.Column(db.String(200), nullable=False)
+    alert_date = db.Column(db.Date, nullable=False, index=True)
+    severity = db.Column(db.String(20), nullable=False)  # medium, high
+    message = db.Column(db.Text, nullable=False)
+    conditions = db.Column(db.Text)  # JSON list of the severe forecast slots
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def get_conditions(self):
+        if self.conditions:
+            return json.loads(self.conditions)
+        return []
+
+class Notification(db.Model):
+    """A finding of the trip monitoring job, read by the UI and the push channel"""
+    id = db.Column(db.Integer, primary_key=True)
+    itinerary_id = db.Column(db.Integer, db.ForeignKey('travel_itinerary.id'), nullable=False, index=True)
+    kind = db.Column(db.String(20), nullable=False)  # weather, budget, activity, urgent
+    severity = db.Column(db.String(20), nullable=False)  # info, medium, high
+    title = db.Column(db.String(200), nullable=False)
+    message = db.Column(db.Text, nullable=False)
+    data = db.Column(db.Text)  # JSON of the agent's finding
+    dedupe_key = db.Column(db.String(40), nullable=False, index=True)  # same finding for the same trip
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    read_at = db.Column(db.DateTime)
+    
+    def get_data(self):
+        if self.data:
+            return json.loads(self.data)
+        return {}
+
+class AgentMemoryState(db.Model):
+    """Compact JSON snapshot of the agent coordinator's learned memory, merged by every worker"""
+    id = db.Column(db.Integer, primary_key=True)
+    key = db.Column(db.String(50), nullable=False, unique=True)
+    data = db.Column(db.Text, nullable=False)
+    version = db.Column(db.Integer, nullable=False, default=0)  # optimistic concurrency between workers
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class ChatMessage(db.Model):
+    """Compact chatbot history so conversations survive worker restarts"""
+    id = db.Column(db.Integer, primary_key=True)
+    session_key = db.Column(db.String(100), nullable=False, index=True)
+    role = db.Column(db.String(10), nullable=False)  # human, ai
+    content = db.Column(db.Text, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
@@ -0,0 +1,352 @@
+"""
+Opt-in per-request profiling.
+
+A request is profiled when it carries `X-Profile-Token: <PROFILE_TOKEN>` or
+when it is picked by PROFILE_SAMPLE_RATE (0.0 - 1.0). The profile records
+collapsed stacks (Brendan Gregg "folded" format with microsecond weights,
+which speedscope imports directly), the SQL statements executed and the
+outbound Groq/OpenWeatherMap calls made. Profiles are stored as JSON under PROFILE_DIR and can be listed and
+downloaded from /api/profiles with the same token.
+
+Two profilers are available:
+  sampling      - a native background thread samples the request's stack every
+                  PROFILE_INTERVAL seconds; cheap enough for sampled traffic.
+                  Under gevent workers it follows the request's own greenlet
+                  (its parked frame while it waits, the OS thread's frame while
+                  it runs), so concurrent requests never mix.
+  deterministic - sys.setprofile records every call with exact self time;
+                  higher overhead, only used when asked for with
+                  `X-Profile-Mode: deterministic`. It sees every greenlet on the
+                  thread, so under gevent the sampling profiler is used instead.
+"""
+import _thread
+import hmac
+import json
+import os
+import random
+import sys
+import time
+import uuid
+from datetime import datetime
+from typing import Dict, Optional
+
+from flask import Response, abort, g, has_request_context, jsonify, request
+
+try:
+    from gevent import monkey as gevent_monkey
+except ImportError:
+    gevent_monkey = None
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+import metrics
+
+PROFILE_TOKEN = os.environ.get("PROFILE_TOKEN")
+PROFILE_SAMPLE_RATE = float(os.environ.get("PROFILE_SAMPLE_RATE", 0))
+PROFILE_INTERVAL = float(os.environ.get("PROFILE_INTERVAL", 0.005))
+PROFILE_DIR = os.environ.get("PROFILE_DIR", os.path.join("instance", "profiles"))
+PROFILE_MAX_STORED = int(os.environ.get("PROFILE_MAX_STORED", 50))
+PROFILE_MAX_SQL = 500
+
+
+def _gevent_patched() -> bool:
+    return gevent_monkey is not None and gevent_monkey.is_module_patched('threading')
+
+
+def _native(name: str):
+    """The unpatched _thread / time function, so the sampler stays a real OS thread under gevent"""
+    module = 'time' if name == 'sleep' else '_thread'
+    if _gevent_patched():
+        return gevent_monkey.get_original(module, name)
+    return getattr(time if module == 'time' else _thread, name)
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class SamplingProfiler:
+    """Samples one request's Python stack at a fixed interval"""
+
+    mode = 'sampling'
+
+    def __init__(self, thread_id: int, interval: float = PROFILE_INTERVAL, task=None):
+        self.thread_id = thread_id  # OS thread running the request
+        self.task = task  # the request's greenlet under gevent
+        self.interval = interval
+        self.stacks: Dict[str, int] = {}
+        self.samples = 0
+        self._stopped = False
+        self._done = _native('allocate_lock')()
+
+    @classmethod
+    def for_current_request(cls, interval: float = PROFILE_INTERVAL) -> 'SamplingProfiler':
+        task = None
+        if _gevent_patched():
+            from greenlet import getcurrent
+            task = getcurrent()
+        # threading.get_ident() is a greenlet id under gevent; sys._current_frames() is keyed by OS thread
+        return cls(_native('get_ident')(), interval, task)
+
+    def start(self):
+        self._done.acquire()
+        _native('start_new_thread')(self._run, ())
+
+    def stop(self):
+        self._stopped = True
+        self._done.acquire(timeout=1)
+
+    def _frame(self):
+        if self.task is not None and self.task.gr_frame is not None:
+            return self.task.gr_frame  # parked, e.g. waiting on Groq while other greenlets run
+        # Running: the OS thread's current frame belongs to it
+        return sys._current_frames().get(self.thread_id)
+
+    def _run(self):
+        sleep = _native('sleep')
+        try:
+            while True:
+                sleep(self.interval)
+                if self._stopped:
+                    break
+                frame = self._frame()
+                if frame is None:
+                    continue
+                labels = []
+                while frame is not None:
+                    labels.append(_frame_label(frame))
+                    frame = frame.f_back
+                key = ';'.join(reversed(labels))
+                self.stacks[key] = self.stacks.get(key, 0) + 1
+                self.samples += 1
+        finally:
+            self._done.release()
+
+    def collapsed(self) -> Dict[str, int]:
+        # Weight each stack in microseconds so both profilers share a unit
+        weight = self.interval * 1_000_000
+        return {stack: int(count * weight) for stack, count in self.stacks.items()}
+
+
+class DeterministicProfiler:
+    """Records exact self time per call stack using sys.setprofile"""
+
+    mode = 'deterministic'
+
+    def __init__(self):
+        self.self_time: Dict[str, float] = {}
+        self._stack = []  # [label, start, child_time]
+        self._path = []
+
+    def start(self):
+        sys.setprofile(self._profile)
+
+    def stop(self):
+        sys.setprofile(None)
+        # Close frames that were still open when profiling stopped
+        now = time.perf_counter()
+        while self._stack:
+            self._pop(now)
+
+    def _pop(self, now: float):
+        label, start, child_time = self._stack.pop()
+        elapsed = now - start
+        key = ';'.join(self._path)
+        self.self_time[key] = self.self_time.get(key, 0.0) + (elapsed - child_time)
+        self._path.pop()
+        if self._stack:
+            self._stack[-1][2] += elapsed
+
+    def _profile(self, frame, event_name, arg):
+        now = time.perf_counter()
+        if event_name == 'call':
+            label = _frame_label(frame)
+        elif event_name == 'c_call':
+            label = f"{getattr(arg, '__qualname__', repr(arg))} (builtin)"
+        elif event_name in ('return', 'c_return', 'c_exception'):
+            if self._stack:
+                self._pop(now)
+            return
+        else:
+            return
+        self._path.append(label)
+        self._stack.append([label, now, 0.0])
+
+    def collapsed(self) -> Dict[str, int]:
+        return {stack: int(seconds * 1_000_000) for stack, seconds in self.self_time.items() if seconds >= 1e-6}
+
+
+def _authorized() -> bool:
+    token = request.headers.get('X-Profile-Token') or request.args.get('token')
+    return bool(PROFILE_TOKEN and token and hmac.compare_digest(token, PROFILE_TOKEN))
+
+
+def _should_profile() -> bool:
+    if request.headers.get('X-Profile-Token'):
+        return _authorized()
+    return PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _sql_start(conn, cursor, statement, parameters, context, executemany):
+    if has_request_context() and getattr(g, 'profile', None) is not None:
+        conn.info.setdefault('profile_query_start', []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _sql_end(conn, cursor, statement, parameters, context, executemany):
+    if not has_request_context() or getattr(g, 'profile', None) is None:
+        return
+    starts = conn.info.get('profile_query_start')
+    if not starts:
+        return
+    sql = g.profile['sql']
+    if len(sql) < PROFILE_MAX_SQL:
+        sql.append({'statement': statement, 'duration': round(time.perf_counter() - starts.pop(), 6)})
+    else:
+        starts.pop()
+
+
+def _record_outbound(record: Dict):
+    if has_request_context() and getattr(g, 'profile', None) is not None:
+        g.profile['outbound'].append(dict(record, duration=round(record['duration'], 6)))
+
+
+metrics.add_dependency_listener(_record_outbound)
+
+
+def _profile_path(profile_id: str) -> str:
+    return os.path.join(PROFILE_DIR, f"{profile_id}.json")
+
+
+def _save(profile: Dict):
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    with open(_profile_path(profile['id']), 'w') as f:
+        json.dump(profile, f)
+
+    # Keep only the newest PROFILE_MAX_STORED profiles
+    files = sorted(
+        (os.path.join(PROFILE_DIR, name) for name in os.listdir(PROFILE_DIR) if name.endswith('.json')),
+        key=os.path.getmtime
+    )
+    for path in files[:-PROFILE_MAX_STORED]:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def _load(profile_id: str) -> Optional[Dict]:
+    # Profile ids are uuid hex; refuse anything else so the id can't escape PROFILE_DIR
+    if not profile_id.isalnum():
+        return None
+    try:
+        with open(_profile_path(profile_id)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def init_app(app):
+    """Register the profiling hooks and the /api/profiles endpoints"""
+
+    @app.before_request
+    def _start_profile():
+        g.profile = None
+        if not (PROFILE_TOKEN or PROFILE_SAMPLE_RATE) or request.path.startswith('/api/profiles'):
+            return
+        if not _should_profile():
+            return
+
+        if request.headers.get('X-Profile-Mode') == 'deterministic' and _authorized() and not _gevent_patched():
+            profiler = DeterministicProfiler()
+        else:
+            profiler = SamplingProfiler.for_current_request()
+
+        g.profile = {
+            'id': uuid.uuid4().hex,
+            'method': request.method,
+            'path': request.path,
+            'route': request.url_rule.rule if request.url_rule else None,
+            'started_at': datetime.utcnow().isoformat(),
+            'mode': profiler.mode,
+            'sql': [],
+            'outbound': []
+        }
+        g.profiler = profiler
+        g.profile_start = time.perf_counter()
+        profiler.start()
+
+    @app.after_request
+    def _note_status(response):
+        if getattr(g, 'profile', None) is not None:
+            g.profile['status'] = response.status_code
+            response.headers['X-Profile-Id'] = g.profile['id']
+        return response
+
+    @app.teardown_request
+    def _finish_profile(exc):
+        profile = getattr(g, 'profile', None)
+        if profile is None:
+            return
+        g.profiler.stop()
+        g.profile = None
+
+        profile['duration'] = round(time.perf_counter() - g.profile_start, 6)
+        profile['error'] = repr(exc) if exc else None
+        profile['collapsed'] = g.profiler.collapsed()
+        try:
+            _save(profile)
+        except OSError as e:
+            app.logger.error(f"Could not store profile {profile['id']}: {e}")
+
+    def list_profiles():
+        if not _authorized():
+            abort(404)
+        profiles = []
+        if os.path.isdir(PROFILE_DIR):
+            for name in os.listdir(PROFILE_DIR):
+                if not name.endswith('.json'):
+                    continue
+                profile = _load(name[:-len('.json')])
+                if profile:
+                    profiles.append({
+                        'id': profile['id'],
+                        'method': profile['method'],
+                        'path': profile['path'],
+                        'status': profile.get('status'),
+                        'mode': profile['mode'],
+                        'started_at': profile['started_at'],
+                        'duration': profile['duration'],
+                        'sql_count': len(profile['sql']),
+                        'outbound_count': len(profile['outbound'])
+                    })
+        profiles.sort(key=lambda p: p['started_at'], reverse=True)
+        return jsonify(profiles)
+
+    def get_profile(profile_id):
+        if not _authorized():
+            abort(404)
+        profile = _load(profile_id)
+        if not profile:
+            abort(404)
+        return jsonify(profile)
+
+    def get_profile_folded(profile_id):
+        """Collapsed stacks, one 'frame;frame;frame weight' line each - open in speedscope"""
+        if not _authorized():
+            abort(404)
+        profile = _load(profile_id)
+        if not profile:
+            abort(404)
+        lines = [f"{stack} {weight}" for stack, weight in profile['collapsed'].items()]
+        return Response(
+            '\n'.join(lines) + '\n',
+            mimetype='text/plain',
+            headers={'Content-Disposition': f'attachment;filename=profile_{profile_id}.folded'}
+        )
+
+    app.add_url_rule('/api/profiles', 'list_profiles', list_profiles)
+    app.add_url_rule('/api/profiles/<profile_id>', 'get_profile', get_profile)
+    app.add_url_rule('/api/profiles/<profile_id>/folded', 'get_profile_folded', get_profile_folded)
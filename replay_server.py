@@ -0,0 +1,348 @@
+"""
+Stand-in for OpenWeatherMap and Groq for offline benchmarks and soak tests.
+
+Serves the endpoints the app calls:
+  GET  /geo/1.0/direct, /data/2.5/weather, /data/2.5/forecast   (OpenWeatherMap)
+  POST /openai/v1/chat/completions                              (Groq, incl. stream=true)
+
+Replay mode (default) answers from a recordings file (JSON lines). A request
+with a recorded twin gets that response. Otherwise it gets another recording
+of the same endpoint (picked deterministically per request), and failing that
+a synthetic response. Forecast and current-weather timestamps are shifted to
+"now" so replayed forecasts stay current. Latency and error rates are
+configurable per service:
+
+    python replay_server.py --port 8099 --recordings recordings.jsonl \\
+        --weather-latency lognormal:120,0.4 --llm-latency lognormal:1500,0.5 \\
+        --weather-error-rate 0.01 --llm-error-rate 0.02
+    OPENWEATHER_BASE_URL=http://localhost:8099 GROQ_API_BASE=http://localhost:8099 python main.py
+
+Record mode proxies to the real APIs (using the keys the app sends) and
+appends every response, minus credentials, to the recordings file:
+
+    python replay_server.py --record --recordings recordings.jsonl
+
+Latency specs: fixed:<ms>, uniform:<min_ms>,<max_ms>, lognormal:<median_ms>,<sigma>,
+or "recorded" to replay the latency observed while recording.
+"""
+import argparse
+import hashlib
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qsl, urlencode, urlsplit
+
+import requests
+
+WEATHER_PATHS = ('/geo/1.0/direct', '/data/2.5/weather', '/data/2.5/forecast')
+CHAT_PATH = '/openai/v1/chat/completions'
+
+UPSTREAMS = {
+    'weather': 'https://api.openweathermap.org',
+    'llm': 'https://api.groq.com'
+}
+
+CONDITIONS = [
+    ('Clear', 'clear sky', '01d'),
+    ('Clouds', 'scattered clouds', '03d'),
+    ('Clouds', 'overcast clouds', '04d'),
+    ('Rain', 'light rain', '10d'),
+    ('Rain', 'moderate rain', '10d'),
+    ('Thunderstorm', 'thunderstorm with rain', '11d'),
+    ('Haze', 'haze', '50d'),
+]
+
+
+# --- Request keys ---
+
+def request_key(path: str, params: Dict, body: Optional[Dict]) -> str:
+    """Stable identity of a request, ignoring credentials and float noise"""
+    if path == CHAT_PATH:
+        identity = {'model': body.get('model'), 'messages': body.get('messages')}
+    else:
+        identity = {k: v for k, v in sorted(params.items()) if k != 'appid'}
+        for coordinate in ('lat', 'lon'):
+            if coordinate in identity:
+                identity[coordinate] = round(float(identity[coordinate]), 2)
+        if 'q' in identity:
+            identity['q'] = identity['q'].strip().lower()
+    return path + ' ' + hashlib.sha1(json.dumps(identity, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+class Recordings:
+    """Recorded responses indexed by request key and by path"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.by_key: Dict[str, List[Dict]] = {}
+        self.by_path: Dict[str, List[Dict]] = {}
+        self._lock = threading.Lock()
+        try:
+            with open(path) as f:
+                for line in f:
+                    if line.strip():
+                        self._index(json.loads(line))
+        except FileNotFoundError:
+            pass
+
+    def _index(self, record: Dict):
+        self.by_key.setdefault(record['key'], []).append(record)
+        self.by_path.setdefault(record['path'], []).append(record)
+
+    def find(self, key: str, path: str) -> Optional[Dict]:
+        candidates = self.by_key.get(key) or self.by_path.get(path)
+        if not candidates:
+            return None
+        # Same request -> same recording, so a given city keeps its weather
+        return candidates[int(key.rsplit(' ', 1)[-1][:8], 16) % len(candidates)]
+
+    def append(self, record: Dict):
+        with self._lock:
+            self._index(record)
+            with open(self.path, 'a') as f:
+                f.write(json.dumps(record) + '\n')
+
+
+# --- Latency and errors ---
+
+def parse_latency(spec: str):
+    """Return a function producing a delay in seconds (or None for 'recorded')"""
+    if spec == 'recorded':
+        return None
+    kind, _, args = spec.partition(':')
+    values = [float(v) for v in args.split(',') if v]
+    if kind == 'fixed':
+        return lambda: values[0] / 1000
+    if kind == 'uniform':
+        return lambda: random.uniform(values[0], values[1]) / 1000
+    if kind == 'lognormal':
+        median, sigma = values
+        return lambda: random.lognormvariate(0, sigma) * median / 1000
+    raise argparse.ArgumentTypeError(f"Unknown latency spec '{spec}'")
+
+
+# --- Synthetic responses (used when nothing is recorded) ---
+
+def _rng(*parts) -> random.Random:
+    return random.Random(hashlib.sha1(repr(parts).encode('utf-8')).hexdigest())
+
+
+def synthetic_geocode(params: Dict) -> List[Dict]:
+    name = params.get('q', '').split(',')[0].strip().title()
+    if not name:
+        return []
+    rng = _rng('geo', name.lower())
+    # Somewhere in India
+    return [{'name': name, 'lat': round(rng.uniform(8.0, 34.0), 4), 'lon': round(rng.uniform(69.0, 95.0), 4),
+             'country': 'IN'}]
+
+
+def _weather_slot(rng: random.Random, dt: int) -> Dict:
+    main, description, icon = rng.choice(CONDITIONS)
+    temp = round(rng.uniform(14, 36), 2)
+    slot = {
+        'dt': dt,
+        'main': {'temp': temp, 'feels_like': round(temp + rng.uniform(-2, 3), 2),
+                 'humidity': rng.randint(30, 95), 'pressure': rng.randint(995, 1020)},
+        'weather': [{'main': main, 'description': description, 'icon': icon}],
+        'wind': {'speed': round(rng.uniform(0.5, 8.0), 2)},
+        'visibility': 10000
+    }
+    if main in ('Rain', 'Thunderstorm'):
+        slot['rain'] = {'3h': round(rng.uniform(0.5, 14.0), 2)}
+    return slot
+
+
+def synthetic_current(params: Dict) -> Dict:
+    now = int(time.time())
+    slot = _weather_slot(_rng('current', params.get('lat'), params.get('lon'), now // 3600), now)
+    slot['sys'] = {'country': 'IN'}
+    return slot
+
+
+def synthetic_forecast(params: Dict) -> Dict:
+    start = int(time.time()) // 10800 * 10800 + 10800
+    rng = _rng('forecast', params.get('lat'), params.get('lon'), start // 86400)
+    return {'cnt': 40, 'list': [_weather_slot(rng, start + i * 10800) for i in range(40)]}
+
+
+def synthetic_chat(body: Dict) -> str:
+    last = (body.get('messages') or [{}])[-1].get('content', '')
+    return f"(replay) No recorded answer for: {str(last)[:200]}"
+
+
+def chat_completion(body: Dict, content: str) -> Dict:
+    return {
+        'id': 'chatcmpl-replay',
+        'object': 'chat.completion',
+        'created': int(time.time()),
+        'model': body.get('model', 'replay'),
+        'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': content}, 'finish_reason': 'stop'}],
+        'usage': {'prompt_tokens': 0, 'completion_tokens': len(content.split()), 'total_tokens': len(content.split())}
+    }
+
+
+def shift_timestamps(path: str, data):
+    """Move recorded weather timestamps forward so replayed data starts now"""
+    if path == '/data/2.5/forecast' and data.get('list'):
+        offset = (int(time.time()) // 10800 * 10800 + 10800) - data['list'][0]['dt']
+        data = dict(data, list=[dict(item, dt=item['dt'] + offset) for item in data['list']])
+    elif path == '/data/2.5/weather' and 'dt' in data:
+        data = dict(data, dt=int(time.time()))
+    return data
+
+
+# --- Server ---
+
+def make_handler(args):
+    recordings = Recordings(args.recordings)
+    latency = {'weather': parse_latency(args.weather_latency), 'llm': parse_latency(args.llm_latency)}
+    error_rate = {'weather': args.weather_error_rate, 'llm': args.llm_error_rate}
+    session = requests.Session()
+
+    class ReplayHandler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def do_GET(self):
+            self._handle(None)
+
+        def do_POST(self):
+            length = int(self.headers.get('Content-Length', 0))
+            try:
+                body = json.loads(self.rfile.read(length) or b'{}')
+            except ValueError:
+                self._send_json(400, {'error': {'message': 'Invalid JSON body'}})
+                return
+            self._handle(body)
+
+        def _handle(self, body: Optional[Dict]):
+            url = urlsplit(self.path)
+            params = dict(parse_qsl(url.query))
+            if url.path in WEATHER_PATHS and body is None:
+                service = 'weather'
+            elif url.path == CHAT_PATH and body is not None:
+                service = 'llm'
+            else:
+                self._send_json(404, {'error': 'unknown endpoint'})
+                return
+
+            key = request_key(url.path, params, body)
+            if args.record:
+                status, data, elapsed = self._forward(service, url.path, params, body)
+                if status == 200:
+                    recordings.append({'key': key, 'path': url.path, 'status': status, 'body': data,
+                                       'duration_ms': round(elapsed * 1000, 1)})
+                self._respond(url.path, body, status, data)
+                return
+
+            record = recordings.find(key, url.path)
+            delay = latency[service]() if latency[service] else (record or {}).get('duration_ms', 0) / 1000
+            time.sleep(delay)
+
+            if random.random() < error_rate[service]:
+                status = random.choice((429, 503)) if service == 'llm' else 503
+                self._send_json(status, {'error': {'message': 'Injected failure'}}, {'Retry-After': '1'})
+                return
+
+            if record:
+                data = shift_timestamps(url.path, record['body'])
+            elif url.path == '/geo/1.0/direct':
+                data = synthetic_geocode(params)
+            elif url.path == '/data/2.5/weather':
+                data = synthetic_current(params)
+            elif url.path == '/data/2.5/forecast':
+                data = synthetic_forecast(params)
+            else:
+                data = chat_completion(body, synthetic_chat(body))
+            self._respond(url.path, body, 200, data)
+
+        def _forward(self, service: str, path: str, params: Dict, body: Optional[Dict]) -> Tuple[int, object, float]:
+            start = time.perf_counter()
+            url = UPSTREAMS[service] + path
+            if body is None:
+                response = session.get(url, params=params, timeout=30)
+            else:
+                # Record the complete answer even if the client asked for a stream
+                response = session.post(url, json=dict(body, stream=False), timeout=120,
+                                        headers={'Authorization': self.headers.get('Authorization', '')})
+            try:
+                data = response.json()
+            except ValueError:
+                data = {'error': response.text}
+            return response.status_code, data, time.perf_counter() - start
+
+        def _respond(self, path: str, body: Optional[Dict], status: int, data):
+            if path == CHAT_PATH and status == 200 and body.get('stream'):
+                self._send_stream(data)
+            else:
+                self._send_json(status, data)
+
+        def _send_json(self, status: int, data, headers: Optional[Dict] = None):
+            payload = json.dumps(data).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(payload)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def _send_stream(self, completion: Dict):
+            """Replay a completion as OpenAI-style server-sent event chunks"""
+            content = completion['choices'][0]['message']['content']
+            words = content.split(' ')
+            chunks = [' '.join(words[i:i + 3]) + (' ' if i + 3 < len(words) else '') for i in range(0, len(words), 3)]
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/event-stream')
+            self.send_header('Connection', 'close')
+            self.end_headers()
+            self.close_connection = True
+            base = {k: completion[k] for k in ('id', 'created', 'model')}
+            for text in chunks:
+                event = dict(base, object='chat.completion.chunk',
+                             choices=[{'index': 0, 'delta': {'content': text}, 'finish_reason': None}])
+                self.wfile.write(f"data: {json.dumps(event)}\n\n".encode('utf-8'))
+                self.wfile.flush()
+                time.sleep(args.stream_interval)
+            final = dict(base, object='chat.completion.chunk',
+                         choices=[{'index': 0, 'delta': {}, 'finish_reason': 'stop'}],
+                         x_groq={'usage': completion.get('usage', {})})
+            self.wfile.write(f"data: {json.dumps(final)}\n\ndata: [DONE]\n\n".encode('utf-8'))
+
+        def log_message(self, format, *args):
+            pass
+
+    return ReplayHandler
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8099)
+    parser.add_argument('--recordings', default='recordings.jsonl')
+    parser.add_argument('--record', action='store_true', help="Proxy to the real APIs and record responses")
+    parser.add_argument('--weather-latency', default='lognormal:120,0.4')
+    parser.add_argument('--llm-latency', default='lognormal:1500,0.5')
+    parser.add_argument('--weather-error-rate', type=float, default=0.0)
+    parser.add_argument('--llm-error-rate', type=float, default=0.0)
+    parser.add_argument('--stream-interval', type=float, default=0.03, help="Seconds between streamed chunks")
+    parser.add_argument('--seed', type=int, help="Seed latency/error sampling for repeatable runs")
+    args = parser.parse_args()
+
+    if args.seed is not None:
+        random.seed(args.seed)
+    # Fail fast on bad latency specs
+    parse_latency(args.weather_latency)
+    parse_latency(args.llm_latency)
+
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(args))
+    mode = 'Recording' if args.record else 'Replaying'
+    print(f"{mode} OpenWeatherMap and Groq on http://{args.host}:{args.port} ({args.recordings})")
+    server.serve_forever()
+
+
+if __name__ == '__main__':
+    main()
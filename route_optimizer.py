@@ -0,0 +1,346 @@
+"""
+Travel-time-aware ordering of one day's checkpoints.
+
+Travel times come from a vectorized haversine distance matrix over the
+checkpoints' stored coordinates (see checkpoint_geocoding.py), stretched by
+ROUTE_DETOUR_FACTOR and driven at ROUTE_SPEED_KMH. The route is built with a
+nearest-neighbour pass that prefers stops whose opening-hour window is still
+reachable, then improved with 2-opt until no reversal cuts the time spent
+travelling or waiting for opening without overrunning a closing time. Opening hours and visit durations are parsed from the
+checkpoint `notes` ("opening_hours:9:00 AM - 5:00 PM, duration:2 hours, ...").
+
+Completed checkpoints stay where they are; the pending ones are routed from the
+last completed stop. Stops without coordinates are scheduled after the routed
+ones in their current order.
+"""
+import os
+import re
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from gazetteer import EARTH_RADIUS_KM
+
+ROUTE_SPEED_KMH = float(os.environ.get("ROUTE_SPEED_KMH", 25))
+ROUTE_DETOUR_FACTOR = float(os.environ.get("ROUTE_DETOUR_FACTOR", 1.3))  # road distance vs straight line
+ROUTE_VISIT_MINUTES = int(os.environ.get("ROUTE_VISIT_MINUTES", 90))
+ROUTE_UNKNOWN_TRAVEL_MINUTES = 30  # to or from a stop without coordinates
+REPAIR_PASSES = 3  # 2-opt passes that may trade extra travel for meeting opening hours
+DAY_START = "09:00"
+DAY_END_MINUTES = 23 * 60 + 59
+
+_NOTE_KEYS = ('opening_hours', 'tips', 'travel_time', 'transport', 'duration')
+_NOTE_PATTERN = re.compile(r'(?:^|,\s*)(%s):' % '|'.join(_NOTE_KEYS))
+_CLOCK_PATTERN = re.compile(r'(\d{1,2})(?:[:.](\d{2}))?\s*([ap]\.?\s*m\.?)?', re.IGNORECASE)
+_DURATION_PATTERN = re.compile(r'(\d+(?:\.\d+)?)(?:\s*-\s*(\d+(?:\.\d+)?))?\s*(h|hr|hrs|hour|hours|m|min|mins|minute|minutes)\b',
+                               re.IGNORECASE)
+_NAMED_TIMES = {'sunrise': 6 * 60, 'sunset': 18 * 60 + 30, 'noon': 12 * 60, 'midnight': DAY_END_MINUTES}
+
+
+def parse_notes(notes: Optional[str]) -> Dict[str, str]:
+    """Split checkpoint notes into their 'key:value' parts; values may contain commas and colons"""
+    if not notes:
+        return {}
+    matches = list(_NOTE_PATTERN.finditer(notes))
+    parts = {}
+    for position, match in enumerate(matches):
+        end = matches[position + 1].start() if position + 1 < len(matches) else len(notes)
+        parts[match.group(1)] = notes[match.end():end].strip()
+    return parts
+
+
+def _clock_minutes(text: str) -> Optional[int]:
+    text = text.strip().lower()
+    for name, minutes in _NAMED_TIMES.items():
+        # Whole words only: "afternoon" is not "noon"
+        if re.search(rf'\b{name}\b', text):
+            return minutes
+    match = _CLOCK_PATTERN.search(text)
+    if not match:
+        return None
+    hour, minute, meridiem = int(match.group(1)), int(match.group(2) or 0), match.group(3)
+    if meridiem:
+        hour = hour % 12 + (12 if meridiem.lower().startswith('p') else 0)
+    if hour > 24 or minute > 59:
+        return None
+    return min(hour * 60 + minute, DAY_END_MINUTES)
+
+
+def parse_opening_hours(text: Optional[str]) -> Optional[Tuple[int, int]]:
+    """
+    (open, close) in minutes after midnight, or None when the hours are unknown
+    or the place never closes. Understands "9:00 AM - 5:00 PM", "10am to 6pm",
+    "09:30-17:00" and "Sunrise to sunset".
+    """
+    if not text:
+        return None
+    text = text.strip().lower()
+    if '24' in text and 'hour' in text or 'open all' in text or 'always' in text:
+        return None
+    pieces = re.split(r'\s*(?:-|–|—|\bto\b|\btill\b|\buntil\b)\s*', text, maxsplit=1)
+    if len(pieces) != 2:
+        return None
+    opens, closes = _clock_minutes(pieces[0]), _clock_minutes(pieces[1])
+    if opens is None or closes is None:
+        return None
+    # "9 - 5" without am/pm: a closing hour before the opening one is in the afternoon
+    if closes <= opens and not re.search(r'[ap]\.?\s*m', pieces[1]) and closes < 12 * 60:
+        closes += 12 * 60
+    if closes <= opens:
+        return None
+    return opens, closes
+
+
+def parse_duration_minutes(text: Optional[str]) -> Optional[int]:
+    """"2 hours" -> 120, "1.5 hrs" -> 90, "2-3 hours" -> 150, "45 minutes" -> 45"""
+    match = _DURATION_PATTERN.search(text or '')
+    if not match:
+        return None
+    low = float(match.group(1))
+    high = float(match.group(2)) if match.group(2) else low
+    value = (low + high) / 2
+    return int(round(value * 60 if match.group(3).lower().startswith('h') else value))
+
+
+def parse_time(value: Optional[str], default: str = DAY_START) -> int:
+    minutes = _clock_minutes(value or '')
+    return minutes if minutes is not None else _clock_minutes(default)
+
+
+def format_time(minutes: int) -> str:
+    minutes = int(min(max(minutes, 0), DAY_END_MINUTES))
+    return f"{minutes // 60:02d}:{minutes % 60:02d}"
+
+
+def distance_matrix(lats: np.ndarray, lons: np.ndarray) -> np.ndarray:
+    """Great-circle distances in km between every pair of points, in one broadcast"""
+    phi = np.radians(lats)
+    lmb = np.radians(lons)
+    dphi = phi[:, None] - phi[None, :]
+    dlmb = lmb[:, None] - lmb[None, :]
+    a = np.sin(dphi / 2) ** 2 + np.cos(phi)[:, None] * np.cos(phi)[None, :] * np.sin(dlmb / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def travel_minutes(distances_km: np.ndarray) -> np.ndarray:
+    return distances_km * ROUTE_DETOUR_FACTOR / ROUTE_SPEED_KMH * 60
+
+
+class DayRoute:
+    """
+    One day's routing problem. Node 0 is the start (the last completed stop, or
+    a stop-less depot with zero travel when nothing is completed yet); nodes
+    1..n are the pending located stops.
+    """
+
+    def __init__(self, travel: np.ndarray, windows: List[Optional[Tuple[int, int]]], visits: List[int],
+                 start_minutes: int):
+        # Plain lists: the heuristics index single cells, which is much slower on an ndarray
+        self.travel = travel.tolist()
+        self.windows = windows
+        self.visits = visits
+        self.start_minutes = start_minutes
+
+    def _advance(self, state: Tuple[float, int, float, float], previous: int, node: int):
+        """Visit `node` after `previous`: state is (clock, minutes late, minutes travelling, minutes waiting)"""
+        clock, lateness, travel, wait = state
+        leg = self.travel[previous][node]
+        start = clock + leg
+        window = self.windows[node]
+        if window:
+            if start < window[0]:
+                wait += window[0] - start
+                start = window[0]
+            lateness += max(0, start + self.visits[node] - window[1])
+        return start + self.visits[node], lateness, travel + leg, wait
+
+    def schedule(self, order: List[int]) -> Tuple[List[Tuple[int, int]], int, float, float]:
+        """(arrival, start) per stop, then total minutes past closing, travelling and waiting for opening"""
+        state = (self.start_minutes, 0, 0.0, 0.0)
+        previous = 0
+        times = []
+        for node in order:
+            arrival = state[0] + self.travel[previous][node]
+            state = self._advance(state, previous, node)
+            times.append((int(round(arrival)), int(round(state[0] - self.visits[node]))))
+            previous = node
+        return times, state[1], state[2], state[3]
+
+    @staticmethod
+    def _cost(state: Tuple[float, int, float, float]) -> Tuple[int, float, float]:
+        """Overrun first, then idle time (travel plus waiting), then waiting alone"""
+        return state[1], state[2] + state[3], state[3]
+
+    def _start_at(self, clock: float, current: int, node: int) -> float:
+        window = self.windows[node]
+        return max(clock + self.travel[current][node], window[0] if window else 0)
+
+    def nearest_neighbour(self) -> List[int]:
+        """Greedy route: the stop that can be started soonest without overrunning its closing time"""
+        remaining = set(range(1, len(self.visits)))
+        order = []
+        current, clock = 0, self.start_minutes
+        while remaining:
+            candidates = sorted(remaining, key=lambda node: (self._start_at(clock, current, node),
+                                                             self.travel[current][node]))
+            chosen = candidates[0]
+            for node in candidates:
+                window = self.windows[node]
+                if not window or self._start_at(clock, current, node) + self.visits[node] <= window[1]:
+                    chosen = node
+                    break
+            clock = self._start_at(clock, current, chosen) + self.visits[chosen]
+            order.append(chosen)
+            remaining.discard(chosen)
+            current = chosen
+        return order
+
+    def two_opt(self, order: List[int], max_passes: int = 50) -> List[int]:
+        """
+        Reverse segments while that lowers the cost. Travel deltas are O(1) from
+        the matrix; a candidate's schedule is only replayed from the reversed
+        segment onwards, starting from the current route's running state there.
+        """
+        route = [0] + order
+        n = len(route)
+        windowed = {node for node, window in enumerate(self.windows) if window}
+
+        def prefix_states(route):
+            states = [(self.start_minutes, 0, 0.0, 0.0)]
+            for k in range(1, n):
+                states.append(self._advance(states[-1], route[k - 1], route[k]))
+            return states
+
+        states = prefix_states(route)
+        best = self._cost(states[-1])
+        for pass_number in range(max_passes):
+            improved = False
+            # While stops overrun or wait, also try moving windowed stops even if that adds travel
+            repair = (best[0] > 0 or best[2] > 0) and pass_number < REPAIR_PASSES
+            for i in range(1, n - 1):
+                for j in range(i + 1, n):
+                    a, b = route[i - 1], route[i]
+                    c = route[j]
+                    d = route[j + 1] if j + 1 < n else None
+                    delta = self.travel[a][c] - self.travel[a][b]
+                    if d is not None:
+                        delta += self.travel[b][d] - self.travel[c][d]
+                    # The travel matrix is symmetric, so reversing only changes the two edges
+                    if delta >= -1e-9 and not (repair and (b in windowed or c in windowed)):
+                        continue
+                    candidate = route[:i] + route[i:j + 1][::-1] + route[j + 1:]
+                    state = states[i - 1]
+                    for k in range(i, n):
+                        state = self._advance(state, candidate[k - 1], candidate[k])
+                    cost = self._cost(state)
+                    if cost < best:
+                        route, best, improved = candidate, cost, True
+                        states = prefix_states(route)
+            if not improved:
+                break
+        return route[1:]
+
+    def solve(self) -> List[int]:
+        if len(self.visits) <= 2:
+            return list(range(1, len(self.visits)))
+        return self.two_opt(self.nearest_neighbour())
+
+
+def _stop(checkpoint) -> Dict:
+    notes = parse_notes(checkpoint.notes)
+    return {
+        'checkpoint': checkpoint,
+        'window': parse_opening_hours(notes.get('opening_hours')),
+        'visit': parse_duration_minutes(notes.get('duration')) or ROUTE_VISIT_MINUTES,
+        'opening_hours': notes.get('opening_hours'),
+        'located': checkpoint.lat is not None and checkpoint.lon is not None
+    }
+
+
+def optimize_day(checkpoints: List, start_time: Optional[str] = None) -> Dict:
+    """
+    Reorder one day's checkpoints (already sorted by time) to minimize travel
+    while respecting opening hours. Nothing is written; `schedule` holds the new
+    time for each checkpoint in visiting order.
+    """
+    stops = [_stop(checkpoint) for checkpoint in checkpoints]
+    completed = [stop for stop in stops if stop['checkpoint'].is_completed]
+    pending = [stop for stop in stops if not stop['checkpoint'].is_completed]
+    located = [stop for stop in pending if stop['located']]
+    unlocated = [stop for stop in pending if not stop['located']]
+
+    # Route from the last completed stop, starting once its visit is over
+    anchor = completed[-1] if completed else None
+    if anchor:
+        start_minutes = parse_time(anchor['checkpoint'].time) + anchor['visit']
+    else:
+        start_minutes = parse_time(start_time or (checkpoints[0].time if checkpoints else None))
+
+    nodes = ([anchor] if anchor and anchor['located'] else []) + located
+    depot = 0 if anchor and anchor['located'] else None
+    if nodes:
+        lats = np.array([stop['checkpoint'].lat for stop in nodes], dtype=float)
+        lons = np.array([stop['checkpoint'].lon for stop in nodes], dtype=float)
+        distances = distance_matrix(lats, lons)
+    else:
+        distances = np.zeros((0, 0))
+    if depot is None:
+        # Without a located starting point, a stop-less depot reaches every stop at no cost
+        distances = np.pad(distances, ((1, 0), (1, 0)))
+    travel = travel_minutes(distances)
+
+    route = DayRoute(
+        travel,
+        [None] + [stop['window'] for stop in located],
+        [0] + [stop['visit'] for stop in located],
+        start_minutes
+    )
+    before_order = list(range(1, len(located) + 1))
+    order = route.solve()
+    times, lateness, total_travel, total_wait = route.schedule(order)
+    _, before_lateness, before_travel, before_wait = route.schedule(before_order)
+
+    schedule = []
+    previous = 0
+    for node, (arrival, start) in zip(order, times):
+        stop = located[node - 1]
+        schedule.append(_schedule_entry(stop, arrival, start, travel[previous, node], distances[previous, node]))
+        previous = node
+
+    clock = (times[-1][1] + located[order[-1] - 1]['visit']) if order else start_minutes
+    for stop in unlocated:
+        arrival = clock + ROUTE_UNKNOWN_TRAVEL_MINUTES
+        start = max(arrival, stop['window'][0]) if stop['window'] else arrival
+        schedule.append(_schedule_entry(stop, arrival, start, ROUTE_UNKNOWN_TRAVEL_MINUTES, None))
+        clock = start + stop['visit']
+
+    return {
+        'schedule': schedule,
+        'unchanged': [stop['checkpoint'].id for stop in completed],
+        'unlocated': [stop['checkpoint'].id for stop in unlocated],
+        'total_distance_km': round(float(sum(entry['distance_km'] or 0 for entry in schedule)), 2),
+        'total_travel_minutes': int(round(total_travel)),
+        'total_wait_minutes': int(round(total_wait)),
+        'minutes_late': int(lateness),
+        'before': {
+            'total_travel_minutes': int(round(before_travel)),
+            'total_wait_minutes': int(round(before_wait)),
+            'minutes_late': int(before_lateness)
+        }
+    }
+
+
+def _schedule_entry(stop: Dict, arrival: float, start: float, travel: float, distance: Optional[float]) -> Dict:
+    window = stop['window']
+    return {
+        'checkpoint_id': stop['checkpoint'].id,
+        'location': stop['checkpoint'].location,
+        'time': format_time(start),
+        'arrival': format_time(arrival),
+        'wait_minutes': int(round(start - arrival)),
+        'visit_minutes': stop['visit'],
+        'travel_minutes': int(round(travel)),
+        'distance_km': round(float(distance), 2) if distance is not None else None,
+        'opening_hours': stop['opening_hours'],
+        'late': bool(window and start + stop['visit'] > window[1])
+    }
@@ -1,21 +1,36 @@
 from flask import render_template, request, redirect, url_for, flash, jsonify
 from app import app, db
-from models import TravelItinerary, Checkpoint
-from ai_service import generate_travel_itinerary
+from models import TravelItinerary, Checkpoint, WeatherAlert, Notification, checkpoint_rows
+from ai_service import generate_travel_itinerary, generate_basic_itinerary
 from weather_service import WeatherService
-from chatbot_service import TravelChatbot
-from agent_coordinator import TravelAgentCoordinator, AgentContext
+from chatbot_sessions import chatbot_manager, session_key, chatbot_first_token
+from agent_coordinator import AgentContext, agent_coordinator
 from ai_service import get_station_code
 from typing import Optional
 from fpdf import FPDF # <-- ADD THIS IMPORT
-from flask import Response
+from flask import Response, stream_with_context
 from recommendation_service import RecommendationService
+from admission_control import AdmissionLimiter, admission_controlled, limiters
+from metrics import render_duration
+from batch_service import parse_batch_requests, normalize_request, create_batch, run_batch_in_background, batch_manifest
+from weather_alerts import alert_to_dict
+from trip_monitoring import notification_to_dict
+from gazetteer import gazetteer
+from checkpoint_geocoding import (geocode_checkpoints, geocode_checkpoints_in_background, geocoding_in_progress,
+                                  needs_geocoding)
+from route_optimizer import optimize_day
+from chat_suggestions import page_suggestions, precompute_suggestions_in_background
+from trip_context import store_trip_context, trip_context_for
+from sqlalchemy import update
 
 # Initialize services
 weather_service = WeatherService()
-chatbot = TravelChatbot()
-agent_coordinator = TravelAgentCoordinator()
+
+# Admission limits for the LLM-bound endpoints (per worker process)
+generation_limiter = AdmissionLimiter.from_env('generate_itinerary', max_concurrent=4, max_queue=8, queue_timeout=10)
+chatbot_limiter = AdmissionLimiter.from_env('chatbot', max_concurrent=8, max_queue=16, queue_timeout=5)
 import json
+import time
 from datetime import datetime, timedelta
 
 @app.route('/')
@@ -38,76 +53,111 @@ def api_get_station_code():
     else:
         return jsonify({'error': f'Station code not found for {city_name}'}), 404
 
+def parse_itinerary_form(form):
+    """Read and validate the trip form. Returns None when a required field is missing."""
+    destination = form.get('destination', '').strip()
+    start_date_str = form.get('start_date', '')
+    end_date_str = form.get('end_date', '')
+    budget = float(form.get('budget', 0))
+    interests = form.getlist('interests')
+    
+    # Calculate duration from dates
+    start_date = None
+    if start_date_str and end_date_str:
+        start_date = datetime.strptime(start_date_str, '%Y-%m-%d')
+        end_date = datetime.strptime(end_date_str, '%Y-%m-%d')
+        duration = (end_date - start_date).days
+    else:
+        duration = 0
+    
+    # Validate input
+    if not destination or duration <= 0 or budget <= 0:
+        return None
+    
+    return {
+        'destination': destination,
+        'duration': duration,
+        'budget': budget,
+        'interests': interests,
+        'start_date': start_date.date() if start_date else None
+    }
+
+def save_itinerary(destination, duration, budget, interests, itinerary_data, start_date=None, suggestions=True):
+    """
+    Persist a generated itinerary and its checkpoints, returning the saved itinerary.
+    `suggestions=False` leaves the chatbot suggestions to the chatbot page.
+    """
+    itinerary = TravelItinerary(
+        destination=destination,
+        duration=duration,
+        budget=budget,
+        start_date=start_date
+    )
+    itinerary.set_interests_list(interests)
+    itinerary.set_itinerary_data(itinerary_data)
+    store_trip_context(itinerary)
+    
+    db.session.add(itinerary)
+    db.session.flush()  # Get the ID
+    
+    # Create checkpoints
+    for row in checkpoint_rows(itinerary_data):
+        db.session.add(Checkpoint(itinerary_id=itinerary.id, **row))
+    
+    db.session.commit()
+    
+    # Resolve checkpoint coordinates and chatbot suggestions off the request path. Suggestions
+    # need the model, so skip them while generation is queueing; the chatbot page computes them later.
+    geocode_checkpoints_in_background(itinerary.id)
+    if suggestions and not generation_limiter.under_pressure():
+        precompute_suggestions_in_background(itinerary.id)
+    return itinerary
+
+def degraded_generation(limiter, reason):
+    """When generation is over capacity, fall back to the template itinerary instead of queueing"""
+    app.logger.warning(f"Generation shed ({reason}), serving basic itinerary")
+    try:
+        trip = parse_itinerary_form(request.form)
+        if not trip:
+            flash('Please fill in all required fields with valid values.', 'error')
+            return redirect(url_for('index'))
+        
+        itinerary_data = generate_basic_itinerary(trip['destination'], trip['duration'], trip['budget'], trip['interests'])
+        # Shedding load, so no extra model calls for suggestions either
+        itinerary = save_itinerary(trip['destination'], trip['duration'], trip['budget'], trip['interests'], itinerary_data,
+                                   start_date=trip['start_date'], suggestions=False)
+        
+        flash('Our AI planner is busy, so we created a basic itinerary for you. You can generate a detailed one later.', 'warning')
+        return redirect(url_for('view_itinerary', itinerary_id=itinerary.id))
+        
+    except ValueError:
+        flash('Please enter valid numbers for duration and budget.', 'error')
+        return redirect(url_for('index'))
+    except Exception as e:
+        db.session.rollback()
+        app.logger.error(f"Error generating basic itinerary: {str(e)}")
+        flash('An error occurred while generating your itinerary. Please try again.', 'error')
+        return redirect(url_for('index'))
+
 @app.route('/generate_itinerary', methods=['POST'])
+@admission_controlled(generation_limiter, on_shed=degraded_generation)
 def generate_itinerary():
     try:
-        # Get form data
-        destination = request.form.get('destination', '').strip()
-        start_date_str = request.form.get('start_date', '')
-        end_date_str = request.form.get('end_date', '')
-        budget = float(request.form.get('budget', 0))
-        interests = request.form.getlist('interests')
-        
-        # Calculate duration from dates
-        if start_date_str and end_date_str:
-            start_date = datetime.strptime(start_date_str, '%Y-%m-%d')
-            end_date = datetime.strptime(end_date_str, '%Y-%m-%d')
-            duration = (end_date - start_date).days
-        else:
-            duration = 0
-        
-        # Validate input
-        if not destination or duration <= 0 or budget <= 0:
+        trip = parse_itinerary_form(request.form)
+        if not trip:
             flash('Please fill in all required fields with valid values.', 'error')
             return redirect(url_for('index'))
         
         # Generate itinerary using AI
-        app.logger.info(f"Generating itinerary for {destination}, {duration} days, budget ₹{budget}")
-        itinerary_data = generate_travel_itinerary(destination, duration, budget, interests)
+        app.logger.info(f"Generating itinerary for {trip['destination']}, {trip['duration']} days, budget ₹{trip['budget']}")
+        itinerary_data = generate_travel_itinerary(trip['destination'], trip['duration'], trip['budget'], trip['interests'])
         
         if not itinerary_data:
             flash('Failed to generate itinerary. Please try again.', 'error')
             return redirect(url_for('index'))
         
-        # Save to database
-        itinerary = TravelItinerary(
-            destination=destination,
-            duration=duration,
-            budget=budget
-        )
-        itinerary.set_interests_list(interests)
-        itinerary.set_itinerary_data(itinerary_data)
-        
-        db.session.add(itinerary)
-        db.session.flush()  # Get the ID
-        
-        # Create checkpoints
-        for day_data in itinerary_data.get('days', []):
-            day_num = day_data.get('day', 1)
-            for activity in day_data.get('activities', []):
-                # Prepare notes with opening hours and tips
-                notes_parts = []
-                if activity.get('opening_hours'):
-                    notes_parts.append(f"opening_hours:{activity.get('opening_hours')}")
-                if activity.get('tips'):
-                    notes_parts.append(f"tips:{activity.get('tips')}")
-                if activity.get('travel_time_to_next'):
-                    notes_parts.append(f"travel_time:{activity.get('travel_time_to_next')}")
-                if activity.get('transportation_mode'):
-                    notes_parts.append(f"transport:{activity.get('transportation_mode')}")
-                
-                checkpoint = Checkpoint(
-                    itinerary_id=itinerary.id,
-                    day=day_num,
-                    time=activity.get('time', '09:00'),
-                    location=activity.get('location', ''),
-                    activity=activity.get('description', ''),
-                    estimated_cost=activity.get('cost', 0.0),
-                    notes=', '.join(notes_parts) if notes_parts else None
-                )
-                db.session.add(checkpoint)
-        
-        db.session.commit()
+        itinerary = save_itinerary(trip['destination'], trip['duration'], trip['budget'], trip['interests'], itinerary_data,
+                                   start_date=trip['start_date'])
         
         flash('Itinerary generated successfully!', 'success')
         return redirect(url_for('view_itinerary', itinerary_id=itinerary.id))
@@ -200,26 +250,101 @@ def reorder_checkpoints():
 
 @app.route('/api/weather-alerts', methods=['GET'])
 def get_weather_alerts():
-    """API endpoint to get weather alerts for upcoming trips"""
+    """API endpoint to get weather alerts for upcoming trips (precomputed by the weather alerts job)"""
     try:
-        alerts = []
-        tomorrow = datetime.now().date() + timedelta(days=1)
-        
-        # Return empty alerts since we don't have travel dates in current schema
+        query = WeatherAlert.query.filter(WeatherAlert.alert_date >= datetime.now().date())
+        itinerary_id = request.args.get('itinerary_id', type=int)
+        if itinerary_id:
+            query = query.filter(WeatherAlert.itinerary_id == itinerary_id)
         
-        return jsonify(alerts)
+        alerts = query.order_by(WeatherAlert.alert_date, WeatherAlert.id).limit(100).all()
+        return jsonify([alert_to_dict(alert) for alert in alerts])
         
     except Exception as e:
         app.logger.error(f"Error getting weather alerts: {e}")
         return jsonify([])
 
+@app.route('/api/notifications', methods=['GET'])
+def get_notifications():
+    """Trip monitoring notifications, newest first; pollers pass the last id they saw as `since_id`"""
+    try:
+        query = Notification.query
+        itinerary_id = request.args.get('itinerary_id', type=int)
+        if itinerary_id:
+            query = query.filter(Notification.itinerary_id == itinerary_id)
+        since_id = request.args.get('since_id', type=int)
+        if since_id:
+            query = query.filter(Notification.id > since_id)
+        if request.args.get('unread', '').lower() in ('1', 'true', 'yes'):
+            query = query.filter(Notification.read_at.is_(None))
+        
+        notifications = query.order_by(Notification.id.desc()).limit(100).all()
+        return jsonify([notification_to_dict(notification) for notification in notifications])
+        
+    except Exception as e:
+        app.logger.error(f"Error getting notifications: {e}")
+        return jsonify([])
+
+@app.route('/api/notifications/<int:notification_id>/read', methods=['POST'])
+def mark_notification_read(notification_id):
+    """Mark one notification as read"""
+    notification = Notification.query.get_or_404(notification_id)
+    if notification.read_at is None:
+        notification.read_at = datetime.utcnow()
+        db.session.commit()
+    return jsonify({'success': True})
+
+@app.route('/api/admission/stats', methods=['GET'])
+def admission_stats():
+    """In-flight and queue-depth gauges for each admission-controlled endpoint"""
+    return jsonify({name: limiter.stats() for name, limiter in limiters.items()})
+
+@app.route('/api/geocode', methods=['GET'])
+def geocode():
+    """
+    Coordinates for a place name (?q=, optional ?near=<destination> to disambiguate),
+    or the closest known places to a point (?lat=&lon=&k=). Uses the offline
+    gazetteer first and falls back to OpenWeatherMap geocoding.
+    """
+    lat = request.args.get('lat', type=float)
+    lon = request.args.get('lon', type=float)
+    if lat is not None and lon is not None:
+        k = min(max(request.args.get('k', 1, type=int), 1), 20)
+        return jsonify({'results': gazetteer.nearest(lat, lon, k=k)})
+    
+    query = request.args.get('q', '').strip()
+    if not query:
+        return jsonify({'found': False, 'error': 'q (or lat and lon) is required'}), 400
+    
+    near = None
+    if request.args.get('near'):
+        near_coords = weather_service.get_coordinates(request.args['near'])
+        if near_coords:
+            near = (near_coords['lat'], near_coords['lon'])
+    
+    place = gazetteer.lookup(query, near=near)
+    if place:
+        result = dict(place, found=True, source='gazetteer')
+    else:
+        coords = weather_service.get_coordinates(query)
+        if not coords:
+            return jsonify({'found': False}), 404
+        result = dict(coords, found=True, source='openweathermap')
+    
+    response = jsonify(result)
+    response.headers['Cache-Control'] = 'public, max-age=86400'
+    return response
+
 @app.route('/api/weather/<destination>', methods=['GET'])
 def get_destination_weather(destination):
     """Get current weather for a destination"""
     try:
         weather_data = weather_service.get_current_weather(destination)
         if weather_data:
-            return jsonify(weather_data)
+            response = jsonify(weather_data)
+            # Weather is cached server-side for WEATHER_CURRENT_TTL; let browsers reuse it briefly too
+            response.headers['Cache-Control'] = 'public, max-age=300'
+            return response
         else:
             return jsonify({'error': 'Weather data not available'}), 404
     except Exception as e:
@@ -256,7 +381,9 @@ def get_itinerary_checkpoints(itinerary_id):
                 'estimated_cost': checkpoint.estimated_cost,
                 'is_completed': checkpoint.is_completed,
                 'completed_at': checkpoint.completed_at.isoformat() if checkpoint.completed_at else None,
-                'notes': checkpoint.notes
+                'notes': checkpoint.notes,
+                'lat': checkpoint.lat,
+                'lon': checkpoint.lon
             })
         
         return jsonify({
@@ -268,6 +395,88 @@ def get_itinerary_checkpoints(itinerary_id):
         app.logger.error(f"Error getting checkpoints for itinerary {itinerary_id}: {e}")
         return jsonify({'error': 'Failed to load checkpoints'}), 500
 
+@app.route('/api/itinerary/<int:itinerary_id>/map', methods=['GET'])
+def get_itinerary_map(itinerary_id):
+    """All checkpoint markers for the journey map in one response, in visiting order"""
+    itinerary = TravelItinerary.query.get_or_404(itinerary_id)
+    checkpoints = Checkpoint.query.filter_by(itinerary_id=itinerary_id).order_by(Checkpoint.day, Checkpoint.time).all()
+    
+    markers = []
+    missing = 0
+    current_found = False
+    for checkpoint in checkpoints:
+        if checkpoint.is_completed:
+            status = 'completed'
+        elif not current_found:
+            status = 'current'
+            current_found = True
+        else:
+            status = 'pending'
+        
+        if checkpoint.lat is None:
+            missing += 1
+            continue
+        markers.append({
+            'id': checkpoint.id,
+            'day': checkpoint.day,
+            'time': checkpoint.time,
+            'location': checkpoint.location,
+            'activity': checkpoint.activity,
+            'lat': checkpoint.lat,
+            'lon': checkpoint.lon,
+            'status': status
+        })
+    
+    # Itineraries saved before coordinates were stored are geocoded here; recent failures are not retried
+    if any(needs_geocoding(checkpoint) for checkpoint in checkpoints) and not geocoding_in_progress(itinerary_id):
+        geocode_checkpoints_in_background(itinerary_id)
+    
+    center = weather_service.get_coordinates(itinerary.destination)
+    return jsonify({
+        'destination': {
+            'name': itinerary.destination,
+            'lat': center['lat'] if center else None,
+            'lon': center['lon'] if center else None
+        },
+        'markers': markers,
+        'unlocated': missing,
+        'geocoding': geocoding_in_progress(itinerary_id)
+    })
+
+@app.route('/api/itinerary/<int:itinerary_id>/day/<int:day>/optimize', methods=['POST'])
+def optimize_itinerary_day(itinerary_id, day):
+    """Reorder a day's pending checkpoints by travel time and opening hours; `apply` saves the new times"""
+    TravelItinerary.query.get_or_404(itinerary_id)
+    data = request.get_json(silent=True) or {}
+
+    try:
+        def day_checkpoints():
+            return Checkpoint.query.filter_by(itinerary_id=itinerary_id, day=day).order_by(Checkpoint.time).all()
+
+        checkpoints = day_checkpoints()
+        if not checkpoints:
+            return jsonify({'success': False, 'error': 'No checkpoints for this day'}), 404
+
+        # Routing needs coordinates; resolve any the background geocoder has not reached yet
+        if any(needs_geocoding(c) and not c.is_completed for c in checkpoints) and not geocoding_in_progress(itinerary_id):
+            geocode_checkpoints([itinerary_id])
+            checkpoints = day_checkpoints()
+
+        result = optimize_day(checkpoints, start_time=data.get('start_time'))
+
+        if data.get('apply'):
+            db.session.execute(update(Checkpoint), [
+                {'id': entry['checkpoint_id'], 'time': entry['time']} for entry in result['schedule']
+            ])
+            db.session.commit()
+
+        return jsonify({'success': True, 'day': day, 'applied': bool(data.get('apply')), **result})
+
+    except Exception as e:
+        db.session.rollback()
+        app.logger.error(f"Error optimizing day {day} of itinerary {itinerary_id}: {e}")
+        return jsonify({'success': False, 'error': 'Failed to optimize route'}), 500
+
 @app.route('/chatbot')
 @app.route('/chatbot/<int:itinerary_id>')
 def chatbot(itinerary_id=None):
@@ -277,18 +486,13 @@ def chatbot(itinerary_id=None):
     
     if itinerary_id:
         itinerary = TravelItinerary.query.get_or_404(itinerary_id)
-        
-        # Generate contextual suggestions
-        chatbot_service = TravelChatbot()
-        context = chatbot_service.get_contextual_suggestions(
-            itinerary.destination, 
-            itinerary.get_interests_list()
-        )
-        suggestions = context.get('suggestions', [])
+        # Precomputed after the itinerary was saved; never waits on the model
+        suggestions = page_suggestions(itinerary)
     
     return render_template('chatbot.html', itinerary=itinerary, suggestions=suggestions)
 
 @app.route('/api/chatbot', methods=['POST'])
+@admission_controlled(chatbot_limiter)
 def chatbot_api():
     """API endpoint for chatbot interactions"""
     try:
@@ -299,9 +503,6 @@ def chatbot_api():
         if not message:
             return jsonify({'success': False, 'error': 'Message is required'})
         
-        # Initialize chatbot
-        chatbot_service = TravelChatbot()
-        
         # Get itinerary context if provided
         itinerary_context = None
         user_preferences = None
@@ -309,15 +510,16 @@ def chatbot_api():
         if itinerary_id:
             itinerary = TravelItinerary.query.get(itinerary_id)
             if itinerary:
-                itinerary_context = itinerary.get_itinerary_data()
+                itinerary_context = trip_context_for(itinerary)
                 user_preferences = itinerary.get_interests_list()
         
-        # Generate response
-        response = chatbot_service.generate_response(
-            message, 
-            itinerary_context=itinerary_context,
-            user_preferences=user_preferences
-        )
+        # Generate response with this conversation's chatbot and memory
+        with chatbot_manager.conversation(session_key(itinerary_id, data.get('session_id'))) as chatbot_service:
+            response = chatbot_service.generate_response(
+                message, 
+                itinerary_context=itinerary_context,
+                user_preferences=user_preferences
+            )
         
         return jsonify({
             'success': True,
@@ -332,6 +534,65 @@ def chatbot_api():
             'error': 'Sorry, I encountered an error processing your message.'
         })
 
+def sse_event(data, event=None):
+    """One server-sent event frame"""
+    frame = f"event: {event}\n" if event else ""
+    return frame + f"data: {json.dumps(data)}\n\n"
+
+@app.route('/api/chatbot/stream', methods=['POST'])
+@admission_controlled(chatbot_limiter)
+def chatbot_stream_api():
+    """Like /api/chatbot, but the answer is sent as server-sent events while it is generated"""
+    data = request.get_json(silent=True) or {}
+    message = (data.get('message') or '').strip()
+    itinerary_id = data.get('itinerary_id')
+    
+    if not message:
+        return jsonify({'success': False, 'error': 'Message is required'}), 400
+    
+    itinerary_context = None
+    user_preferences = None
+    if itinerary_id:
+        itinerary = TravelItinerary.query.get(itinerary_id)
+        if itinerary:
+            itinerary_context = trip_context_for(itinerary)
+            user_preferences = itinerary.get_interests_list()
+    
+    # Resolved before streaming starts so a new chat id still makes it into the session cookie
+    key = session_key(itinerary_id, data.get('session_id'))
+    
+    def events():
+        start = time.perf_counter()
+        first_token = True
+        # Sent straight away so proxies and the browser see the stream open
+        yield ": connected\n\n"
+        try:
+            with chatbot_manager.conversation(key) as chatbot_service:
+                for token in chatbot_service.stream_response(message, itinerary_context=itinerary_context,
+                                                             user_preferences=user_preferences):
+                    if first_token:
+                        chatbot_first_token.observe(time.perf_counter() - start)
+                        first_token = False
+                    yield sse_event({'token': token})
+            yield sse_event({'success': True, 'timestamp': datetime.now().isoformat()}, event='done')
+        except Exception as e:
+            app.logger.error(f"Error streaming chatbot response: {e}")
+            yield sse_event({'success': False, 'error': 'Sorry, I encountered an error processing your message.'},
+                            event='error')
+    
+    # When the client disconnects the server closes this generator, which closes the upstream LLM stream
+    response = Response(stream_with_context(events()), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+@app.route('/api/chatbot/reset', methods=['POST'])
+def reset_chatbot():
+    """Forget the conversation about one itinerary (or the general one)"""
+    data = request.get_json(silent=True) or {}
+    chatbot_manager.clear(session_key(data.get('itinerary_id'), data.get('session_id')))
+    return jsonify({'success': True})
+
 @app.errorhandler(404)
 def not_found(error):
     return render_template('404.html'), 404
@@ -358,7 +619,8 @@ def download_itinerary_pdf(itinerary_id):
         days_data[checkpoint.day].append(checkpoint)
 
     # 2. Generate the PDF using our NEW FPDF2 function
-    pdf_data = create_itinerary_pdf(itinerary, days_data) # This call now uses the new function
+    with render_duration.time(kind='pdf'):
+        pdf_data = create_itinerary_pdf(itinerary, days_data) # This call now uses the new function
 
     # 3. Create a Flask Response (this logic is unchanged)
     return Response(
@@ -471,4 +733,56 @@ def recommendations():
     # For now, we'll get recommendations based on the general history
     recommended_destinations = recommendation_service.get_recommendations()
     
-    return render_template('recommendations.html', recommendations=recommended_destinations)
\ No newline at end of file
+    return render_template('recommendations.html', recommendations=recommended_destinations)
+
+@app.route('/api/batches', methods=['POST'])
+def create_batch_api():
+    """
+    Queue a batch of itinerary requests. Accepts a JSON list (or {"requests": [...]})
+    as the body, or a CSV/JSON file upload in the 'file' field. Generation starts in
+    the background; poll GET /api/batches/<id> for the manifest.
+    """
+    try:
+        upload = request.files.get('file')
+        if upload:
+            fmt = 'json' if upload.filename.lower().endswith('.json') else 'csv'
+            raw_requests = parse_batch_requests(upload.read().decode('utf-8'), fmt)
+            name = request.form.get('name') or upload.filename
+        else:
+            raw_requests = parse_batch_requests(request.get_data(as_text=True), 'json')
+            name = request.args.get('name')
+        
+        if not raw_requests:
+            return jsonify({'success': False, 'error': 'No trip requests provided'}), 400
+        if not any(normalize_request(raw) for raw in raw_requests):
+            return jsonify({'success': False, 'error': 'No valid trip requests provided'}), 400
+        
+        summary = create_batch(raw_requests, name=name)
+        if summary['total_items']:
+            run_batch_in_background(summary['batch_id'])
+        
+        return jsonify(dict(summary, success=True, manifest_url=url_for('get_batch_manifest', batch_id=summary['batch_id']))), 202
+        
+    except ValueError as e:
+        return jsonify({'success': False, 'error': f'Could not parse batch: {e}'}), 400
+    except Exception as e:
+        db.session.rollback()
+        app.logger.error(f"Error creating batch: {e}")
+        return jsonify({'success': False, 'error': 'Failed to create batch'}), 500
+
+@app.route('/api/batches/<int:batch_id>', methods=['GET'])
+def get_batch_manifest(batch_id):
+    manifest = batch_manifest(batch_id)
+    if not manifest:
+        return jsonify({'error': 'Batch not found'}), 404
+    return jsonify(manifest)
+
+@app.route('/api/batches/<int:batch_id>/resume', methods=['POST'])
+def resume_batch(batch_id):
+    """Re-run the items of a batch that are still pending or failed"""
+    manifest = batch_manifest(batch_id)
+    if not manifest:
+        return jsonify({'error': 'Batch not found'}), 404
+    
+    run_batch_in_background(batch_id)
+    return jsonify({'success': True, 'batch_id': batch_id, 'manifest_url': url_for('get_batch_manifest', batch_id=batch_id)}), 202
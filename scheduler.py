@@ -0,0 +1,84 @@
+"""
+Minimal in-process scheduler for periodic background jobs.
+
+Modules register jobs with `register(name, interval, func)`; when
+SCHEDULER_ENABLED is set, init_app starts one daemon thread that runs each job
+every `interval` seconds inside an app context. With several gunicorn workers
+only the process holding SCHEDULER_LOCK_FILE runs jobs, so work is not
+repeated per worker. Every job can also be run by hand through its CLI command
+(e.g. from cron) with the scheduler disabled.
+"""
+import logging
+import os
+import threading
+import time
+from typing import Callable, Dict, List
+
+try:
+    import fcntl
+except ImportError:  # not available on Windows; every process then runs jobs
+    fcntl = None
+
+SCHEDULER_ENABLED = os.environ.get("SCHEDULER_ENABLED", "").lower() in ('1', 'true', 'yes')
+SCHEDULER_LOCK_FILE = os.environ.get("SCHEDULER_LOCK_FILE", os.path.join("instance", "scheduler.lock"))
+SCHEDULER_TICK = 5  # seconds between due-job checks
+
+jobs: List[Dict] = []
+
+_thread = None
+_lock_handle = None
+
+
+def register(name: str, interval: float, func: Callable):
+    """Run `func()` every `interval` seconds once the scheduler is started"""
+    jobs.append({'name': name, 'interval': interval, 'func': func, 'next_run': 0.0, 'last_error': None,
+                 'last_duration': None})
+
+
+def _acquire_leader_lock() -> bool:
+    global _lock_handle
+    if fcntl is None:
+        return True
+    directory = os.path.dirname(SCHEDULER_LOCK_FILE)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    handle = open(SCHEDULER_LOCK_FILE, 'a')
+    try:
+        fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        handle.close()
+        return False
+    _lock_handle = handle  # held for the life of the process
+    return True
+
+
+def _run(app):
+    while True:
+        now = time.monotonic()
+        for job in jobs:
+            if now < job['next_run']:
+                continue
+            start = time.monotonic()
+            try:
+                with app.app_context():
+                    job['func']()
+                job['last_error'] = None
+            except Exception as e:
+                job['last_error'] = repr(e)
+                logging.error(f"Scheduled job {job['name']} failed: {e}")
+            job['last_duration'] = round(time.monotonic() - start, 3)
+            job['next_run'] = time.monotonic() + job['interval']
+        time.sleep(SCHEDULER_TICK)
+
+
+def init_app(app):
+    """Start the scheduler thread if enabled and this process wins the leader lock"""
+    global _thread
+    if not SCHEDULER_ENABLED or _thread is not None:
+        return
+    if not _acquire_leader_lock():
+        app.logger.info("Scheduler running in another worker")
+        return
+    _thread = threading.Thread(target=_run, args=(app,), name='scheduler', daemon=True)
+    _thread.start()
+    app.logger.info(f"Scheduler started with jobs: {', '.join(job['name'] for job in jobs)}")
@@ -0,0 +1,171 @@
+"""
+Vectorized severe-weather evaluation.
+
+A forecast is converted once into columnar NumPy arrays (ForecastArrays). Every
+rule is then applied to all forecast slots in one array operation and the
+results are grouped by date with np.unique/np.bincount, so all the dates of a
+trip (or of every trip to one destination) are scored in a single pass.
+
+Rules are thresholds on a forecast field. DEFAULT_RULES mirror the original
+checks; DESTINATION_TYPE_RULES adjust them per BudgetOptimizer destination type
+(hill stations are normally cold, beaches normally windy). A JSON file named by
+WEATHER_RULES_FILE can override either, e.g. {"hill": {"extreme_cold": {"threshold": -2}}}.
+"""
+import copy
+import json
+import logging
+import os
+from datetime import date
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+from budget_optimizer import BudgetOptimizer
+
+WEATHER_RULES_FILE = os.environ.get("WEATHER_RULES_FILE")
+
+# Slots flagged per date before the alert is 'high' instead of 'medium'
+HIGH_SEVERITY_SLOTS = 3
+
+DEFAULT_RULES = {
+    'heavy_rain': {'field': 'precipitation', 'op': 'gt', 'threshold': 10.0,  # mm in 3 hours
+                   'label': 'Heavy rainfall ({value:.1f}mm)'},
+    'strong_wind': {'field': 'wind_speed', 'op': 'gt', 'threshold': 5.5,  # m/s, ~20 km/h
+                    'label': 'Strong winds ({value:.1f} m/s)'},
+    'extreme_heat': {'field': 'temperature', 'op': 'gt', 'threshold': 40.0,
+                     'label': 'Extreme temperature ({value:.1f}°C)'},
+    'extreme_cold': {'field': 'temperature', 'op': 'lt', 'threshold': 5.0,
+                     'label': 'Extreme temperature ({value:.1f}°C)'},
+    'severe_type': {'field': 'main', 'op': 'in', 'values': ['Thunderstorm', 'Snow', 'Extreme'],
+                    'label': '{value}'},
+}
+
+DESTINATION_TYPE_RULES = {
+    'hill': {
+        'extreme_cold': {'threshold': 0.0},
+        'extreme_heat': {'threshold': 32.0},
+    },
+    'beach': {
+        'strong_wind': {'threshold': 9.0},  # sea breeze is normal; warn on rough-sea winds
+        'heavy_rain': {'threshold': 7.5},
+    },
+    'metro': {
+        'heavy_rain': {'threshold': 15.0},  # urban drainage copes with moderate showers
+    },
+}
+
+_COMPARATORS = {
+    'gt': np.greater,
+    'ge': np.greater_equal,
+    'lt': np.less,
+    'le': np.less_equal,
+}
+
+_destination_classifier = BudgetOptimizer()
+
+
+def _load_overrides() -> Dict:
+    if not WEATHER_RULES_FILE:
+        return {}
+    try:
+        with open(WEATHER_RULES_FILE) as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        logging.error(f"Could not load weather rules from {WEATHER_RULES_FILE}: {e}")
+        return {}
+
+
+@lru_cache(maxsize=None)
+def rules_for_type(destination_type: str) -> Dict[str, Dict]:
+    """DEFAULT_RULES with the destination type's adjustments (and file overrides) applied"""
+    overrides = _load_overrides()
+    rules = copy.deepcopy(DEFAULT_RULES)
+    for layer in (overrides.get('default', {}), DESTINATION_TYPE_RULES.get(destination_type, {}),
+                  overrides.get(destination_type, {})):
+        for name, settings in layer.items():
+            rules.setdefault(name, {}).update(settings)
+    return rules
+
+
+def rules_for_destination(destination: str) -> Dict[str, Dict]:
+    return rules_for_type(_destination_classifier.get_destination_type(destination))
+
+
+class ForecastArrays:
+    """Columnar view of a parsed forecast: one array per field, one element per 3-hour slot"""
+
+    def __init__(self, forecast: List[Dict]):
+        self.items = forecast
+        self.dates = np.array([item['datetime'].date() for item in forecast], dtype='datetime64[D]')
+        self.temperature = np.array([item['temperature'] for item in forecast], dtype=float)
+        self.precipitation = np.array([item['precipitation'] for item in forecast], dtype=float)
+        self.wind_speed = np.array([item['wind_speed'] for item in forecast], dtype=float)
+        self.main = np.array([item['main'] for item in forecast], dtype=object)
+
+    def __len__(self):
+        return len(self.items)
+
+    def column(self, field: str) -> np.ndarray:
+        return getattr(self, field)
+
+
+def rule_masks(arrays: ForecastArrays, rules: Dict[str, Dict]) -> Dict[str, np.ndarray]:
+    """Boolean mask per rule over every forecast slot"""
+    masks = {}
+    for name, rule in rules.items():
+        column = arrays.column(rule['field'])
+        if rule['op'] == 'in':
+            masks[name] = np.isin(column, rule['values'])
+        else:
+            masks[name] = _COMPARATORS[rule['op']](column, rule['threshold'])
+    return masks
+
+
+def evaluate_dates(city_name: str, arrays: ForecastArrays, rules: Dict[str, Dict],
+                   dates: Optional[Iterable[date]] = None) -> Dict[date, Dict]:
+    """
+    Alerts keyed by date for every forecast date (or only `dates`) with at least
+    one severe slot. Alert dicts have the same shape check_severe_weather returns.
+    """
+    if not len(arrays):
+        return {}
+
+    masks = rule_masks(arrays, rules)
+    severe = np.logical_or.reduce(list(masks.values())) if masks else np.zeros(len(arrays), dtype=bool)
+
+    if dates is not None:
+        wanted = np.array(list(dates), dtype='datetime64[D]')
+        severe &= np.isin(arrays.dates, wanted)
+
+    unique_dates, date_index = np.unique(arrays.dates, return_inverse=True)
+    severe_per_date = np.bincount(date_index[severe], minlength=len(unique_dates))
+
+    alerts = {}
+    for position in np.flatnonzero(severe_per_date):
+        target_date = unique_dates[position].item()
+        slots = np.flatnonzero(severe & (date_index == position))
+        conditions = []
+        for slot in slots:
+            item = arrays.items[slot]
+            reasons = [
+                rule['label'].format(value=item[rule['field']])
+                for name, rule in rules.items() if masks[name][slot]
+            ]
+            conditions.append({
+                'datetime': item['datetime'],
+                'reasons': list(dict.fromkeys(reasons)),
+                'temperature': item['temperature'],
+                'description': item['description'],
+                'precipitation': item['precipitation'],
+                'wind_speed': item['wind_speed']
+            })
+
+        alerts[target_date] = {
+            'city': city_name,
+            'date': target_date,
+            'severity': 'high' if len(slots) >= HIGH_SEVERITY_SLOTS else 'medium',
+            'conditions': conditions,
+            'alert_message': f"Severe weather expected in {city_name} on {target_date.strftime('%B %d, %Y')}"
+        }
+    return alerts
@@ -516,6 +516,26 @@ async function checkWeatherAlerts() {
     }
 }
 
+// Show new trip monitoring notifications; the last id seen is kept across pages
+async function checkTripNotifications() {
+    try {
+        const sinceId = localStorage.getItem('lastNotificationId') || 0;
+        const response = await fetch(`/api/notifications?since_id=${sinceId}&unread=1`);
+        const notifications = await response.json();
+        
+        if (notifications.length) {
+            localStorage.setItem('lastNotificationId', notifications[0].id);
+        }
+        notifications.filter(n => n.severity !== 'info').forEach(n => {
+            if ('Notification' in window && Notification.permission === 'granted') {
+                new Notification(n.title, { body: n.message, icon: '/static/images/weather-icon.png' });
+            }
+        });
+    } catch (error) {
+        console.log('Notifications unavailable');
+    }
+}
+
 // Initialize weather alerts on page load
 if ('serviceWorker' in navigator) {
     navigator.serviceWorker.register('/static/sw.js').then(registration => {
@@ -525,8 +545,9 @@ if ('serviceWorker' in navigator) {
     });
 }
 
-// Check for weather alerts every hour
+// Check for weather alerts every hour, and for trip notifications every 15 minutes
 setInterval(checkWeatherAlerts, 3600000);
+setInterval(checkTripNotifications, 900000);
 
 // Initialize notification permissions check on page load
 document.addEventListener('DOMContentLoaded', function() {
@@ -540,6 +561,7 @@ document.addEventListener('DOMContentLoaded', function() {
             btn.disabled = true;
             // Start checking for weather alerts automatically
             checkWeatherAlerts();
+            checkTripNotifications();
         }
     }
 });
@@ -551,5 +573,6 @@ window. TripCraftAI = {
     handleCheckpointCompletion,
     suggestDestinations,
     requestNotificationPermission,
-    checkWeatherAlerts
+    checkWeatherAlerts,
+    checkTripNotifications
 };
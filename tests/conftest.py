@@ -0,0 +1,13 @@
+import os
+import tempfile
+
+# app.py reads these at import time: a throwaway SQLite database, no scheduler
+# thread, and a placeholder Groq endpoint so the chat models can be built without
+# a key (tests never call them).
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'test.db')}"
+os.environ['SCHEDULER_ENABLED'] = ''
+os.environ.setdefault('GROQ_API_BASE', 'http://127.0.0.1:9')
+
+# Load the app first, as main.py does: modules such as agent_memory import app,
+# which in turn imports them through routes.
+import app  # noqa: E402,F401
@@ -0,0 +1,119 @@
+import itertools
+import threading
+import time
+
+import pytest
+from flask import Flask, Response
+
+from admission_control import AdmissionLimiter, admission_controlled
+
+_names = itertools.count()
+
+
+def limiter(max_concurrent=1, max_queue=0, queue_timeout=1.0):
+    return AdmissionLimiter(f"test_{next(_names)}", max_concurrent, max_queue, queue_timeout)
+
+
+def test_admits_up_to_max_concurrent_then_sheds_when_queue_is_full():
+    gate = limiter(max_concurrent=2, max_queue=0)
+    assert gate.acquire() is None
+    assert gate.acquire() is None
+    assert gate.acquire() == 'queue_full'
+    assert (gate.in_flight, gate.shed_total) == (2, 1)
+    gate.release(0.5)
+    assert gate.acquire() is None
+
+
+def test_waiter_gives_up_at_its_deadline():
+    gate = limiter(max_queue=1, queue_timeout=0.05)
+    assert gate.acquire() is None
+    start = time.monotonic()
+    assert gate.acquire() == 'queue_timeout'
+    assert 0.05 <= time.monotonic() - start < 1
+    assert (gate.queued, gate.timed_out_total, gate.in_flight) == (0, 1, 1)
+
+
+def test_waiter_gets_the_released_slot():
+    gate = limiter(max_queue=1, queue_timeout=5)
+    assert gate.acquire() is None
+    threading.Timer(0.05, gate.release, args=(1.0,)).start()
+    assert gate.acquire() is None
+    assert (gate.in_flight, gate.admitted_total, gate.shed_total) == (1, 2, 0)
+
+
+def test_retry_after_follows_service_time_and_queue():
+    gate = limiter(max_concurrent=2)
+    gate.avg_service_time = 10.0
+    assert gate.retry_after() == 5
+    gate.queued = 3
+    assert gate.retry_after() == 20
+
+
+@pytest.fixture
+def web():
+    """A throwaway app with a plain, a failing and a streaming view behind one limiter"""
+    gate = limiter(max_queue=1, queue_timeout=0.05)
+    flask_app = Flask(__name__)
+
+    @flask_app.route('/plain')
+    @admission_controlled(gate)
+    def plain():
+        return {'in_flight': gate.in_flight}
+
+    @flask_app.route('/fail')
+    @admission_controlled(gate)
+    def fail():
+        raise RuntimeError("boom")
+
+    @flask_app.route('/stream')
+    @admission_controlled(gate)
+    def stream():
+        def chunks():
+            yield f"in_flight={gate.in_flight};"
+            yield "done"
+        return Response(chunks(), mimetype='text/plain')
+
+    return gate, flask_app.test_client()
+
+
+def test_view_runs_inside_a_slot_and_releases_it(web):
+    gate, client = web
+    assert client.get('/plain').get_json() == {'in_flight': 1}
+    assert gate.in_flight == 0
+    assert client.get('/fail').status_code == 500
+    assert gate.in_flight == 0
+
+
+def test_shed_requests_get_429_or_503_with_retry_after(web):
+    gate, client = web
+    gate.avg_service_time = 3.0
+    assert gate.acquire() is None  # a request in progress
+
+    # The queue has room, so this one waits and times out
+    response = client.get('/plain')
+    assert response.status_code == 503
+    assert int(response.headers['Retry-After']) >= 1
+
+    gate.max_queue = 0
+    response = client.get('/plain')
+    assert response.status_code == 429
+    assert response.headers['Retry-After'] == '3'
+    assert response.get_json()['success'] is False
+
+
+def test_streamed_response_holds_its_slot_until_closed(web):
+    gate, client = web
+    response = client.get('/stream', buffered=False)
+    assert gate.in_flight == 1
+    assert response.get_data(as_text=True) == "in_flight=1;done"
+    response.close()
+    assert gate.in_flight == 0
+
+
+def test_abandoned_stream_releases_its_slot(web):
+    gate, client = web
+    response = client.get('/stream', buffered=False)
+    assert gate.in_flight == 1
+    # The client goes away without reading the body
+    response.close()
+    assert gate.in_flight == 0
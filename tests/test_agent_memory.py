@@ -0,0 +1,98 @@
+from agent_memory import MAX_REBASE_HALF_LIVES, TOP_TRACKED, _Store
+
+HALF_LIFE = 100.0
+
+
+def store(state=None, **limits):
+    options = dict(category_size=3, per_user=2, max_users=2, max_factors=50, half_life=HALF_LIFE)
+    options.update(limits)
+    return _Store(state=state, **options)
+
+
+def test_factor_scores_halve_every_half_life():
+    memory = store(state={'epoch': 0.0})
+    memory.add_factors(['beach', 'food'], now=0.0)
+    memory.add_factors(['beach'], now=HALF_LIFE)
+    assert memory.top_factors(2, now=HALF_LIFE) == [('beach', 1.5), ('food', 0.5)]
+    assert memory.top_factors(2, now=3 * HALF_LIFE) == [('beach', 0.38), ('food', 0.12)]
+
+
+def test_rebase_keeps_scores():
+    memory = store(state={'epoch': 0.0})
+    memory.add_factors(['beach'], now=0.0)
+    later = (MAX_REBASE_HALF_LIVES + 1) * HALF_LIFE
+    memory.add_factors(['food'], now=later)
+    assert memory.epoch == later
+    assert memory.top_factors(2, now=later) == [('food', 1.0), ('beach', 0.0)]
+
+
+def test_records_and_users_are_bounded():
+    memory = store()
+    for n in range(5):
+        memory.add_record('weather_adaptations', [n])
+    assert list(memory.categories['weather_adaptations']) == [[2], [3], [4]]
+
+    for user, n in [('a', 1), ('a', 2), ('a', 3), ('b', 1), ('a', 4), ('c', 1)]:
+        memory.add_user_record(user, [n])
+    # 'b' was least recently seen, 'a' keeps only its last two records
+    assert list(memory.users) == ['a', 'c']
+    assert list(memory.users['a']) == [[3], [4]]
+
+
+def test_factors_are_trimmed_to_the_strongest():
+    memory = store(state={'epoch': 0.0}, max_factors=3)
+    memory.add_factors(['keep'], now=0.0, count=10)
+    for n in range(10):
+        memory.add_factors([f'weak{n}'], now=0.0)
+    assert len(memory.factors) <= 6
+    assert memory.top_factors(1, now=0.0) == [('keep', 10.0)]
+
+
+def test_top_factors_tracks_late_risers():
+    memory = store(state={'epoch': 0.0})
+    for n in range(TOP_TRACKED):
+        memory.add_factors([f'early{n}'], now=0.0, count=2)
+    memory.add_factors(['late'], now=0.0)
+    memory.add_factors(['late'], now=0.0, count=5)
+    assert memory.top_factors(1, now=0.0) == [('late', 6.0)]
+
+
+def test_merge_rescales_to_the_receiving_epoch():
+    shared = store(state={'epoch': 0.0})
+    shared.add_factors(['beach'], now=0.0)
+    shared.add_record('budget_optimizations', ['old'])
+    shared.add_user_record('a', ['old'])
+
+    pending = store(state={'epoch': HALF_LIFE})
+    pending.add_factors(['beach', 'food'], now=HALF_LIFE)
+    pending.add_record('budget_optimizations', ['new'])
+    pending.add_user_record('b', ['new'])
+
+    shared.merge(pending)
+    assert shared.top_factors(2, now=HALF_LIFE) == [('beach', 1.5), ('food', 1.0)]
+    assert list(shared.categories['budget_optimizations']) == [['old'], ['new']]
+    assert list(shared.users) == ['a', 'b']
+
+
+def test_merge_respects_limits():
+    shared = store(max_factors=2, max_users=1)
+    shared.add_user_record('a', [1])
+    pending = shared.empty()
+    pending.add_user_record('b', [2])
+    pending.add_factors(['x', 'y', 'z'], now=shared.epoch)
+    shared.merge(pending)
+    assert list(shared.users) == ['b']
+    assert len(shared.factors) == 2
+
+
+def test_state_round_trip():
+    memory = store(state={'epoch': 0.0})
+    memory.add_factors(['beach'], now=HALF_LIFE)
+    memory.add_record('successful_recommendations', [1, 'trip'])
+    memory.add_user_record('a', [1])
+    memory.add_user_record('b', [2])
+
+    restored = store(state=memory.to_state())
+    assert restored.to_state() == memory.to_state()
+    assert list(restored.users) == ['a', 'b']
+    assert restored.top_factors(1, now=HALF_LIFE) == [('beach', 1.0)]
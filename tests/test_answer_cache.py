@@ -0,0 +1,116 @@
+import pytest
+
+import answer_cache as answer_cache_module
+from answer_cache import AnswerCache, is_personal, question_terms
+from app import app
+
+ANSWER = "Try the seafood shacks along Calangute beach."
+
+
+@pytest.fixture
+def cache():
+    return AnswerCache(max_scopes=3, scope_entries=2)
+
+
+def test_question_terms():
+    assert question_terms("What are the best beaches in Goa?") == (['best', 'beaches', 'goa'], False)
+    assert question_terms("Is that far?")[1] is True
+
+
+def test_is_personal():
+    assert is_personal("is my budget enough")
+    assert is_personal("what's on day 2")
+    assert not is_personal("cheap food in Jaipur")
+    assert not is_personal("best day to visit the fort")
+
+
+def test_reworded_question_hits(cache):
+    cache.store("best seafood restaurants in Goa", ANSWER, destination="Goa")
+    assert cache.lookup("which are the best seafood restaurants in goa", destination="goa") == ANSWER
+    assert cache.lookup("cheapest hotels in Goa", destination="Goa") is None
+
+
+def test_scoped_by_destination_and_places(cache):
+    cache.store("best seafood restaurants in Goa", ANSWER, destination="Goa")
+    assert cache.lookup("best seafood restaurants in Goa", destination="Jaipur") is None
+    assert cache.lookup("best seafood restaurants in Kochi", destination="Goa") is None
+
+
+def test_scoped_by_trip_version(cache):
+    cache.store("is my budget enough for the trip", "Yes, with room to spare.", destination="Goa",
+                trip_version="v1")
+    assert cache.lookup("is my budget enough for the trip", destination="Goa", trip_version="v1") is not None
+    # Another itinerary, or the same one after an edit, has another version
+    assert cache.lookup("is my budget enough for the trip", destination="Goa", trip_version="v2") is None
+    assert cache.lookup("is my budget enough for the trip", destination="Goa") is None
+
+
+def test_generic_questions_are_shared_across_trips(cache):
+    cache.store("cheap street food in Jaipur", "Try Masala Chowk.", destination="Jaipur", trip_version="v1")
+    assert cache.lookup("cheap street food in Jaipur", destination="Jaipur", trip_version="v2") == "Try Masala Chowk."
+    assert cache.lookup("cheap street food in Jaipur", destination="Jaipur") == "Try Masala Chowk."
+
+
+@pytest.mark.parametrize('question', [
+    "and tomorrow?",
+    "how do I get there from the airport",
+])
+def test_uncacheable_questions(cache, question):
+    cache.store(question, ANSWER, destination="Goa")
+    assert cache.lookup(question, destination="Goa") is None
+    assert cache.stats()['entries'] == 0
+
+
+def test_follow_up_naming_a_place_is_cached(cache):
+    cache.store("is that far from Baga beach", "About 20 minutes by taxi.", destination="Goa")
+    assert cache.lookup("is that far from Baga beach", destination="Goa") == "About 20 minutes by taxi."
+
+
+def test_entries_expire(cache, monkeypatch):
+    cache.store("best seafood restaurants in Goa", ANSWER, destination="Goa")
+    now = answer_cache_module.time.time()
+    monkeypatch.setattr(answer_cache_module.time, 'time', lambda: now + answer_cache_module.ANSWER_CACHE_TTL + 1)
+    assert cache.lookup("best seafood restaurants in Goa", destination="Goa") is None
+    assert cache.stats()['entries'] == 0
+
+
+def test_scopes_and_entries_are_bounded(cache):
+    for destination in ("Goa", "Jaipur", "Kochi", "Shimla"):
+        cache.store("best local food to try", f"Food in {destination}", destination=destination)
+    assert cache.stats()['scopes'] == 3
+    assert cache.lookup("best local food to try", destination="Goa") is None
+
+    for question in ("best local food to try", "cheapest hostels near the market", "family friendly museums"):
+        cache.store(question, question, destination="Shimla")
+    assert cache.lookup("best local food to try", destination="Shimla") is None
+    assert cache.lookup("family friendly museums", destination="Shimla") == "family friendly museums"
+
+
+def test_weather_answers_expire_sooner(cache, monkeypatch):
+    cache.store("what's the weather like in Goa", "Sunny, 31°C.", destination="Goa")
+    assert cache.lookup("how is the weather in goa", destination="Goa") == "Sunny, 31°C."
+    now = answer_cache_module.time.time()
+    monkeypatch.setattr(answer_cache_module.time, 'time', lambda: now + answer_cache_module.WEATHER_ANSWER_TTL + 1)
+    assert cache.lookup("how is the weather in goa", destination="Goa") is None
+
+
+def test_invalidate_reaches_every_worker():
+    # Two caches stand in for two gunicorn workers sharing the database
+    workers = [AnswerCache(), AnswerCache()]
+    with app.app_context():
+        for worker in workers:
+            worker.generations.ttl = 0
+            worker.store("what's the weather like in Goa", "Sunny, 31°C.", destination="Goa")
+            # A trip elsewhere asking about Goa
+            worker.store("will it rain in Goa this weekend", "Dry all weekend.", destination="Jaipur")
+            worker.store("what's the weather like in Shimla", "Snowing.", destination="Shimla")
+            assert worker.lookup("will it rain in Goa this weekend", destination="Jaipur") == "Dry all weekend."
+
+        workers[0].invalidate("Goa")
+        for worker in workers:
+            assert worker.lookup("what's the weather like in Goa", destination="Goa") is None
+            assert worker.lookup("will it rain in Goa this weekend", destination="Jaipur") is None
+            assert worker.lookup("what's the weather like in Shimla", destination="Shimla") == "Snowing."
+
+        workers[1].store("what's the weather like in Goa", "Rain all day.", destination="Goa")
+        assert workers[1].lookup("what's the weather like in Goa", destination="Goa") == "Rain all day."
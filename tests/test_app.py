@@ -0,0 +1,34 @@
+import sys
+
+from app import add_missing_columns, app, db
+
+app_module = sys.modules['app']
+
+
+def test_add_missing_columns_tolerates_a_worker_that_added_the_column_first(monkeypatch):
+    real_inspect = app_module.inspect
+    calls = []
+
+    class Stale:
+        """What this worker saw before another worker ran ALTER TABLE"""
+
+        def __init__(self, inspector):
+            self.inspector = inspector
+
+        def __getattr__(self, name):
+            return getattr(self.inspector, name)
+
+        def get_columns(self, table_name):
+            return [column for column in self.inspector.get_columns(table_name)
+                    if (table_name, column['name']) != ('batch_job', 'heartbeat_at')]
+
+    def inspect(engine):
+        calls.append(engine)
+        return Stale(real_inspect(engine)) if len(calls) == 1 else real_inspect(engine)
+
+    monkeypatch.setattr(app_module, 'inspect', inspect)
+    with app.app_context():
+        add_missing_columns()
+        assert 'heartbeat_at' in {column['name'] for column in real_inspect(db.engine).get_columns('batch_job')}
+    # The duplicate-column error was checked against a fresh inspection
+    assert len(calls) == 2
@@ -0,0 +1,144 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+import batch_service
+from ai_service import ItineraryGenerationError
+from app import app, db
+from batch_service import claim_batch, create_batch, normalize_request, parse_batch_requests, run_batch
+from models import BatchJob, Checkpoint
+
+
+@pytest.fixture
+def app_context():
+    with app.app_context():
+        yield
+        db.session.remove()
+
+
+@pytest.fixture
+def generated(monkeypatch):
+    """Destinations the fake LLM was asked for; any listed in `failing` raise"""
+    calls = []
+    failing = set()
+
+    def fake_generate(destination, duration, budget, interests):
+        calls.append(destination)
+        if destination in failing:
+            raise ItineraryGenerationError(f"no itinerary for {destination}")
+        return {'days': [{'day': 1, 'activities': [
+            {'time': '09:00', 'location': f"{destination} Fort", 'description': "Morning visit", 'cost': 200},
+            {'time': '13:00', 'location': f"{destination} Market", 'description': "Lunch", 'cost': 300},
+        ]}]}
+
+    monkeypatch.setattr(batch_service, 'generate_llm_itinerary', fake_generate)
+    # Post-processing is covered elsewhere and would reach for the network
+    monkeypatch.setattr(batch_service, 'geocode_checkpoints', lambda ids: calls.append(('geocode', ids)))
+    monkeypatch.setattr(batch_service, 'precompute_suggestions',
+                        lambda ids, before_model_call=None: calls.append(('suggestions', ids, before_model_call)))
+    return calls, failing
+
+
+def generations(calls):
+    return [call for call in calls if isinstance(call, str)]
+
+
+def test_parse_batch_requests():
+    rows = parse_batch_requests("\ufeffdestination,duration,budget,interests\nGoa,3,20000,beaches|food\n", 'csv')
+    assert rows == [{'destination': "Goa", 'duration': '3', 'budget': '20000', 'interests': ['beaches', 'food']}]
+    assert parse_batch_requests('{"requests": [{"destination": "Goa"}]}', 'json') == [{'destination': "Goa"}]
+    with pytest.raises(ValueError):
+        parse_batch_requests('"Goa"', 'json')
+
+
+@pytest.mark.parametrize('raw', [
+    "Goa",
+    {'destination': "", 'duration': 3, 'budget': 1000},
+    {'destination': "Goa", 'duration': 0, 'budget': 1000},
+    {'destination': "Goa", 'duration': "three", 'budget': 1000},
+    {'destination': "Goa", 'duration': 3, 'budget': 1000, 'interests': {'beaches': True}},
+])
+def test_normalize_request_rejects_unusable_rows(raw):
+    assert normalize_request(raw) is None
+
+
+def test_normalize_request_dedupe_key_ignores_case_and_order():
+    first = normalize_request({'destination': "Goa", 'duration': "3", 'budget': 20000, 'interests': "Food;beaches"})
+    second = normalize_request({'destination': "goa ", 'duration': 3, 'budget': "20000.0", 'interests': ['beaches', 'food']})
+    assert first['request_key'] == second['request_key']
+    assert first['interests'] == ['beaches', 'food']
+
+
+def test_create_batch_dedupes_and_reports_invalid_rows(app_context):
+    summary = create_batch([
+        {'destination': "Goa", 'duration': 3, 'budget': 20000},
+        {'destination': "goa", 'duration': 3, 'budget': 20000},
+        {'destination': "Jaipur", 'duration': -1, 'budget': 20000},
+    ], name="dedupe")
+    assert (summary['total_items'], summary['duplicates_removed'], summary['invalid_rows']) == (1, 1, [2])
+
+
+def test_run_batch_marks_failures_and_resumes(app_context, generated):
+    calls, failing = generated
+    batch_id = create_batch([
+        {'destination': "Udaipur", 'duration': 2, 'budget': 15000},
+        {'destination': "Hampi", 'duration': 2, 'budget': 12000},
+    ], name="resume")['batch_id']
+
+    failing.add("Hampi")
+    manifest = run_batch(batch_id, max_workers=2, rate_per_minute=6000)
+    items = {item['destination']: item for item in manifest['items']}
+    assert manifest['status'] == 'partial'
+    assert manifest['counts'] == {'done': 1, 'failed': 1}
+    assert items['Hampi']['status'] == 'failed'
+    assert "no itinerary for Hampi" in items['Hampi']['error']
+    assert items['Hampi']['itinerary_id'] is None
+    assert Checkpoint.query.filter_by(itinerary_id=items['Udaipur']['itinerary_id']).count() == 2
+
+    # A resume only retries what is not done
+    failing.clear()
+    calls.clear()
+    manifest = run_batch(batch_id, max_workers=2, rate_per_minute=6000)
+    items = {item['destination']: item for item in manifest['items']}
+    assert generations(calls) == ["Hampi"]
+    assert manifest['status'] == 'completed'
+    assert items['Hampi']['status'] == 'done'
+    assert items['Hampi']['error'] is None
+    assert items['Hampi']['itinerary_id'] is not None
+
+
+def test_post_processing_runs_once_after_generation(app_context, generated, monkeypatch):
+    calls, _ = generated
+    monkeypatch.setattr(batch_service, 'BATCH_COMMIT_SIZE', 2)
+    destinations = ["Agra", "Ooty", "Munnar", "Puri", "Leh"]
+    batch_id = create_batch([{'destination': d, 'duration': 1, 'budget': 5000} for d in destinations])['batch_id']
+
+    manifest = run_batch(batch_id, max_workers=2, rate_per_minute=6000)
+    first_post = next(i for i, call in enumerate(calls) if not isinstance(call, str))
+    assert sorted(calls[:first_post]) == sorted(destinations)
+    geocoded = [call[1] for call in calls if call[0] == 'geocode']
+    suggested = [call for call in calls if call[0] == 'suggestions']
+    assert sorted(sum(geocoded, [])) == sorted(item['itinerary_id'] for item in manifest['items'])
+    assert all(len(chunk) <= 2 for chunk in geocoded)
+    # Suggestion model calls wait on the batch's rate limiter
+    assert all(call[2].__self__.__class__ is batch_service.RateLimiter for call in suggested)
+
+
+def test_claim_is_exclusive_until_the_run_goes_silent(app_context, generated):
+    calls, _ = generated
+    batch_id = create_batch([{'destination': "Kochi", 'duration': 1, 'budget': 5000}], name="claim")['batch_id']
+
+    # Another process (CLI or web worker) is running it
+    assert claim_batch(batch_id)
+    assert not claim_batch(batch_id)
+    assert run_batch(batch_id, rate_per_minute=6000) == {'batch_id': batch_id, 'status': 'running'}
+    assert generations(calls) == []
+
+    # That run died: its heartbeat stops and the claim can be taken over
+    db.session.get(BatchJob, batch_id).heartbeat_at = \
+        datetime.utcnow() - timedelta(seconds=batch_service.BATCH_CLAIM_TIMEOUT + 1)
+    db.session.commit()
+    assert run_batch(batch_id, rate_per_minute=6000)['status'] == 'completed'
+    assert generations(calls) == ["Kochi"]
+    # Finished runs release the claim
+    assert claim_batch(batch_id)
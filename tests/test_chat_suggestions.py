@@ -0,0 +1,54 @@
+import threading
+
+import pytest
+
+import chat_suggestions
+import routes
+from app import app, db
+from models import TravelItinerary
+
+
+@pytest.fixture
+def blocked(monkeypatch):
+    """precompute_suggestions stand-in that holds its worker until released; records the ids it ran for"""
+    release = threading.Event()
+    ran = []
+
+    def fake_precompute(itinerary_ids, before_model_call=None):
+        release.wait(5)
+        ran.extend(itinerary_ids)
+
+    monkeypatch.setattr(chat_suggestions, 'precompute_suggestions', fake_precompute)
+    yield release, ran
+    release.set()
+
+
+def test_background_precompute_is_bounded(blocked, monkeypatch):
+    release, ran = blocked
+    monkeypatch.setattr(chat_suggestions, 'SUGGESTION_QUEUE', 1)
+    capacity = chat_suggestions.SUGGESTION_WORKERS + 1
+
+    futures = [chat_suggestions.precompute_suggestions_in_background(itinerary_id) for itinerary_id in range(1, capacity + 1)]
+    assert all(futures)
+    # Already queued, then over capacity
+    assert chat_suggestions.precompute_suggestions_in_background(1) is None
+    assert chat_suggestions.precompute_suggestions_in_background(capacity + 1) is None
+
+    release.set()
+    for future in futures:
+        future.result(timeout=5)
+    assert sorted(ran) == list(range(1, capacity + 1))
+    assert chat_suggestions.precompute_suggestions_in_background(capacity + 1) is not None
+
+
+@pytest.mark.parametrize('suggestions, queued, expected', [(True, 0, True), (False, 0, False), (True, 1, False)])
+def test_save_itinerary_skips_suggestions_when_shedding(monkeypatch, suggestions, queued, expected):
+    submitted = []
+    monkeypatch.setattr(routes, 'precompute_suggestions_in_background', submitted.append)
+    monkeypatch.setattr(routes, 'geocode_checkpoints_in_background', lambda itinerary_id: None)
+    monkeypatch.setattr(routes.generation_limiter, 'queued', queued)
+    with app.app_context():
+        itinerary = routes.save_itinerary("Goa", 2, 9000, ['food'], {'days': []}, suggestions=suggestions)
+        assert bool(submitted) is expected
+        db.session.delete(db.session.get(TravelItinerary, itinerary.id))
+        db.session.commit()
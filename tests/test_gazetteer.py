@@ -0,0 +1,71 @@
+import random
+
+import pytest
+
+from gazetteer import Gazetteer, gazetteer, haversine_km, normalize
+
+ROWS = """name,aliases,kind,state,lat,lon
+Jaipur,Pink City,city,Rajasthan,26.9124,75.7873
+Amber Fort,Amer Fort,attraction,Rajasthan,26.9855,75.8513
+Aurangabad,,city,Maharashtra,19.8762,75.3433
+Aurangabad,,city,Bihar,24.7521,84.3742
+Patna,,city,Bihar,25.5941,85.1376
+Mumbai,Bombay,city,Maharashtra,19.0760,72.8777
+"""
+
+
+@pytest.fixture
+def places(tmp_path):
+    path = tmp_path / 'gazetteer.csv'
+    path.write_text(ROWS, encoding='utf-8')
+    return Gazetteer(str(path))
+
+
+def test_normalize():
+    assert normalize("  Lakshman Jhula, INDIA ") == "lakshman jhula"
+    assert normalize("Jammu & Kashmir") == "jammu and kashmir"
+    assert normalize("St. Mary's Church") == "st marys church"
+
+
+def test_lookup_by_name_and_alias(places):
+    assert places.lookup("jaipur")['name'] == "Jaipur"
+    found = places.lookup("Bombay")
+    assert (found['name'], found['match']) == ("Mumbai", 'exact')
+    assert places.lookup("Atlantis") is None
+    assert places.lookup(" , ") is None
+
+
+def test_lookup_comma_parts(places):
+    found = places.lookup("Amer Fort, Jaipur")
+    assert (found['name'], found['match']) == ("Amber Fort", 'exact')
+    # Only the broader part is known
+    found = places.lookup("Hawa Mahal, Jaipur")
+    assert (found['name'], found['match']) == ("Jaipur", 'partial')
+
+
+def test_lookup_breaks_ties_with_later_parts_or_near(places):
+    assert places.lookup("Aurangabad, Patna")['state'] == "Bihar"
+    assert places.lookup("Aurangabad, Mumbai")['state'] == "Maharashtra"
+    assert places.lookup("Aurangabad", near=(25.6, 85.1))['state'] == "Bihar"
+
+
+def test_places_in(places):
+    assert places.places_in("cheap food near amber fort in the pink city") == ["Amber Fort", "Jaipur"]
+
+
+def test_nearest(places):
+    found = places.nearest(26.95, 75.80, k=2)
+    assert [place['name'] for place in found] == ["Jaipur", "Amber Fort"]
+    assert found[0]['distance_km'] < found[1]['distance_km']
+    assert [place['name'] for place in places.nearest(26.95, 75.80, kinds=['city'], k=1)] == ["Jaipur"]
+    assert places.nearest(26.95, 75.80, k=3, max_km=50) == places.nearest(26.95, 75.80, k=2)
+    assert places.nearest(26.95, 75.80, k=0) == []
+
+
+def test_nearest_matches_brute_force_on_shipped_data():
+    rng = random.Random(7)
+    for _ in range(50):
+        lat, lon = rng.uniform(8, 35), rng.uniform(68, 97)
+        expected = sorted(range(len(gazetteer)),
+                          key=lambda i: haversine_km(lat, lon, gazetteer.lat[i], gazetteer.lon[i]))[:5]
+        assert [place['name'] for place in gazetteer.nearest(lat, lon, k=5)] == [gazetteer.names[i] for i in expected]
@@ -0,0 +1,54 @@
+import pytest
+
+from intent_router import INTENT_ROUTER_CONFIDENCE, IntentRouter
+
+
+@pytest.fixture(scope='module')
+def router():
+    return IntentRouter()
+
+
+@pytest.mark.parametrize('message, intent', [
+    ("what's the weather in Goa", 'weather'),
+    ("will it rain tomorrow", 'weather'),
+    ("is my budget enough", 'budget'),
+    ("how expensive is Jaipur", 'budget'),
+    ("how do I get around Mumbai", 'transport'),
+    ("is there a metro in Delhi", 'transport'),
+    ("best street food in Delhi", 'food'),
+])
+def test_classify_single_intent(router, message, intent):
+    label, confidence = router.classify(message)
+    assert label == intent
+    assert confidence >= INTENT_ROUTER_CONFIDENCE
+
+
+@pytest.mark.parametrize('message', [
+    # No keyword at all
+    "tell me about the history of the fort",
+    # Keywords of two intents
+    "what is the weather and how much will it cost",
+    # Too long to answer from a template
+    "can you please plan a detailed weather friendly itinerary with all the must see spots and hidden gems",
+])
+def test_classify_other(router, message):
+    assert router.classify(message) == ('other', 0.0)
+
+
+def test_answer_leaves_food_and_other_to_the_llm(router):
+    assert router.answer("best street food in Delhi") is None
+    assert router.answer("tell me about the history of the fort") is None
+
+
+def test_answer_transport_locally(router):
+    trip = {'destination': "Goa", 'duration': 4, 'budget_breakdown': {'transport': 4000}}
+    answer = router.answer("how do I get around", trip)
+    assert answer.startswith("Getting around Goa:")
+    assert "₹1,000 a day" in answer
+
+
+def test_answer_budget_needs_a_plan(router):
+    assert router.answer("is my budget enough", {'destination': "Goa"}) is None
+    trip = {'destination': "Goa", 'duration': 2, 'interests': ['beaches'],
+            'budget_breakdown': {'accommodation': 6000, 'food': 3000, 'transport': 1000}}
+    assert router.answer("is my budget enough", trip).startswith("Your 2-day Goa plan comes to about ₹10,000")
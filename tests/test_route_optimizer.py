@@ -0,0 +1,98 @@
+import numpy as np
+import pytest
+
+from route_optimizer import (DayRoute, distance_matrix, parse_duration_minutes, parse_notes, parse_opening_hours,
+                             parse_time)
+
+
+@pytest.mark.parametrize('text, expected', [
+    ("9:00 AM - 5:00 PM", (9 * 60, 17 * 60)),
+    ("10am to 6pm", (10 * 60, 18 * 60)),
+    ("09:30-17:00", (9 * 60 + 30, 17 * 60)),
+    ("9 - 5", (9 * 60, 17 * 60)),
+    ("Sunrise to sunset", (6 * 60, 18 * 60 + 30)),
+    ("10 AM till sunset", (10 * 60, 18 * 60 + 30)),
+    ("noon - 4 PM", (12 * 60, 16 * 60)),
+])
+def test_parse_opening_hours(text, expected):
+    assert parse_opening_hours(text) == expected
+
+
+@pytest.mark.parametrize('text', [None, "", "Open 24 hours", "Always open", "Closed on Mondays", "6 PM - 9 AM",
+                                  "9 AM to afternoon"])
+def test_parse_opening_hours_unknown_or_never_closing(text):
+    assert parse_opening_hours(text) is None
+
+
+@pytest.mark.parametrize('text, expected', [
+    ("2 hours", 120),
+    ("1.5 hrs", 90),
+    ("2-3 hours", 150),
+    ("45 minutes", 45),
+    ("about 30 min", 30),
+    ("half a day", None),
+    (None, None),
+])
+def test_parse_duration_minutes(text, expected):
+    assert parse_duration_minutes(text) == expected
+
+
+def test_parse_notes_keeps_commas_and_colons_in_values():
+    notes = "opening_hours:9:00 AM - 5:00 PM, tips:Go early, avoid crowds, duration:2 hours"
+    assert parse_notes(notes) == {
+        'opening_hours': "9:00 AM - 5:00 PM",
+        'tips': "Go early, avoid crowds",
+        'duration': "2 hours",
+    }
+
+
+def test_parse_time_does_not_match_named_times_inside_words():
+    assert parse_time("afternoon") == parse_time(None)
+    assert parse_time("noon") == 12 * 60
+
+
+def test_distance_matrix_is_symmetric_with_zero_diagonal():
+    distances = distance_matrix(np.array([28.61, 27.17, 26.91]), np.array([77.21, 78.04, 75.79]))
+    assert np.allclose(distances, distances.T)
+    assert np.allclose(np.diag(distances), 0)
+    # Delhi - Agra is roughly 180 km in a straight line
+    assert 170 < distances[0, 1] < 190
+
+
+def line_route(positions, windows=None, visit=60, start=9 * 60):
+    """Stops on a line, one minute of travel per unit of distance; node 0 is the start"""
+    points = np.array([0] + positions, dtype=float)
+    travel = np.abs(points[:, None] - points[None, :])
+    windows = windows or [None] * len(points)
+    return DayRoute(travel, windows, [0] + [visit] * len(positions), start)
+
+
+def test_day_route_orders_stops_along_the_line():
+    route = line_route([30, 10, 40, 20])
+    order = route.solve()
+    assert order == [2, 4, 1, 3]
+    _, lateness, travel, wait = route.schedule(order)
+    assert (lateness, travel, wait) == (0, 40, 0)
+
+
+def test_day_route_visits_a_closing_stop_first():
+    # The far stop closes at 10:30, so it has to come before the near ones
+    windows = [None, None, None, (9 * 60, 10 * 60 + 30)]
+    route = line_route([5, 10, 25], windows=windows)
+    order = route.solve()
+    assert order[0] == 3
+    assert route.schedule(order)[1] == 0
+
+
+def test_day_route_schedule_waits_for_opening():
+    windows = [None, (11 * 60, 17 * 60)]
+    route = line_route([15], windows=windows)
+    times, lateness, travel, wait = route.schedule([1])
+    assert times == [(9 * 60 + 15, 11 * 60)]
+    assert (lateness, travel, wait) == (0, 15, 105)
+
+
+def test_day_route_counts_minutes_past_closing():
+    windows = [None, (9 * 60, 9 * 60 + 30)]
+    route = line_route([10], windows=windows, visit=60)
+    assert route.schedule([1])[1] == 40
@@ -0,0 +1,111 @@
+import json
+import random
+from datetime import date, datetime, timedelta
+
+import pytest
+
+import severe_weather
+from severe_weather import (DEFAULT_RULES, ForecastArrays, evaluate_dates, rules_for_destination,
+                            rules_for_type)
+
+START = datetime(2026, 7, 1)
+
+
+def slot(hours, temperature=25.0, precipitation=0.0, wind_speed=2.0, main='Clouds'):
+    return {'datetime': START + timedelta(hours=hours), 'temperature': temperature, 'precipitation': precipitation,
+            'wind_speed': wind_speed, 'main': main, 'description': main.lower()}
+
+
+def per_date_check(city_name, forecast, target_date):
+    """The per-date loop evaluate_dates replaced, with its hard-coded thresholds"""
+    severe_conditions = []
+    for item in forecast:
+        if item['datetime'].date() != target_date:
+            continue
+        reasons = []
+        if item['precipitation'] > 10:
+            reasons.append(f"Heavy rainfall ({item['precipitation']:.1f}mm)")
+        if item['wind_speed'] > 5.5:
+            reasons.append(f"Strong winds ({item['wind_speed']:.1f} m/s)")
+        if item['temperature'] > 40 or item['temperature'] < 5:
+            reasons.append(f"Extreme temperature ({item['temperature']:.1f}°C)")
+        if item['main'] in ['Thunderstorm', 'Snow', 'Extreme']:
+            reasons.append(f"{item['main']}")
+        if reasons:
+            severe_conditions.append({
+                'datetime': item['datetime'], 'reasons': reasons, 'temperature': item['temperature'],
+                'description': item['description'], 'precipitation': item['precipitation'],
+                'wind_speed': item['wind_speed']
+            })
+    if not severe_conditions:
+        return None
+    return {
+        'city': city_name,
+        'date': target_date,
+        'severity': 'high' if len(severe_conditions) > 2 else 'medium',
+        'conditions': severe_conditions,
+        'alert_message': f"Severe weather expected in {city_name} on {target_date.strftime('%B %d, %Y')}"
+    }
+
+
+def random_forecast(rng, days=5):
+    return [slot(hours,
+                 temperature=rng.choice([4.9, 5.0, 12.0, 25.0, 40.0, 40.1]),
+                 precipitation=rng.choice([0.0, 3.2, 10.0, 10.5, 22.0]),
+                 wind_speed=rng.choice([1.0, 5.5, 5.6, 12.0]),
+                 main=rng.choice(['Clear', 'Clouds', 'Rain', 'Thunderstorm', 'Snow', 'Extreme']))
+            for hours in range(0, days * 24, 3)]
+
+
+@pytest.mark.parametrize('seed', range(20))
+def test_matches_the_per_date_loop(seed):
+    forecast = random_forecast(random.Random(seed))
+    alerts = evaluate_dates("Jaipur", ForecastArrays(forecast), DEFAULT_RULES)
+    for offset in range(6):
+        target_date = (START + timedelta(days=offset)).date()
+        assert alerts.get(target_date) == per_date_check("Jaipur", forecast, target_date)
+
+
+def test_thresholds_are_strict():
+    forecast = [slot(0, temperature=5.0, precipitation=10.0, wind_speed=5.5), slot(3, temperature=40.0)]
+    assert evaluate_dates("Jaipur", ForecastArrays(forecast), DEFAULT_RULES) == {}
+
+
+def test_severity_and_date_filter():
+    forecast = [slot(0, main='Thunderstorm'), slot(3, precipitation=12.0), slot(6, wind_speed=8.0),
+                slot(24, temperature=41.0), slot(27)]
+    arrays = ForecastArrays(forecast)
+    alerts = evaluate_dates("Jaipur", arrays, DEFAULT_RULES)
+    assert {d: alert['severity'] for d, alert in alerts.items()} == {date(2026, 7, 1): 'high', date(2026, 7, 2): 'medium'}
+    assert list(evaluate_dates("Jaipur", arrays, DEFAULT_RULES, dates=[date(2026, 7, 2)])) == [date(2026, 7, 2)]
+    assert evaluate_dates("Jaipur", ForecastArrays([]), DEFAULT_RULES) == {}
+
+
+def test_destination_type_overrides():
+    hill, beach = rules_for_type('hill'), rules_for_type('beach')
+    assert rules_for_destination("Shimla") == hill
+    assert rules_for_type('historical') == DEFAULT_RULES
+
+    # 33°C is a heatwave in the hills, 2°C is an ordinary hill night
+    forecast = ForecastArrays([slot(0, temperature=33.0), slot(24, temperature=2.0)])
+    assert list(evaluate_dates("Shimla", forecast, hill)) == [date(2026, 7, 1)]
+    assert list(evaluate_dates("Jaipur", forecast, DEFAULT_RULES)) == [date(2026, 7, 2)]
+
+    # A sea breeze is not a storm on the beach, but lighter rain already is
+    forecast = ForecastArrays([slot(0, wind_speed=7.0), slot(24, precipitation=8.0)])
+    assert list(evaluate_dates("Goa", forecast, beach)) == [date(2026, 7, 2)]
+    assert list(evaluate_dates("Jaipur", forecast, DEFAULT_RULES)) == [date(2026, 7, 1)]
+
+
+def test_rules_file_overrides(tmp_path, monkeypatch):
+    path = tmp_path / 'rules.json'
+    path.write_text(json.dumps({'default': {'strong_wind': {'threshold': 8.0}}, 'hill': {'extreme_cold': {'threshold': -2}}}))
+    monkeypatch.setattr(severe_weather, 'WEATHER_RULES_FILE', str(path))
+    rules_for_type.cache_clear()
+    try:
+        assert rules_for_type('hill')['extreme_cold']['threshold'] == -2
+        assert rules_for_type('hill')['extreme_heat']['threshold'] == 32.0
+        assert rules_for_type('metro')['strong_wind']['threshold'] == 8.0
+        assert rules_for_type('metro')['heavy_rain']['threshold'] == 15.0
+    finally:
+        rules_for_type.cache_clear()
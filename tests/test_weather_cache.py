@@ -0,0 +1,159 @@
+import threading
+import time
+
+import pytest
+
+from weather_service import WeatherCache
+
+GOA = {'lat': 15.2993, 'lon': 74.1240}
+NEAR_GOA = {'lat': 15.2989, 'lon': 74.1236}  # same ~1 km cell
+JAIPUR = {'lat': 26.9124, 'lon': 75.7873}
+TTL = 0.1
+MAX_STALE = 0.5
+
+
+@pytest.fixture
+def cache():
+    return WeatherCache(ttl={'current': TTL}, max_stale={'current': MAX_STALE}, max_size=2, refresh_workers=2)
+
+
+class Upstream:
+    """Fetch stand-in that counts calls and can be held at a gate, fail, or return nothing"""
+
+    def __init__(self):
+        self.calls = 0
+        self.value = {'temp': 30}
+        self.error = None
+        self.gate = threading.Event()
+        self.gate.set()
+        self.started = threading.Event()
+
+    def __call__(self):
+        self.calls += 1
+        self.started.set()
+        self.gate.wait(5)
+        if self.error:
+            raise self.error
+        return self.value
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+def test_fresh_hit_skips_the_fetch(cache):
+    upstream = Upstream()
+    assert cache.get('current', GOA, upstream) == {'temp': 30}
+    assert cache.get('current', NEAR_GOA, upstream) == {'temp': 30}
+    assert cache.lookup('current', GOA, upstream) == {'temp': 30}
+    assert upstream.calls == 1
+    assert cache.lookup('current', JAIPUR, upstream) is None
+
+
+def test_stale_value_is_served_while_one_refresh_runs(cache):
+    upstream = Upstream()
+    cache.get('current', GOA, upstream)
+    time.sleep(TTL + 0.05)
+
+    upstream.gate.clear()
+    upstream.started.clear()
+    upstream.value = {'temp': 35}
+    # Stale reads return at once and share a single background refresh
+    for _ in range(5):
+        assert cache.get('current', GOA, upstream) == {'temp': 30}
+    assert upstream.started.wait(5)
+    assert upstream.calls == 2
+
+    upstream.gate.set()
+    wait_for(lambda: cache.lookup('current', GOA, upstream) == {'temp': 35})
+    assert upstream.calls == 2
+
+
+def test_failed_refresh_keeps_the_stale_value(cache):
+    upstream = Upstream()
+    cache.get('current', GOA, upstream)
+    time.sleep(TTL + 0.05)
+
+    upstream.error = RuntimeError("upstream down")
+    assert cache.lookup('current', GOA, upstream) == {'temp': 30}
+    wait_for(lambda: not cache._inflight)
+    # Still within max_stale, so the old value is served and another refresh is tried
+    assert cache.lookup('current', GOA, upstream) == {'temp': 30}
+    wait_for(lambda: upstream.calls == 3)
+
+
+def test_too_stale_is_a_miss(cache):
+    upstream = Upstream()
+    cache.get('current', GOA, upstream)
+    time.sleep(MAX_STALE + 0.05)
+    assert cache.lookup('current', GOA, upstream) is None
+    assert upstream.calls == 1
+
+
+def test_concurrent_misses_share_one_fetch(cache):
+    upstream = Upstream()
+    upstream.gate.clear()
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get('current', GOA, upstream))) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    assert upstream.started.wait(5)
+    wait_for(lambda: len(cache._inflight) == 1)
+    upstream.gate.set()
+    for thread in threads:
+        thread.join(5)
+    assert results == [{'temp': 30}] * 8
+    assert upstream.calls == 1
+    assert not cache._inflight
+
+
+def test_nothing_is_not_cached(cache):
+    upstream = Upstream()
+    upstream.value = None
+    assert cache.get('current', GOA, upstream) is None
+    assert cache.get('current', GOA, upstream) is None
+    assert upstream.calls == 2
+    cache.put('current', GOA, None)
+    assert cache.lookup('current', GOA, upstream) is None
+
+
+def test_failed_fetch_raises_for_the_leader_and_returns_none_to_waiters(cache):
+    upstream = Upstream()
+    upstream.gate.clear()
+    upstream.error = RuntimeError("upstream down")
+    outcomes = []
+
+    def leader():
+        try:
+            cache.get('current', GOA, upstream)
+        except RuntimeError as e:
+            outcomes.append(str(e))
+
+    first = threading.Thread(target=leader)
+    first.start()
+    assert upstream.started.wait(5)
+    follower = threading.Thread(target=lambda: outcomes.append(cache.get('current', GOA, upstream)))
+    follower.start()
+    time.sleep(0.05)
+    upstream.gate.set()
+    first.join(5)
+    follower.join(5)
+
+    assert sorted(outcomes, key=str) == [None, "upstream down"]
+    assert upstream.calls == 1
+    # The failure is not remembered: the next request tries again
+    upstream.error = None
+    assert cache.get('current', GOA, upstream) == {'temp': 30}
+
+
+def test_least_recently_used_entries_are_evicted(cache):
+    upstream = Upstream()
+    cache.put('current', GOA, {'temp': 30})
+    cache.put('current', JAIPUR, {'temp': 38})
+    cache.lookup('current', GOA, upstream)
+    cache.put('current', {'lat': 19.076, 'lon': 72.8777}, {'temp': 31})
+    assert cache.lookup('current', GOA, upstream) == {'temp': 30}
+    assert cache.lookup('current', JAIPUR, upstream) is None
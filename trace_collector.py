@@ -0,0 +1,95 @@
+"""
+Stand-in OTLP/HTTP collector for local use.
+
+Accepts OTLP/JSON trace exports on /v1/traces and appends each span as a line
+of JSON to an output file, in the same format the jsonl exporter writes, so
+`flask trace-summary` works on it.
+
+    python trace_collector.py --port 4318 --output traces.jsonl
+    TRACE_EXPORT=otlp TRACE_OTLP_ENDPOINT=http://localhost:4318/v1/traces python main.py
+"""
+import argparse
+import json
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Lock
+
+SPAN_KINDS = {1: 'internal', 2: 'server', 3: 'client'}
+
+
+def _attribute_value(value):
+    for key in ('stringValue', 'boolValue', 'doubleValue'):
+        if key in value:
+            return value[key]
+    if 'intValue' in value:
+        return int(value['intValue'])
+    return None
+
+
+def otlp_to_spans(payload):
+    for resource_spans in payload.get('resourceSpans', []):
+        for scope_spans in resource_spans.get('scopeSpans', []):
+            for span in scope_spans.get('spans', []):
+                start_ns = int(span['startTimeUnixNano'])
+                end_ns = int(span['endTimeUnixNano'])
+                status = span.get('status', {})
+                yield {
+                    'trace_id': span['traceId'],
+                    'span_id': span['spanId'],
+                    'parent_span_id': span.get('parentSpanId') or None,
+                    'name': span['name'],
+                    'kind': SPAN_KINDS.get(span.get('kind'), 'internal'),
+                    'start_ns': start_ns,
+                    'end_ns': end_ns,
+                    'duration_ms': round((end_ns - start_ns) / 1e6, 3),
+                    'attributes': {a['key']: _attribute_value(a['value']) for a in span.get('attributes', [])},
+                    'error': status.get('message') if status.get('code') == 2 else None
+                }
+
+
+def make_handler(output_path):
+    lock = Lock()
+
+    class CollectorHandler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            if self.path != '/v1/traces':
+                self.send_error(404)
+                return
+            try:
+                length = int(self.headers.get('Content-Length', 0))
+                payload = json.loads(self.rfile.read(length))
+                spans = list(otlp_to_spans(payload))
+            except (ValueError, KeyError) as e:
+                self.send_error(400, str(e))
+                return
+
+            with lock, open(output_path, 'a') as f:
+                for span in spans:
+                    f.write(json.dumps(span) + '\n')
+
+            body = b'{}'
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    return CollectorHandler
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=4318)
+    parser.add_argument('--output', default='traces.jsonl')
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(args.output))
+    print(f"Collecting traces on http://{args.host}:{args.port}/v1/traces -> {args.output}")
+    server.serve_forever()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,347 @@
+"""
+Lightweight request tracing.
+
+Each request gets a trace id (continued from an incoming W3C `traceparent`
+header when present) and a root span. DB statements, LLM invocations and
+outbound HTTP calls become timed child spans. Finished traces are handed to a
+background exporter so requests never wait on it. Work handed to a thread pool
+keeps its parent span when submitted with submit_in_context / map_in_context;
+child spans that end after their root was exported are exported on their own.
+
+TRACE_EXPORT selects the exporter:
+  jsonl - one span per line appended to TRACE_FILE (default instance/traces.jsonl)
+  otlp  - OTLP/JSON POSTed to TRACE_OTLP_ENDPOINT (e.g. http://localhost:4318/v1/traces;
+          trace_collector.py is a stand-in collector for local use)
+Unset disables tracing entirely, so no spans are created.
+"""
+import json
+import logging
+import os
+import queue
+import secrets
+import threading
+import time
+from concurrent.futures import Executor, Future
+from contextlib import contextmanager
+from contextvars import ContextVar, copy_context
+from typing import Callable, Dict, Iterable, Iterator, List, Optional
+
+import requests
+from flask import g, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+TRACE_EXPORT = os.environ.get("TRACE_EXPORT", "").lower()
+TRACE_FILE = os.environ.get("TRACE_FILE", os.path.join("instance", "traces.jsonl"))
+TRACE_OTLP_ENDPOINT = os.environ.get("TRACE_OTLP_ENDPOINT", "http://localhost:4318/v1/traces")
+TRACE_SERVICE_NAME = os.environ.get("TRACE_SERVICE_NAME", "tripcraft")
+TRACE_MAX_STATEMENT = 1000
+
+SPAN_KINDS = {'internal': 1, 'server': 2, 'client': 3}
+
+_current_span: ContextVar[Optional['Span']] = ContextVar('current_span', default=None)
+
+
+def enabled() -> bool:
+    return TRACE_EXPORT in ('jsonl', 'otlp')
+
+
+class _Trace:
+    def __init__(self, trace_id: str):
+        self.trace_id = trace_id
+        self.spans: List['Span'] = []
+        self.exported = False  # the root has ended and the trace was handed to the exporter
+        self.lock = threading.Lock()
+
+
+class Span:
+    def __init__(self, name: str, kind: str = 'internal', parent: Optional['Span'] = None,
+                 attributes: Optional[Dict] = None, trace_id: Optional[str] = None,
+                 parent_span_id: Optional[str] = None):
+        self.name = name
+        self.kind = kind
+        self.trace = parent.trace if parent else _Trace(trace_id or secrets.token_hex(16))
+        self.span_id = secrets.token_hex(8)
+        self.parent_span_id = parent.span_id if parent else parent_span_id
+        self.is_root = parent is None
+        self.attributes = dict(attributes or {})
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+        self.error = None
+
+    @property
+    def trace_id(self) -> str:
+        return self.trace.trace_id
+
+    def set_attribute(self, key: str, value):
+        self.attributes[key] = value
+
+    def end(self, error: Optional[BaseException] = None):
+        if self.end_ns is not None:
+            return
+        self.end_ns = time.time_ns()
+        if error is not None:
+            self.error = repr(error)
+        with self.trace.lock:
+            if self.trace.exported:
+                spans = [self]  # a late child, e.g. a background refresh that outlived its request
+            else:
+                self.trace.spans.append(self)
+                spans = None
+                if self.is_root:
+                    spans, self.trace.spans = self.trace.spans, []
+                    self.trace.exported = True
+        if spans is not None:
+            _exporter.submit(spans)
+
+    def to_dict(self) -> Dict:
+        return {
+            'trace_id': self.trace_id,
+            'span_id': self.span_id,
+            'parent_span_id': self.parent_span_id,
+            'name': self.name,
+            'kind': self.kind,
+            'start_ns': self.start_ns,
+            'end_ns': self.end_ns,
+            'duration_ms': round((self.end_ns - self.start_ns) / 1e6, 3),
+            'attributes': self.attributes,
+            'error': self.error
+        }
+
+
+def current_span() -> Optional[Span]:
+    return _current_span.get()
+
+
+def start_span(name: str, kind: str = 'internal', **attributes) -> Optional[Span]:
+    """
+    Start a child of the current span without making it current. Use for spans
+    that begin and end in callbacks (DB events, LangChain callbacks).
+    """
+    if not enabled():
+        return None
+    return Span(name, kind, parent=_current_span.get(), attributes=attributes)
+
+
+@contextmanager
+def span(name: str, kind: str = 'internal', **attributes):
+    """Run a block inside a new span that is current for nested spans"""
+    if not enabled():
+        yield None
+        return
+    new_span = Span(name, kind, parent=_current_span.get(), attributes=attributes)
+    token = _current_span.set(new_span)
+    error = None
+    try:
+        yield new_span
+    except BaseException as e:
+        error = e
+        raise
+    finally:
+        _current_span.reset(token)
+        new_span.end(error)
+
+
+def submit_in_context(executor: Executor, fn: Callable, *args, **kwargs) -> Future:
+    """executor.submit, running `fn` in a copy of the caller's context so its spans nest under the current span"""
+    return executor.submit(copy_context().run, fn, *args, **kwargs)
+
+
+def map_in_context(executor: Executor, fn: Callable, items: Iterable) -> Iterator:
+    """executor.map with each call in its own copy of the caller's context (a context can't be entered twice at once)"""
+    return executor.map(lambda call: call[0].run(fn, call[1]), [(copy_context(), item) for item in items])
+
+
+# --- Exporters ---
+
+class _Exporter:
+    """Ships finished traces from a daemon thread; drops traces if the queue is full"""
+
+    def __init__(self):
+        self._queue = queue.Queue(maxsize=1000)
+        self._thread = None
+        self._lock = threading.Lock()
+        self._session = None
+
+    def submit(self, spans: List[Span]):
+        self._ensure_thread()
+        try:
+            self._queue.put_nowait([s.to_dict() for s in spans])
+        except queue.Full:
+            logging.warning("Trace export queue full, dropping trace")
+
+    def _ensure_thread(self):
+        if self._thread is None or not self._thread.is_alive():
+            with self._lock:
+                if self._thread is None or not self._thread.is_alive():
+                    self._thread = threading.Thread(target=self._run, name='trace-exporter', daemon=True)
+                    self._thread.start()
+
+    def _run(self):
+        while True:
+            spans = self._queue.get()
+            try:
+                if TRACE_EXPORT == 'otlp':
+                    self._export_otlp(spans)
+                else:
+                    self._export_jsonl(spans)
+            except Exception as e:
+                logging.error(f"Trace export failed: {e}")
+
+    def _export_jsonl(self, spans: List[Dict]):
+        directory = os.path.dirname(TRACE_FILE)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(TRACE_FILE, 'a') as f:
+            for span_data in spans:
+                f.write(json.dumps(span_data, default=str) + '\n')
+
+    def _export_otlp(self, spans: List[Dict]):
+        if self._session is None:
+            self._session = requests.Session()
+        response = self._session.post(TRACE_OTLP_ENDPOINT, json=to_otlp(spans), timeout=5)
+        response.raise_for_status()
+
+
+def _otlp_value(value) -> Dict:
+    if isinstance(value, bool):
+        return {'boolValue': value}
+    if isinstance(value, int):
+        return {'intValue': str(value)}
+    if isinstance(value, float):
+        return {'doubleValue': value}
+    return {'stringValue': str(value)}
+
+
+def to_otlp(spans: List[Dict]) -> Dict:
+    """Convert span dicts to an OTLP/JSON ExportTraceServiceRequest"""
+    return {
+        'resourceSpans': [{
+            'resource': {'attributes': [{'key': 'service.name', 'value': {'stringValue': TRACE_SERVICE_NAME}}]},
+            'scopeSpans': [{
+                'scope': {'name': 'tripcraft.tracing'},
+                'spans': [{
+                    'traceId': s['trace_id'],
+                    'spanId': s['span_id'],
+                    'parentSpanId': s['parent_span_id'] or '',
+                    'name': s['name'],
+                    'kind': SPAN_KINDS.get(s['kind'], 1),
+                    'startTimeUnixNano': str(s['start_ns']),
+                    'endTimeUnixNano': str(s['end_ns']),
+                    'attributes': [{'key': k, 'value': _otlp_value(v)} for k, v in s['attributes'].items()],
+                    'status': {'code': 2, 'message': s['error']} if s['error'] else {'code': 1}
+                } for s in spans]
+            }]
+        }]
+    }
+
+
+_exporter = _Exporter()
+
+
+# --- Instrumentation ---
+
+def _parse_traceparent(header: Optional[str]):
+    # version-traceid-parentid-flags
+    parts = (header or '').split('-')
+    if len(parts) == 4 and len(parts[1]) == 32 and len(parts[2]) == 16:
+        return parts[1], parts[2]
+    return None, None
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _db_span_start(conn, cursor, statement, parameters, context, executemany):
+    db_span = start_span('db.query', kind='client', **{
+        'db.system': conn.engine.dialect.name,
+        'db.statement': statement[:TRACE_MAX_STATEMENT]
+    })
+    if db_span is not None:
+        conn.info.setdefault('trace_spans', []).append(db_span)
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _db_span_end(conn, cursor, statement, parameters, context, executemany):
+    spans = conn.info.get('trace_spans')
+    if spans:
+        spans.pop().end()
+
+
+@event.listens_for(Engine, 'handle_error')
+def _db_span_error(exception_context):
+    conn = exception_context.connection
+    spans = conn.info.get('trace_spans') if conn is not None else None
+    if spans:
+        spans.pop().end(exception_context.original_exception)
+
+
+def init_app(app):
+    """Open a root span per request and expose the trace id as X-Trace-Id"""
+    if not enabled():
+        return
+
+    @app.before_request
+    def _start_trace():
+        trace_id, parent_span_id = _parse_traceparent(request.headers.get('traceparent'))
+        root = Span(
+            f"{request.method} {request.url_rule.rule if request.url_rule else request.path}",
+            kind='server',
+            trace_id=trace_id,
+            parent_span_id=parent_span_id,
+            attributes={'http.method': request.method, 'http.target': request.path}
+        )
+        g.trace_span = root
+        g.trace_token = _current_span.set(root)
+
+    @app.after_request
+    def _tag_response(response):
+        root = getattr(g, 'trace_span', None)
+        if root is not None:
+            root.set_attribute('http.status_code', response.status_code)
+            response.headers['X-Trace-Id'] = root.trace_id
+        return response
+
+    @app.teardown_request
+    def _end_trace(exc):
+        root = getattr(g, 'trace_span', None)
+        if root is None:
+            return
+        g.trace_span = None
+        try:
+            _current_span.reset(g.trace_token)
+        except ValueError:
+            # Streaming responses finish in a different context
+            _current_span.set(None)
+        root.end(exc)
+
+
+def summarize_traces(path: str) -> List[Dict]:
+    """Latency percentiles per span name from a JSON-lines trace file, slowest p99 first"""
+    durations: Dict[str, List[float]] = {}
+    with open(path) as f:
+        for line in f:
+            try:
+                span_data = json.loads(line)
+            except ValueError:
+                continue
+            name = span_data['name']
+            if name == 'db.query':
+                # Group statements by verb (SELECT, INSERT, ...)
+                name += ' ' + span_data['attributes'].get('db.statement', '').lstrip().split(' ', 1)[0].upper()
+            durations.setdefault(name, []).append(span_data['duration_ms'])
+
+    def pct(values, p):
+        return values[min(len(values) - 1, int(p * len(values)))]
+
+    summary = []
+    for name, values in durations.items():
+        values.sort()
+        summary.append({
+            'name': name,
+            'count': len(values),
+            'p50_ms': pct(values, 0.50),
+            'p95_ms': pct(values, 0.95),
+            'p99_ms': pct(values, 0.99),
+            'total_ms': round(sum(values), 3)
+        })
+    summary.sort(key=lambda s: s['p99_ms'], reverse=True)
+    return summary
@@ -0,0 +1,184 @@
+"""
+Compact, precompiled description of one itinerary for prompts and agents.
+
+A TripContext holds what the chatbot and TravelAgentCoordinator need about a
+trip: destination, dates, budget summary, interests and a few key stops per
+day. It is built when the itinerary is saved and stored as compact JSON in
+TravelItinerary.trip_context, with its version (a hash of the fields it is
+built from) in trip_context_version, so nobody re-parses or re-hashes
+itinerary_data per message; whatever changes those fields calls
+store_trip_context() again. trip_context_for() serves it from an in-process
+LRU keyed by (itinerary id, stored version), then from the stored column.
+Itineraries saved before trip contexts existed are compiled once and written
+back on a connection of their own, never through the caller's session.
+"""
+import hashlib
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+from dataclasses import asdict, dataclass, field
+from datetime import timedelta
+from functools import cached_property
+from typing import Dict, List, Optional
+
+from sqlalchemy import update
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm.attributes import set_committed_value
+
+from metrics import record_cache
+
+TRIP_CONTEXT_CACHE_SIZE = int(os.environ.get("TRIP_CONTEXT_CACHE_SIZE", 1000))
+KEY_STOPS_PER_DAY = 3
+MAX_STOP_CHARS = 40
+
+
+@dataclass
+class TripContext:
+    destination: str
+    duration: int
+    budget: float
+    version: str = ''
+    start_date: Optional[str] = None  # ISO dates, when the trip has a start date
+    end_date: Optional[str] = None
+    budget_breakdown: Dict[str, float] = field(default_factory=dict)
+    interests: List[str] = field(default_factory=list)
+    days: List[List[str]] = field(default_factory=list)  # key stops, one list per day
+
+    def to_json(self) -> str:
+        return json.dumps(asdict(self), separators=(',', ':'), ensure_ascii=False)
+
+    @classmethod
+    def from_json(cls, data: str) -> 'TripContext':
+        return cls(**json.loads(data))
+
+    def as_trip(self) -> Dict:
+        """The itinerary-shaped dict that intent_router and the answer cache read"""
+        return {
+            'destination': self.destination,
+            'duration': self.duration,
+            'budget': self.budget,
+            'budget_breakdown': self.budget_breakdown,
+            'interests': self.interests,
+        }
+
+    @cached_property
+    def prompt(self) -> str:
+        """A few short lines for a system prompt, e.g. 'Trip: Goa, 3 days, 2026-11-02 to 2026-11-04'"""
+        header = f"Trip: {self.destination}, {self.duration} days"
+        if self.start_date:
+            header += f", {self.start_date} to {self.end_date}"
+        budget = f"Budget: ₹{self.budget:,.0f}"
+        if self.budget_breakdown:
+            budget += ' (' + ', '.join(f"{category} ₹{amount:,.0f}" for category, amount in self.budget_breakdown.items()) + ')'
+        lines = [header, budget]
+        if self.interests:
+            lines.append(f"Interests: {', '.join(self.interests)}")
+        lines.extend(f"Day {day}: {'; '.join(stops)}" for day, stops in enumerate(self.days, 1) if stops)
+        return '\n'.join(lines)
+
+
+def itinerary_version(itinerary) -> str:
+    """Changes whenever any field a TripContext is built from changes"""
+    source = '|'.join(str(part) for part in (itinerary.destination, itinerary.duration, itinerary.budget,
+                                             itinerary.start_date, itinerary.interests, itinerary.itinerary_data))
+    return hashlib.sha1(source.encode('utf-8')).hexdigest()[:16]
+
+
+def build_trip_context(itinerary) -> TripContext:
+    """Compile a TravelItinerary (saved or not) into its TripContext"""
+    data = itinerary.get_itinerary_data()
+    days = []
+    for day_data in sorted(data.get('days', []), key=lambda d: d.get('day', 0)):
+        stops = [activity.get('location', '').strip()[:MAX_STOP_CHARS] for activity in day_data.get('activities', [])]
+        days.append(list(dict.fromkeys(stop for stop in stops if stop))[:KEY_STOPS_PER_DAY])
+    breakdown = {category: round(float(amount)) for category, amount in (data.get('budget_breakdown') or {}).items()
+                 if isinstance(amount, (int, float))}
+    start = itinerary.start_date
+    return TripContext(
+        destination=itinerary.destination,
+        duration=itinerary.duration,
+        budget=float(itinerary.budget or sum(breakdown.values())),
+        version=itinerary_version(itinerary),
+        start_date=start.isoformat() if start else None,
+        end_date=(start + timedelta(days=max(itinerary.duration, 1) - 1)).isoformat() if start else None,
+        budget_breakdown=breakdown,
+        interests=itinerary.get_interests_list(),
+        days=days,
+    )
+
+
+def store_trip_context(itinerary) -> TripContext:
+    """Build and attach the TripContext to the itinerary; the caller commits"""
+    context = build_trip_context(itinerary)
+    itinerary.trip_context = context.to_json()
+    itinerary.trip_context_version = context.version
+    return context
+
+
+class TripContextCache:
+    def __init__(self, max_size: int = TRIP_CONTEXT_CACHE_SIZE):
+        self.max_size = max_size
+        self._entries = OrderedDict()  # (itinerary id, version) -> TripContext
+        self._lock = threading.Lock()
+
+    def get(self, itinerary) -> TripContext:
+        version = itinerary.trip_context_version
+        key = (itinerary.id, version)
+        context = None
+        if version:
+            with self._lock:
+                context = self._entries.get(key)
+                if context is not None:
+                    self._entries.move_to_end(key)
+        record_cache('trip_context', context is not None)
+        if context is None:
+            context = self._load(itinerary)
+            with self._lock:
+                self._entries[(itinerary.id, context.version)] = context
+                while len(self._entries) > self.max_size:
+                    self._entries.popitem(last=False)
+        return context
+
+    @staticmethod
+    def _load(itinerary) -> TripContext:
+        if itinerary.trip_context and itinerary.trip_context_version:
+            try:
+                return TripContext.from_json(itinerary.trip_context)
+            except (TypeError, ValueError) as e:
+                logging.error(f"Unreadable trip context for itinerary {itinerary.id}: {e}")
+        # Saved before trip contexts existed: compile once and store for other workers
+        context = build_trip_context(itinerary)
+        if itinerary.id is not None:
+            _write(itinerary, context)
+        return context
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+def _write(itinerary, context: TripContext):
+    """Store a compiled context on its own connection, leaving the caller's session untouched"""
+    from app import db
+    from models import TravelItinerary
+
+    values = {'trip_context': context.to_json(), 'trip_context_version': context.version}
+    table = TravelItinerary.__table__
+    try:
+        with db.engine.begin() as conn:
+            conn.execute(update(table).where(table.c.id == itinerary.id).values(**values))
+    except SQLAlchemyError as e:
+        logging.error(f"Could not store trip context for itinerary {itinerary.id}: {e}")
+        return
+    # Reflect the stored values on the instance without marking it dirty
+    for name, value in values.items():
+        set_committed_value(itinerary, name, value)
+
+
+trip_contexts = TripContextCache()
+
+
+def trip_context_for(itinerary) -> TripContext:
+    return trip_contexts.get(itinerary)
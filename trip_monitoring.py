@@ -0,0 +1,212 @@
+"""
+Scheduled proactive monitoring of trips under way.
+
+run_trip_monitoring() selects the itineraries whose trip is in progress
+today, groups them by destination and fetches each destination's current
+weather once, concurrently. The shared weather cache then serves every trip
+there, so a cycle costs one weather request per distinct destination.
+TravelAgentCoordinator.proactive_monitoring then runs for each trip in
+batches of TRIP_MONITOR_BATCH, at most TRIP_MONITOR_CONCURRENCY at a time,
+with trips interleaved across destinations so one popular destination cannot
+hold up the rest. The whole cycle runs on one event loop.
+
+Actionable findings (urgent, weather and budget) are stored as Notification
+rows, skipping any the trip already got within NOTIFICATION_DEDUPE_HOURS;
+/api/notifications serves them. Activity suggestions are generic and come
+back for every trip, so they are not stored. The job
+runs on the scheduler every TRIP_MONITOR_INTERVAL seconds, or by hand with
+`flask --app main monitor-trips`.
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import os
+from datetime import date, datetime, timedelta
+from itertools import zip_longest
+from typing import Dict, List
+
+from sqlalchemy import delete, func, insert, select
+
+import scheduler
+from agent_coordinator import AGENT_CHECK_TIMEOUT, AgentContext, agent_coordinator
+from app import db
+from gazetteer import normalize
+from metrics import registry
+from models import Checkpoint, Notification, TravelItinerary
+from trip_context import trip_context_for
+from weather_alerts import MAX_TRIP_DAYS, json_default
+
+TRIP_MONITOR_INTERVAL = int(os.environ.get("TRIP_MONITOR_INTERVAL", 1800))
+TRIP_MONITOR_CONCURRENCY = int(os.environ.get("TRIP_MONITOR_CONCURRENCY", 8))
+TRIP_MONITOR_BATCH = int(os.environ.get("TRIP_MONITOR_BATCH", 100))
+NOTIFICATION_DEDUPE_HOURS = int(os.environ.get("NOTIFICATION_DEDUPE_HOURS", 24))
+NOTIFICATION_RETENTION_DAYS = int(os.environ.get("NOTIFICATION_RETENTION_DAYS", 14))
+
+# proactive_monitoring result key -> notification kind, severity and title. Only
+# actionable findings: activity_suggestions is always populated and would notify
+# every trip once per dedupe window.
+FINDINGS = (
+    ('urgent_notifications', 'urgent', 'high', "Urgent"),
+    ('weather_alerts', 'weather', 'high', "Weather alert"),
+    ('budget_insights', 'budget', 'medium', "Budget tip"),
+)
+
+notifications_created = registry.counter('trip_notifications_total', 'Notifications stored by the trip monitor',
+                                         ('kind',))
+
+
+def trips_in_progress(today: date) -> List[TravelItinerary]:
+    candidates = TravelItinerary.query.filter(
+        TravelItinerary.start_date >= today - timedelta(days=MAX_TRIP_DAYS),
+        TravelItinerary.start_date <= today
+    ).all()
+    return [trip for trip in candidates if trip.start_date + timedelta(days=trip.duration) > today]
+
+
+def interleave(groups: Dict[str, List]) -> List:
+    """Round-robin over the groups: the first item of each, then the second of each, ..."""
+    return [item for row in zip_longest(*groups.values()) for item in row if item is not None]
+
+
+def _spent(trip_ids: List[int]) -> Dict[int, float]:
+    rows = db.session.execute(
+        select(Checkpoint.itinerary_id, func.sum(Checkpoint.estimated_cost))
+        .where(Checkpoint.itinerary_id.in_(trip_ids), Checkpoint.is_completed.is_(True))
+        .group_by(Checkpoint.itinerary_id)
+    ).all()
+    return {itinerary_id: total or 0.0 for itinerary_id, total in rows}
+
+
+async def _prefetch_weather(destinations: List[str], semaphore: asyncio.Semaphore) -> int:
+    """Warm the shared weather cache, one request per destination; returns how many succeeded"""
+    async def fetch(destination):
+        async with semaphore:
+            try:
+                return await agent_coordinator.weather_service.aget_current_weather(destination)
+            except Exception as e:
+                logging.error(f"Weather prefetch for {destination} failed: {e}")
+                return None
+
+    results = await asyncio.gather(*(fetch(destination) for destination in destinations))
+    return sum(1 for result in results if result)
+
+
+async def _monitor(contexts: List[AgentContext], semaphore: asyncio.Semaphore, timeout: float) -> List[Dict]:
+    # Tasks take the semaphore in list order, which interleave() made fair across destinations
+    async def monitor(context):
+        async with semaphore:
+            return await agent_coordinator.proactive_monitoring(context, timeout=timeout)
+
+    return await asyncio.gather(*(monitor(context) for context in contexts))
+
+
+def _finding_message(finding) -> str:
+    if not isinstance(finding, dict):
+        return str(finding)
+    parts = [finding.get('message') or finding.get('activity') or finding.get('type', ''), finding.get('suggested_action')]
+    return '. '.join(part.rstrip('.') for part in parts if part) + '.'
+
+
+def notification_rows(trip: TravelItinerary, results: Dict, now: datetime) -> List[Dict]:
+    rows = []
+    for result_key, kind, severity, title in FINDINGS:
+        for finding in results.get(result_key) or []:
+            message = _finding_message(finding)
+            rows.append({
+                'itinerary_id': trip.id,
+                'kind': kind,
+                'severity': severity,
+                'title': f"{title}: {trip.destination}",
+                'message': message,
+                'data': json.dumps(finding, default=json_default),
+                'dedupe_key': hashlib.sha1(f"{trip.id}|{kind}|{message}".encode('utf-8')).hexdigest(),
+                'created_at': now
+            })
+    return rows
+
+
+def _store_notifications(batch: List[TravelItinerary], results: List[Dict], now: datetime) -> int:
+    seen = set(db.session.scalars(
+        select(Notification.dedupe_key).where(
+            Notification.itinerary_id.in_([trip.id for trip in batch]),
+            Notification.created_at >= now - timedelta(hours=NOTIFICATION_DEDUPE_HOURS)
+        )
+    ))
+    rows = []
+    for trip, result in zip(batch, results):
+        for row in notification_rows(trip, result, now):
+            if row['dedupe_key'] not in seen:
+                seen.add(row['dedupe_key'])
+                rows.append(row)
+    if rows:
+        db.session.execute(insert(Notification), rows)
+        for row in rows:
+            notifications_created.inc(kind=row['kind'])
+    db.session.commit()
+    return len(rows)
+
+
+async def _run(trips: List[TravelItinerary], now: datetime, concurrency: int, batch_size: int,
+               timeout: float) -> Dict:
+    groups: Dict[str, List[TravelItinerary]] = {}
+    for trip in trips:
+        groups.setdefault(normalize(trip.destination), []).append(trip)
+    # One loop and one semaphore for the whole cycle, so the concurrency cap holds
+    # across batches and the httpx/agent machinery is set up once
+    semaphore = asyncio.Semaphore(concurrency)
+    weather_fetched = await _prefetch_weather([group[0].destination for group in groups.values()], semaphore)
+
+    spent = _spent([trip.id for trip in trips]) if trips else {}
+    ordered = interleave(groups)
+    created = partial = 0
+    for start in range(0, len(ordered), batch_size):
+        batch = ordered[start:start + batch_size]
+        contexts = [
+            AgentContext(itinerary_id=trip.id, current_location=trip.destination,
+                         budget_remaining=trip.budget - spent.get(trip.id, 0.0), trip=trip_context_for(trip))
+            for trip in batch
+        ]
+        results = await _monitor(contexts, semaphore, timeout)
+        partial += sum(1 for result in results if result.get('partial'))
+        # Nothing else is scheduled on this loop between batches, so the writes can stay synchronous
+        created += _store_notifications(batch, results, now)
+
+    return {
+        'trips': len(trips),
+        'destinations': len(groups),
+        'weather_fetched': weather_fetched,
+        'partial': partial,
+        'notifications': created
+    }
+
+
+def run_trip_monitoring(concurrency: int = TRIP_MONITOR_CONCURRENCY, batch_size: int = TRIP_MONITOR_BATCH,
+                        timeout: float = AGENT_CHECK_TIMEOUT) -> Dict:
+    """Monitor every trip under way and store new findings as notifications. Must run inside an app context."""
+    now = datetime.utcnow()
+    stats = asyncio.run(_run(trips_in_progress(date.today()), now, concurrency, batch_size, timeout))
+
+    db.session.execute(delete(Notification).where(
+        Notification.created_at < now - timedelta(days=NOTIFICATION_RETENTION_DAYS)))
+    db.session.commit()
+
+    logging.info(f"Trip monitoring finished: {stats}")
+    return stats
+
+
+def notification_to_dict(notification: Notification) -> Dict:
+    return {
+        'id': notification.id,
+        'itinerary_id': notification.itinerary_id,
+        'kind': notification.kind,
+        'severity': notification.severity,
+        'title': notification.title,
+        'message': notification.message,
+        'data': notification.get_data(),
+        'created_at': notification.created_at.isoformat(),
+        'read': notification.read_at is not None
+    }
+
+
+scheduler.register('trip-monitoring', TRIP_MONITOR_INTERVAL, run_trip_monitoring)
@@ -0,0 +1,123 @@
+"""
+Precomputed severe-weather alerts for upcoming trips.
+
+refresh_weather_alerts() collects the distinct destinations of trips that start
+(or are under way) within the next WEATHER_ALERT_LOOKAHEAD_DAYS, fetches their
+forecasts concurrently, scores every forecast date per destination in one
+vectorized pass (severe_weather.py) and replaces the stored WeatherAlert rows.
+/api/weather-alerts then only reads the table, and cached chatbot answers
+about places whose alerts changed are invalidated. The job runs on the scheduler
+every WEATHER_ALERT_INTERVAL seconds, or by hand with
+`flask --app main refresh-weather-alerts`.
+"""
+import json
+import logging
+import os
+from datetime import date, datetime, timedelta
+from typing import Dict
+
+from sqlalchemy import delete, insert, or_, select
+
+import scheduler
+import severe_weather
+from answer_cache import answer_cache
+from app import db
+from models import TravelItinerary, WeatherAlert
+from weather_service import weather_service
+
+WEATHER_ALERT_LOOKAHEAD_DAYS = int(os.environ.get("WEATHER_ALERT_LOOKAHEAD_DAYS", 3))
+WEATHER_ALERT_WORKERS = int(os.environ.get("WEATHER_ALERT_WORKERS", 4))
+WEATHER_ALERT_INTERVAL = int(os.environ.get("WEATHER_ALERT_INTERVAL", 3 * 3600))
+MAX_TRIP_DAYS = 60  # how far back a trip can start and still be under way
+
+
+def json_default(value):
+    """json.dumps default for the datetimes and other stray values in stored findings"""
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return str(value)
+
+
+def refresh_weather_alerts(lookahead_days: int = WEATHER_ALERT_LOOKAHEAD_DAYS,
+                           max_workers: int = WEATHER_ALERT_WORKERS) -> Dict:
+    """Recompute alerts for upcoming and ongoing trips. Must run inside an app context."""
+    today = date.today()
+    horizon = today + timedelta(days=lookahead_days)
+
+    candidates = TravelItinerary.query.filter(
+        TravelItinerary.start_date >= today - timedelta(days=MAX_TRIP_DAYS),
+        TravelItinerary.start_date <= horizon
+    ).all()
+    trips = [trip for trip in candidates if trip.start_date + timedelta(days=trip.duration) > today]
+
+    forecasts = weather_service.get_forecasts((trip.destination for trip in trips), max_workers=max_workers)
+
+    # Score every forecast date once per destination; each trip then just picks its dates
+    alerts_by_destination = {}
+    for destination, forecast in forecasts.items():
+        if forecast:
+            alerts_by_destination[destination] = severe_weather.evaluate_dates(
+                destination, severe_weather.ForecastArrays(forecast), severe_weather.rules_for_destination(destination)
+            )
+
+    rows = []
+    now = datetime.utcnow()
+    for trip in trips:
+        destination_alerts = alerts_by_destination.get(trip.destination)
+        if not destination_alerts:
+            continue
+        for offset in range(trip.duration):
+            trip_date = trip.start_date + timedelta(days=offset)
+            alert = destination_alerts.get(trip_date) if trip_date >= today else None
+            if alert:
+                rows.append({
+                    'itinerary_id': trip.id,
+                    'destination': trip.destination,
+                    'alert_date': trip_date,
+                    'severity': alert['severity'],
+                    'message': alert['alert_message'],
+                    'conditions': json.dumps(alert['conditions'], default=json_default),
+                    'created_at': now
+                })
+
+    # Replace this run's trips' alerts and drop anything in the past, in one transaction
+    trip_ids = [trip.id for trip in trips]
+    stale = WeatherAlert.alert_date < today
+    previous = set(db.session.scalars(select(WeatherAlert.destination).where(
+        WeatherAlert.itinerary_id.in_(trip_ids)).distinct())) if trip_ids else set()
+    db.session.execute(delete(WeatherAlert).where(or_(stale, WeatherAlert.itinerary_id.in_(trip_ids)) if trip_ids else stale))
+    if rows:
+        db.session.execute(insert(WeatherAlert), rows)
+    db.session.commit()
+
+    # Cached chatbot answers about places whose alerts appeared or cleared may be out of date
+    for destination in previous | {row['destination'] for row in rows}:
+        answer_cache.invalidate(destination)
+
+    stats = {
+        'trips': len(trips),
+        'destinations': len(forecasts),
+        'forecasts_missing': sum(1 for forecast in forecasts.values() if not forecast),
+        'alerts': len(rows)
+    }
+    logging.info(f"Weather alerts refreshed: {stats}")
+    return stats
+
+
+def alert_to_dict(alert: WeatherAlert) -> Dict:
+    conditions = alert.get_conditions()
+    # The worst slot doubles as the 'weather' summary the notification UI shows
+    worst = max(conditions, key=lambda c: len(c.get('reasons', [])), default={})
+    return {
+        'id': alert.id,
+        'itinerary_id': alert.itinerary_id,
+        'destination': alert.destination,
+        'date': alert.alert_date.isoformat(),
+        'severity': alert.severity,
+        'message': alert.message,
+        'conditions': conditions,
+        'weather': {'description': worst.get('description'), 'temp': worst.get('temperature')}
+    }
+
+
+scheduler.register('weather-alerts', WEATHER_ALERT_INTERVAL, refresh_weather_alerts)
@@ -1,23 +1,398 @@
+import asyncio
+import logging
 import os
+import re
+import threading
+import time
 import requests
+import httpx
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
 from datetime import datetime, timedelta
-from typing import Dict, List, Optional
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from flask import has_app_context
+from sqlalchemy import select, insert, update
+from sqlalchemy.exc import SQLAlchemyError, IntegrityError
+
+import severe_weather
+from gazetteer import gazetteer
+from metrics import track_dependency, record_cache
+from tracing import map_in_context, submit_in_context
 
 # Weather API configuration
-OPENWEATHER_API_KEY = os.environ.get("OPENWEATHER_API_KEY", "6f88d31629b253fb97526c12ca07a172")
-WEATHER_API_BASE_URL = "https://api.openweathermap.org/data/2.5"
+# OPENWEATHER_BASE_URL can point at replay_server.py for offline load tests,
+# which does not need a real key
+OPENWEATHER_BASE_URL = os.environ.get("OPENWEATHER_BASE_URL", "https://api.openweathermap.org").rstrip('/')
+OPENWEATHER_API_KEY = (os.environ.get("OPENWEATHER_API_KEY") or os.environ.get("OPENWEATHERMAP_API_KEY")
+                       or ('replay' if "OPENWEATHER_BASE_URL" in os.environ else None))
+WEATHER_API_BASE_URL = f"{OPENWEATHER_BASE_URL}/data/2.5"
+GEOCODING_URL = f"{OPENWEATHER_BASE_URL}/geo/1.0/direct"
+
+# Geocoding cache configuration
+GEOCODE_CACHE_SIZE = int(os.environ.get("GEOCODE_CACHE_SIZE", 2048))
+GEOCODE_TTL = timedelta(days=int(os.environ.get("GEOCODE_TTL_DAYS", 90)))
+GEOCODE_NEGATIVE_TTL = timedelta(hours=int(os.environ.get("GEOCODE_NEGATIVE_TTL_HOURS", 24)))
+
+# Weather cache configuration (seconds). Entries older than the TTL are still
+# served while a background refresh runs, up to the max-stale age.
+WEATHER_CACHE_TTL = {
+    'current': int(os.environ.get("WEATHER_CURRENT_TTL", 600)),
+    'forecast': int(os.environ.get("WEATHER_FORECAST_TTL", 3600)),
+}
+WEATHER_CACHE_MAX_STALE = {
+    'current': int(os.environ.get("WEATHER_CURRENT_MAX_STALE", 3 * 3600)),
+    'forecast': int(os.environ.get("WEATHER_FORECAST_MAX_STALE", 12 * 3600)),
+}
+WEATHER_CACHE_SIZE = int(os.environ.get("WEATHER_CACHE_SIZE", 1024))
+FORECAST_DAYS = 5  # the free forecast endpoint covers 5 days in 3-hour steps
+
+# Outbound connection pool shared by every sync call
+WEATHER_POOL_SIZE = int(os.environ.get("WEATHER_POOL_SIZE", 10))
+WEATHER_MAX_RETRIES = int(os.environ.get("WEATHER_MAX_RETRIES", 2))
+
+_MISSING = object()
+
+
+def normalize_place_name(name: str) -> str:
+    return re.sub(r'\s+', ' ', name or '').strip().lower()
+
+
+class CoordinateCache:
+    """
+    Two-level cache for geocoding results: an in-process LRU in front of the
+    geocode_cache table. Misses are cached too (as None) with a shorter TTL so
+    unknown names don't trigger repeated lookups.
+    """
+
+    def __init__(self, max_size: int = GEOCODE_CACHE_SIZE):
+        self.max_size = max_size
+        self._entries = OrderedDict()  # key -> (coords or None, expires_at)
+        self._lock = threading.Lock()
+
+    def _remember(self, key: str, coords: Optional[Dict], expires_at: datetime):
+        with self._lock:
+            self._entries[key] = (coords, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def get(self, city_name: str):
+        """Cached coordinates, None for a cached miss, or _MISSING when unknown"""
+        key = normalize_place_name(city_name)
+        now = datetime.utcnow()
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[1] > now:
+                    self._entries.move_to_end(key)
+                    record_cache('geocode_memory', True)
+                    return entry[0]
+                del self._entries[key]
+        record_cache('geocode_memory', False)
+
+        row = self._load(key)
+        if row is None:
+            record_cache('geocode_db', False)
+            return _MISSING
+
+        ttl = GEOCODE_TTL if row.found else GEOCODE_NEGATIVE_TTL
+        expires_at = row.updated_at + ttl
+        if expires_at <= now:
+            record_cache('geocode_db', False)
+            return _MISSING
+
+        record_cache('geocode_db', True)
+        coords = {'lat': row.lat, 'lon': row.lon, 'name': row.name} if row.found else None
+        self._remember(key, coords, expires_at)
+        return coords
+
+    def set(self, city_name: str, coords: Optional[Dict]):
+        key = normalize_place_name(city_name)
+        now = datetime.utcnow()
+        self._remember(key, coords, now + (GEOCODE_TTL if coords else GEOCODE_NEGATIVE_TTL))
+        self._store(key, coords, now)
+
+    def _table(self):
+        if not has_app_context():
+            return None, None
+        from app import db
+        from models import GeocodeCache
+        return db.engine, GeocodeCache.__table__
+
+    def _load(self, key: str):
+        engine, table = self._table()
+        if engine is None:
+            return None
+        try:
+            with engine.connect() as conn:
+                return conn.execute(select(table).where(table.c.query_key == key)).first()
+        except SQLAlchemyError as e:
+            logging.error(f"Geocode cache read failed for '{key}': {e}")
+            return None
+
+    def _store(self, key: str, coords: Optional[Dict], now: datetime):
+        engine, table = self._table()
+        if engine is None:
+            return
+        values = {
+            'found': coords is not None,
+            'lat': coords['lat'] if coords else None,
+            'lon': coords['lon'] if coords else None,
+            'name': coords['name'] if coords else None,
+            'updated_at': now
+        }
+        # Own connection, so caching never commits the caller's ORM session
+        try:
+            with engine.begin() as conn:
+                updated = conn.execute(update(table).where(table.c.query_key == key).values(**values))
+                if updated.rowcount == 0:
+                    conn.execute(insert(table).values(query_key=key, **values))
+        except IntegrityError:
+            pass  # another worker stored it first
+        except SQLAlchemyError as e:
+            logging.error(f"Geocode cache write failed for '{key}': {e}")
+
+
+coordinate_cache = CoordinateCache()
+
+
+class WeatherCache:
+    """
+    TTL cache for weather responses keyed by rounded coordinates, with
+    stale-while-revalidate: a stale entry is returned immediately and refreshed
+    on a background thread. Concurrent fetches of the same key are collapsed
+    into one upstream call.
+    """
+
+    def __init__(self, ttl: Dict[str, int] = WEATHER_CACHE_TTL, max_stale: Dict[str, int] = WEATHER_CACHE_MAX_STALE,
+                 max_size: int = WEATHER_CACHE_SIZE, refresh_workers: int = 4):
+        self.ttl = ttl
+        self.max_stale = max_stale
+        self.max_size = max_size
+        self._entries = OrderedDict()  # key -> (value, fetched_at)
+        self._inflight = {}  # key -> Future of the running fetch
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=refresh_workers, thread_name_prefix='weather-refresh')
+
+    @staticmethod
+    def key(kind: str, coords: Dict) -> Tuple:
+        # ~1km grid: nearby place names share one entry
+        return (kind, round(coords['lat'], 2), round(coords['lon'], 2))
+
+    def put(self, kind: str, coords: Dict, value):
+        if value is None:
+            return
+        self._store(self.key(kind, coords), value)
+
+    def _store(self, key: Tuple, value):
+        with self._lock:
+            self._entries[key] = (value, time.monotonic())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def _run_fetch(self, key: Tuple, fetch: Callable):
+        try:
+            value = fetch()
+            if value is not None:
+                self._store(key, value)
+            return value
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    def lookup(self, kind: str, coords: Dict, refresh: Callable):
+        """
+        Return a fresh or stale-but-usable value without blocking, scheduling a
+        background `refresh` for stale entries. Returns None on a miss.
+        """
+        key = self.key(kind, coords)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                record_cache(f"weather_{kind}", False)
+                return None
+
+            value, fetched_at = entry
+            age = time.monotonic() - fetched_at
+            if age < self.ttl[kind]:
+                self._entries.move_to_end(key)
+                record_cache(f"weather_{kind}", True)
+                return value
+
+            if age < self.max_stale[kind]:
+                if key not in self._inflight:
+                    self._inflight[key] = submit_in_context(self._executor, self._run_fetch, key, refresh)
+                record_cache(f"weather_{kind}", True)
+                return value
+
+            del self._entries[key]
+            record_cache(f"weather_{kind}", False)
+            return None
+
+    def get(self, kind: str, coords: Dict, fetch: Callable):
+        """Cached value if usable, otherwise fetch it (sharing any fetch already in flight)"""
+        value = self.lookup(kind, coords, fetch)
+        if value is not None:
+            return value
+
+        key = self.key(kind, coords)
+        with self._lock:
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                future = self._inflight[key] = Future()
+
+        if not leader:
+            try:
+                return future.result(timeout=30)
+            except Exception:
+                return None
+
+        try:
+            value = fetch()
+            if value is not None:
+                self._store(key, value)
+            future.set_result(value)
+            return value
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                if self._inflight.get(key) is future:
+                    del self._inflight[key]
+
+
+weather_cache = WeatherCache()
+
+
+def build_http_session(pool_size: int = WEATHER_POOL_SIZE, retries: int = WEATHER_MAX_RETRIES) -> requests.Session:
+    """Keep-alive session that retries idempotent GETs on connection errors, 429 and 5xx with backoff"""
+    retry = Retry(
+        total=retries,
+        backoff_factor=0.3,
+        status_forcelist=(429, 500, 502, 503, 504),
+        allowed_methods=frozenset(['GET']),
+        respect_retry_after_header=True,
+        raise_on_status=False
+    )
+    adapter = HTTPAdapter(pool_connections=2, pool_maxsize=pool_size, max_retries=retry)
+    session = requests.Session()
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+http_session = build_http_session()
+
+# Runs the forecast request alongside the current-weather request in get_weather_bundle
+_bundle_executor = ThreadPoolExecutor(max_workers=WEATHER_POOL_SIZE, thread_name_prefix='weather-bundle')
+
 
 class WeatherService:
     def __init__(self):
         self.api_key = OPENWEATHER_API_KEY
+        self.coordinate_cache = coordinate_cache
+        self.weather_cache = weather_cache
+        self.session = http_session
         
     def get_coordinates(self, city_name: str) -> Optional[Dict]:
         """Get latitude and longitude for a city"""
+        place = self._gazetteer_coordinates(city_name)
+        if place:
+            return place
+        
         if not self.api_key:
             return None
-            
-        geocoding_url = f"http://api.openweathermap.org/geo/1.0/direct"
         
+        cached = self.coordinate_cache.get(city_name)
+        if cached is not _MISSING:
+            return cached
+        
+        coords = self._fetch_coordinates(city_name)
+        self.coordinate_cache.set(city_name, coords)
+        return coords
+    
+    def _gazetteer_coordinates(self, city_name: str, exact_only: bool = False) -> Optional[Dict]:
+        """
+        Offline lookup in the bundled gazetteer; no cache or HTTP involved. With
+        `exact_only`, a partial match (just the city of "X Cafe, Jaipur") counts as a miss.
+        """
+        place = gazetteer.lookup(city_name)
+        if place and (place.get('match') == 'exact' or not exact_only):
+            record_cache('gazetteer', True)
+            return {'lat': place['lat'], 'lon': place['lon'], 'name': place['name']}
+        record_cache('gazetteer', False)
+        return None
+    
+    def _fetch_coordinates(self, city_name: str) -> Optional[Dict]:
+        """Geocode a city over HTTP, bypassing the cache"""
+        for query in self._geocoding_queries(city_name):
+            try:
+                with track_dependency('openweathermap', 'geocode'):
+                    response = self.session.get(GEOCODING_URL, params=self._geocoding_params(query), timeout=10)
+                response.raise_for_status()
+                coords = self._parse_geocoding(response.json())
+                if coords:
+                    return coords
+            except Exception as e:
+                logging.warning(f"Error with query '{query}': {e}")
+                continue
+        
+        logging.warning(f"No coordinates found for {city_name}")
+        return None
+    
+    def warm_coordinates(self, city_names: Iterable[str], max_workers: int = 4) -> Dict[str, int]:
+        """Geocode every name not already cached; returns counts of cached/found/missing"""
+        stats = {'cached': 0, 'found': 0, 'missing': 0}
+        to_fetch = []
+        for name in dict.fromkeys(n for n in city_names if n and n.strip()):
+            if self.coordinate_cache.get(name) is _MISSING:
+                to_fetch.append(name)
+            else:
+                stats['cached'] += 1
+        
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            # HTTP runs on the pool; cache writes stay on this thread (it has the app context)
+            for name, coords in zip(to_fetch, map_in_context(executor, self._fetch_coordinates, to_fetch)):
+                self.coordinate_cache.set(name, coords)
+                stats['found' if coords else 'missing'] += 1
+        
+        return stats
+    
+    def locate_many(self, names: Iterable[str], max_workers: int = 4) -> Dict[str, Optional[Dict]]:
+        """
+        Coordinates for many place names (venues, not cities): exact gazetteer
+        matches and cache first, the rest geocoded concurrently over HTTP.
+        Unresolvable names map to None.
+        """
+        results = {}
+        to_fetch = []
+        for name in dict.fromkeys(n for n in names if n and n.strip()):
+            place = self._gazetteer_coordinates(name, exact_only=True)
+            cached = self.coordinate_cache.get(name) if not place and self.api_key else None
+            if place:
+                results[name] = place
+            elif cached is _MISSING:
+                to_fetch.append(name)
+            else:
+                results[name] = cached
+        
+        if to_fetch:
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                for name, coords in zip(to_fetch, map_in_context(executor, self._fetch_coordinates, to_fetch)):
+                    self.coordinate_cache.set(name, coords)
+                    results[name] = coords
+        
+        return results
+    
+    def _geocoding_queries(self, city_name: str) -> List[str]:
+        """Candidate geocoding queries for a city, most specific first"""
         # Try different query formats
         search_queries = [
             f"{city_name},IN",  # Original format
@@ -43,31 +418,69 @@ class WeatherService:
         if clean_name in state_capitals:
             search_queries.insert(0, f"{state_capitals[clean_name]},IN")
         
-        for query in search_queries:
-            try:
-                params = {
-                    'q': query,
-                    'limit': 1,
-                    'appid': self.api_key
-                }
-                
-                response = requests.get(geocoding_url, params=params, timeout=10)
-                response.raise_for_status()
-                data = response.json()
-                
-                if data and len(data) > 0:
-                    return {
-                        'lat': data[0]['lat'],
-                        'lon': data[0]['lon'],
-                        'name': data[0]['name']
-                    }
-            except Exception as e:
-                print(f"Error with query '{query}': {e}")
-                continue
-        
-        print(f"No coordinates found for {city_name}")
+        return search_queries
+    
+    def _geocoding_params(self, query: str) -> Dict:
+        return {
+            'q': query,
+            'limit': 1,
+            'appid': self.api_key
+        }
+    
+    def _weather_params(self, coords: Dict) -> Dict:
+        return {
+            'lat': coords['lat'],
+            'lon': coords['lon'],
+            'appid': self.api_key,
+            'units': 'metric'
+        }
+    
+    def _parse_geocoding(self, data) -> Optional[Dict]:
+        if data and len(data) > 0:
+            return {
+                'lat': data[0]['lat'],
+                'lon': data[0]['lon'],
+                'name': data[0]['name']
+            }
         return None
     
+    def _parse_current_weather(self, data: Dict, coords: Dict) -> Dict:
+        return {
+            'main': {
+                'temp': data['main']['temp'],
+                'feels_like': data['main']['feels_like'],
+                'humidity': data['main']['humidity'],
+                'pressure': data['main'].get('pressure', 0)
+            },
+            'weather': [{
+                'main': data['weather'][0]['main'],
+                'description': data['weather'][0]['description'],
+                'icon': data['weather'][0].get('icon', '')
+            }],
+            'wind': {
+                'speed': data.get('wind', {}).get('speed', 0)
+            },
+            'visibility': data.get('visibility', 10000),
+            'name': coords['name'],
+            'sys': {
+                'country': data.get('sys', {}).get('country', 'IN')
+            }
+        }
+    
+    def _parse_forecast(self, data: Dict, days: int) -> List[Dict]:
+        forecast_list = []
+        for item in data['list'][:days * 8]:  # 8 forecasts per day (3-hour intervals)
+            forecast_list.append({
+                'datetime': datetime.fromtimestamp(item['dt']),
+                'temperature': item['main']['temp'],
+                'description': item['weather'][0]['description'],
+                'main': item['weather'][0]['main'],
+                'humidity': item['main']['humidity'],
+                'wind_speed': item.get('wind', {}).get('speed', 0),
+                'precipitation': item.get('rain', {}).get('3h', 0) + item.get('snow', {}).get('3h', 0)
+            })
+        return forecast_list
+    
     def get_current_weather(self, city_name: str) -> Optional[Dict]:
         """Get current weather for a city"""
         if not self.api_key:
@@ -76,145 +489,220 @@ class WeatherService:
         coords = self.get_coordinates(city_name)
         if not coords:
             return None
+        
+        data = self.weather_cache.get('current', coords, lambda: self._fetch_current(coords, city_name))
+        return self._with_name(data, coords)
+    
+    def get_forecast(self, city_name: str, days: int = 5) -> Optional[List[Dict]]:
+        """Get weather forecast for upcoming days"""
+        if not self.api_key:
+            return None
             
-        weather_url = f"{WEATHER_API_BASE_URL}/weather"
-        params = {
-            'lat': coords['lat'],
-            'lon': coords['lon'],
-            'appid': self.api_key,
-            'units': 'metric'
+        coords = self.get_coordinates(city_name)
+        if not coords:
+            return None
+        
+        # The full 5-day forecast is cached; callers get a slice
+        forecast = self.weather_cache.get('forecast', coords, lambda: self._fetch_forecast(coords, city_name))
+        return forecast[:days * 8] if forecast is not None else None
+    
+    def get_weather_bundle(self, city_name: str, days: int = 5) -> Optional[Dict]:
+        """
+        Current conditions and forecast in one call: geocodes once, then fetches
+        both concurrently. Returns None if the city cannot be located.
+        """
+        if not self.api_key:
+            return None
+        
+        coords = self.get_coordinates(city_name)
+        if not coords:
+            return None
+        
+        forecast_future = submit_in_context(
+            _bundle_executor, self.weather_cache.get, 'forecast', coords, lambda: self._fetch_forecast(coords, city_name)
+        )
+        current = self.weather_cache.get('current', coords, lambda: self._fetch_current(coords, city_name))
+        try:
+            forecast = forecast_future.result(timeout=30)
+        except Exception as e:
+            logging.error(f"Error getting forecast for {city_name}: {e}")
+            forecast = None
+        
+        return {
+            'location': coords,
+            'current': self._with_name(current, coords),
+            'forecast': forecast[:days * 8] if forecast is not None else None
         }
+    
+    def _with_name(self, data: Optional[Dict], coords: Dict) -> Optional[Dict]:
+        # Cache entries are shared by every name that rounds to the same coordinates
+        if data is None:
+            return None
+        return dict(data, name=coords['name'])
+    
+    def _fetch_current(self, coords: Dict, city_name: str) -> Optional[Dict]:
+        try:
+            with track_dependency('openweathermap', 'current'):
+                response = self.session.get(f"{WEATHER_API_BASE_URL}/weather", params=self._weather_params(coords), timeout=10)
+            response.raise_for_status()
+            return self._parse_current_weather(response.json(), coords)
+        except Exception as e:
+            logging.error(f"Error getting weather for {city_name}: {e}")
         
+        return None
+    
+    def _fetch_forecast(self, coords: Dict, city_name: str) -> Optional[List[Dict]]:
         try:
-            response = requests.get(weather_url, params=params, timeout=10)
+            with track_dependency('openweathermap', 'forecast'):
+                response = self.session.get(f"{WEATHER_API_BASE_URL}/forecast", params=self._weather_params(coords), timeout=10)
             response.raise_for_status()
-            data = response.json()
-            
-            return {
-                'main': {
-                    'temp': data['main']['temp'],
-                    'feels_like': data['main']['feels_like'],
-                    'humidity': data['main']['humidity'],
-                    'pressure': data['main'].get('pressure', 0)
-                },
-                'weather': [{
-                    'main': data['weather'][0]['main'],
-                    'description': data['weather'][0]['description'],
-                    'icon': data['weather'][0].get('icon', '')
-                }],
-                'wind': {
-                    'speed': data.get('wind', {}).get('speed', 0)
-                },
-                'visibility': data.get('visibility', 10000),
-                'name': coords['name'],
-                'sys': {
-                    'country': data.get('sys', {}).get('country', 'IN')
-                }
-            }
+            return self._parse_forecast(response.json(), FORECAST_DAYS)
         except Exception as e:
-            print(f"Error getting weather for {city_name}: {e}")
+            logging.error(f"Error getting forecast for {city_name}: {e}")
         
         return None
     
-    def get_forecast(self, city_name: str, days: int = 5) -> Optional[List[Dict]]:
-        """Get weather forecast for upcoming days"""
+    # --- Async variants (used by the proactive agents) ---
+    
+    def _async_client(self) -> httpx.AsyncClient:
+        # One client per call: an AsyncClient is bound to the event loop that
+        # created it, and each monitoring cycle runs on a fresh loop.
+        return httpx.AsyncClient(timeout=10)
+    
+    async def aget_coordinates(self, city_name: str, client: Optional[httpx.AsyncClient] = None) -> Optional[Dict]:
+        """Async version of get_coordinates"""
+        place = self._gazetteer_coordinates(city_name)
+        if place:
+            return place
+        
         if not self.api_key:
             return None
-            
-        coords = self.get_coordinates(city_name)
+        
+        # The coordinate cache reads and writes the geocode_cache table, so keep
+        # it off the event loop; to_thread carries the app context along.
+        cached = await asyncio.to_thread(self.coordinate_cache.get, city_name)
+        if cached is not _MISSING:
+            return cached
+        
+        if client is None:
+            async with self._async_client() as client:
+                coords = await self._afetch_coordinates(city_name, client)
+        else:
+            coords = await self._afetch_coordinates(city_name, client)
+        await asyncio.to_thread(self.coordinate_cache.set, city_name, coords)
+        return coords
+    
+    async def _afetch_coordinates(self, city_name: str, client: httpx.AsyncClient) -> Optional[Dict]:
+        for query in self._geocoding_queries(city_name):
+            try:
+                with track_dependency('openweathermap', 'geocode'):
+                    response = await client.get(GEOCODING_URL, params=self._geocoding_params(query))
+                response.raise_for_status()
+                coords = self._parse_geocoding(response.json())
+                if coords:
+                    return coords
+            except Exception as e:
+                logging.warning(f"Error with query '{query}': {e}")
+                continue
+        
+        logging.warning(f"No coordinates found for {city_name}")
+        return None
+    
+    async def aget_current_weather(self, city_name: str, client: Optional[httpx.AsyncClient] = None) -> Optional[Dict]:
+        """Async version of get_current_weather"""
+        if not self.api_key:
+            return None
+        
+        if client is None:
+            async with self._async_client() as client:
+                return await self.aget_current_weather(city_name, client)
+        
+        coords = await self.aget_coordinates(city_name, client)
         if not coords:
             return None
-            
-        forecast_url = f"{WEATHER_API_BASE_URL}/forecast"
-        params = {
-            'lat': coords['lat'],
-            'lon': coords['lon'],
-            'appid': self.api_key,
-            'units': 'metric'
-        }
+        
+        # Fresh or stale-but-usable entries are served without awaiting anything
+        cached = self.weather_cache.lookup('current', coords, lambda: self._fetch_current(coords, city_name))
+        if cached is not None:
+            return self._with_name(cached, coords)
         
         try:
-            response = requests.get(forecast_url, params=params, timeout=10)
+            with track_dependency('openweathermap', 'current'):
+                response = await client.get(f"{WEATHER_API_BASE_URL}/weather", params=self._weather_params(coords))
             response.raise_for_status()
-            data = response.json()
-            
-            forecast_list = []
-            for item in data['list'][:days * 8]:  # 8 forecasts per day (3-hour intervals)
-                forecast_list.append({
-                    'datetime': datetime.fromtimestamp(item['dt']),
-                    'temperature': item['main']['temp'],
-                    'description': item['weather'][0]['description'],
-                    'main': item['weather'][0]['main'],
-                    'humidity': item['main']['humidity'],
-                    'wind_speed': item.get('wind', {}).get('speed', 0),
-                    'precipitation': item.get('rain', {}).get('3h', 0) + item.get('snow', {}).get('3h', 0)
-                })
-            
-            return forecast_list
+            data = self._parse_current_weather(response.json(), coords)
+            self.weather_cache.put('current', coords, data)
+            return data
+        except Exception as e:
+            logging.error(f"Error getting weather for {city_name}: {e}")
+        
+        return None
+    
+    async def aget_forecast(self, city_name: str, days: int = 5, client: Optional[httpx.AsyncClient] = None) -> Optional[List[Dict]]:
+        """Async version of get_forecast"""
+        if not self.api_key:
+            return None
+        
+        if client is None:
+            async with self._async_client() as client:
+                return await self.aget_forecast(city_name, days, client)
+        
+        coords = await self.aget_coordinates(city_name, client)
+        if not coords:
+            return None
+        
+        cached = self.weather_cache.lookup('forecast', coords, lambda: self._fetch_forecast(coords, city_name))
+        if cached is not None:
+            return cached[:days * 8]
+        
+        try:
+            with track_dependency('openweathermap', 'forecast'):
+                response = await client.get(f"{WEATHER_API_BASE_URL}/forecast", params=self._weather_params(coords))
+            response.raise_for_status()
+            forecast = self._parse_forecast(response.json(), FORECAST_DAYS)
+            self.weather_cache.put('forecast', coords, forecast)
+            return forecast[:days * 8]
         except Exception as e:
-            print(f"Error getting forecast for {city_name}: {e}")
+            logging.error(f"Error getting forecast for {city_name}: {e}")
         
         return None
     
+    def get_forecasts(self, city_names: Iterable[str], max_workers: int = 4) -> Dict[str, Optional[List[Dict]]]:
+        """5-day forecasts for many cities, fetched concurrently on a bounded pool"""
+        names = list(dict.fromkeys(n for n in city_names if n and n.strip()))
+        # Geocode here: the coordinate cache's DB tier needs this thread's app context
+        located = [(name, self.get_coordinates(name)) for name in names]
+        forecasts = {name: None for name, coords in located if not coords}
+        
+        def fetch(name, coords):
+            return self.weather_cache.get('forecast', coords, lambda: self._fetch_forecast(coords, name))
+        
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {name: submit_in_context(executor, fetch, name, coords) for name, coords in located if coords}
+            for name, future in futures.items():
+                try:
+                    forecasts[name] = future.result()
+                except Exception as e:
+                    logging.error(f"Error getting forecast for {name}: {e}")
+                    forecasts[name] = None
+        
+        return forecasts
+    
     def check_severe_weather(self, city_name: str, travel_date: datetime) -> Optional[Dict]:
         """Check for severe weather conditions for a specific travel date"""
         forecast = self.get_forecast(city_name, 5)
         if not forecast:
             return None
         
-        # Filter forecast for the specific travel date
-        target_date = travel_date.date()
-        severe_conditions = []
-        
-        for forecast_item in forecast:
-            forecast_date = forecast_item['datetime'].date()
-            
-            if forecast_date == target_date:
-                # Check for severe weather conditions
-                is_severe = False
-                severity_reasons = []
-                
-                # Heavy rain (>10mm in 3 hours)
-                if forecast_item['precipitation'] > 10:
-                    is_severe = True
-                    severity_reasons.append(f"Heavy rainfall ({forecast_item['precipitation']:.1f}mm)")
-                
-                # Strong winds (>20 km/h)
-                if forecast_item['wind_speed'] > 5.5:  # 5.5 m/s = ~20 km/h
-                    is_severe = True
-                    severity_reasons.append(f"Strong winds ({forecast_item['wind_speed']:.1f} m/s)")
-                
-                # Extreme temperatures
-                if forecast_item['temperature'] > 40 or forecast_item['temperature'] < 5:
-                    is_severe = True
-                    severity_reasons.append(f"Extreme temperature ({forecast_item['temperature']:.1f}°C)")
-                
-                # Severe weather types
-                severe_weather_types = ['Thunderstorm', 'Snow', 'Extreme']
-                if forecast_item['main'] in severe_weather_types:
-                    is_severe = True
-                    severity_reasons.append(f"{forecast_item['main']}")
-                
-                if is_severe:
-                    severe_conditions.append({
-                        'datetime': forecast_item['datetime'],
-                        'reasons': severity_reasons,
-                        'temperature': forecast_item['temperature'],
-                        'description': forecast_item['description'],
-                        'precipitation': forecast_item['precipitation'],
-                        'wind_speed': forecast_item['wind_speed']
-                    })
-        
-        if severe_conditions:
-            return {
-                'city': city_name,
-                'date': target_date,
-                'severity': 'high' if len(severe_conditions) > 2 else 'medium',
-                'conditions': severe_conditions,
-                'alert_message': f"Severe weather expected in {city_name} on {target_date.strftime('%B %d, %Y')}"
-            }
-        
-        return None
+        return self.evaluate_severe_weather(city_name, forecast, travel_date.date())
+    
+    def evaluate_severe_weather(self, city_name: str, forecast: List[Dict], target_date) -> Optional[Dict]:
+        """Severe weather alert for one date from an already fetched forecast"""
+        alerts = severe_weather.evaluate_dates(
+            city_name, severe_weather.ForecastArrays(forecast),
+            severe_weather.rules_for_destination(city_name), [target_date]
+        )
+        return alerts.get(target_date)
 
 # Global weather service instance
 weather_service = WeatherService()
\ No newline at end of file